@@ -0,0 +1,8 @@
+@echo off
+setlocal
+pushd "%~dp0"
+
+python "..\serve_viewer.py"
+
+popd
+PAUSE
@@ -0,0 +1,399 @@
+#!/usr/bin/env python3
+# analyze_sweep.py
+#
+# Image metrics for a sweep folder, and which axes actually change the output.
+#
+# Every image is decoded once (downscaled to --size px, across a process pool) and
+# scored with NumPy:
+#   sharpness     variance of the Laplacian of the luminance
+#   entropy       Shannon entropy of the luminance histogram, in bits (0..8)
+#   colorfulness  Hasler-Suesstrunk colorfulness
+#   difference    mean absolute pixel difference (0..1) to the images one step away
+#                 along each axis, i.e. how much this cell stands out from its neighbours
+# The per-axis report then averages the neighbour differences along each axis (how much
+# one step of that axis changes the picture) and, per metric, how far the means of the
+# axis values spread apart (in units of the metric's standard deviation over the sweep).
+# Axes whose values barely change anything are candidates to drop from the next sweep.
+#
+# Images are found like the viewers find them: via 0000_sweep_manifest.jsonl when there
+# is one, else by parsing the filenames. Results go to <images>/0000_sweep_metrics.json,
+# which make_axis_grid_viewer.py picks up for its heat map / sort controls. Per-image
+# results are cached by (mtime, size) in 0000_sweep_metrics.cache.npz, so re-running
+# after a few new outputs only decodes those.
+#
+# Usage:
+#   python analyze_sweep.py --images params/images/Demo
+#   python analyze_sweep.py --images params/images/Demo --workflow simple_image1.json --values
+#
+# Requires NumPy and Pillow (pip install numpy pillow).
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from make_aligned_viewer import load_node_titles
+from image_scan import parse_dimension_segment, parse_filename, scan_entries
+from sweep_manifest import (MANIFEST_NAME, METRICS_NAME, METRICS_VERSION, folder_records, is_ordinal, ordinal_parser,
+                            read_manifest, viewer_entries)
+from thumbs import HAVE_PIL, Image
+from viewer_index import ViewerIndex
+
+CACHE_NAME = "0000_sweep_metrics.cache.npz"
+SCAN_CACHE_NAME = "0000_sweep_metrics.scan.json"
+METRICS = ("sharpness", "entropy", "colorfulness", "difference")
+DIFF_SIZE = 16          # side of the RGB thumbnail neighbour differences are taken on
+PAIR_CHUNK = 8192       # neighbour pairs compared per NumPy batch
+
+def parse_args():
+    p = argparse.ArgumentParser(
+        description="Per-image quality metrics and per-axis sensitivity for a sweep folder."
+    )
+    p.add_argument(
+        "--images",
+        dest="image_dir",
+        default=None,
+        help="Path to the sweep's folder of PNGs (default: <base>/params/images).",
+    )
+    p.add_argument(
+        "--workflow",
+        dest="workflow",
+        default=None,
+        help="ComfyUI workflow JSON for axis titles (default: <base>/simple_image1.json if present).",
+    )
+    p.add_argument(
+        "--base",
+        dest="basepath",
+        default=".",
+        help="Base directory for resolving relative paths (default: current directory).",
+    )
+    p.add_argument(
+        "--size",
+        dest="size",
+        type=int,
+        default=256,
+        help="Longest side in px images are scored at (default: %(default)s).",
+    )
+    p.add_argument(
+        "--workers",
+        dest="workers",
+        type=int,
+        default=None,
+        help="Processes for decoding and scoring images (default: CPU count).",
+    )
+    p.add_argument(
+        "--no-cache",
+        dest="no_cache",
+        action="store_true",
+        help="Re-score every image instead of using/updating %s." % CACHE_NAME,
+    )
+    p.add_argument(
+        "--values",
+        dest="values",
+        action="store_true",
+        help="Also print the mean of every metric per axis value.",
+    )
+    return p.parse_args()
+
+# -------------------- Per-image metrics --------------------
+
+def score_image(path, size):
+    """(sharpness, entropy, colorfulness), DIFF_SIZE^2 x 3 thumbnail in 0..1 for one image."""
+    with Image.open(path) as im:
+        im.draft("RGB", (size, size))
+        im = im.convert("RGB")
+        im.thumbnail((size, size), Image.BILINEAR)
+        small = im.resize((DIFF_SIZE, DIFF_SIZE), Image.BILINEAR)
+        rgb = np.asarray(im, dtype=np.float32)
+    r, g, b = rgb[..., 0], rgb[..., 1], rgb[..., 2]
+    y = 0.299 * r + 0.587 * g + 0.114 * b
+    lap = y[:-2, 1:-1] + y[2:, 1:-1] + y[1:-1, :-2] + y[1:-1, 2:] - 4.0 * y[1:-1, 1:-1]
+    sharpness = float(lap.var()) if lap.size else 0.0
+    hist = np.bincount(np.clip(y, 0, 255).astype(np.uint8).ravel(), minlength=256)
+    p = hist[hist > 0] / y.size
+    entropy = float(-(p * np.log2(p)).sum())
+    rg = r - g
+    yb = 0.5 * (r + g) - b
+    colorfulness = float(np.hypot(rg.std(), yb.std()) + 0.3 * np.hypot(rg.mean(), yb.mean()))
+    thumb = np.asarray(small, dtype=np.float32).reshape(-1) / 255.0
+    return (sharpness, entropy, colorfulness), thumb
+
+def _score_job(job):
+    """Worker entry point: job = (path, size). Returns (path, scores, thumb, error or None)."""
+    path, size = job
+    try:
+        scores, thumb = score_image(path, size)
+    except (OSError, ValueError) as e:
+        return path, None, None, str(e)
+    return path, scores, thumb, None
+
+def load_cache(path, size):
+    """{name: (stamp, scores, thumb)} from an earlier run at the same --size, else {}."""
+    try:
+        with np.load(path) as z:
+            if int(z["size"]) != size or z["thumbs"].shape[1:] != (DIFF_SIZE * DIFF_SIZE * 3,):
+                return {}
+            return {str(n): (tuple(int(v) for v in st), tuple(float(v) for v in sc), th)
+                    for n, st, sc, th in zip(z["names"], z["stamps"], z["scores"], z["thumbs"])}
+    except (OSError, KeyError, ValueError):
+        return {}
+
+def save_cache(path, size, names, stamps, scores, thumbs):
+    tmp = path + ".tmp.npz"
+    try:
+        np.savez(tmp, size=np.int64(size), names=np.array(names), stamps=np.array(stamps, dtype=np.int64),
+                 scores=scores, thumbs=thumbs)
+        os.replace(tmp, path)
+    except OSError as e:
+        print("[WARN] Could not write metrics cache %s: %s" % (path, e))
+
+def score_files(img_dir, files, size, workers=None, use_cache=True):
+    """
+    Score files (names in img_dir). Returns (scores N x 3, thumbs N x D, ok mask N);
+    rows of unreadable files are zero with ok False.
+    """
+    img_dir = os.fspath(img_dir)
+    cache_path = os.path.join(img_dir, CACHE_NAME)
+    cached = load_cache(cache_path, size) if use_cache else {}
+    n = len(files)
+    scores = np.zeros((n, 3), dtype=np.float64)
+    thumbs = np.zeros((n, DIFF_SIZE * DIFF_SIZE * 3), dtype=np.float32)
+    ok = np.zeros(n, dtype=bool)
+    stamps = [(0, 0)] * n
+    row = {}
+    jobs = []
+    for i, name in enumerate(files):
+        path = os.path.join(img_dir, name)
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            continue
+        stamps[i] = (st.st_mtime_ns, st.st_size)
+        hit = cached.get(name)
+        if hit is not None and hit[0] == stamps[i]:
+            scores[i], thumbs[i], ok[i] = hit[1], hit[2], True
+        else:
+            row[path] = i
+            jobs.append((path, size))
+
+    if jobs:
+        workers = max(1, min(workers or os.cpu_count() or 1, len(jobs)))
+        t0 = time.time()
+        pool = None
+        if workers == 1:
+            results = map(_score_job, jobs)
+        else:
+            pool = ProcessPoolExecutor(max_workers=workers)
+            results = pool.map(_score_job, jobs, chunksize=max(1, min(32, len(jobs) // (workers * 4))))
+        try:
+            for path, sc, th, err in results:
+                if err:
+                    print("[WARN] Could not score %s: %s" % (os.path.basename(path), err))
+                    continue
+                i = row[path]
+                scores[i], thumbs[i], ok[i] = sc, th, True
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+        dt = max(time.time() - t0, 1e-6)
+        print("Scored: %d in %.1fs (%.1f/s, %d worker%s), %d from cache"
+              % (len(jobs), dt, len(jobs) / dt, workers, "" if workers == 1 else "s", n - len(jobs)))
+    else:
+        print("Scored: all %d from cache" % n)
+
+    if use_cache and (jobs or len(cached) != int(ok.sum())):
+        keep = np.flatnonzero(ok)
+        save_cache(cache_path, size, [files[i] for i in keep], [stamps[i] for i in keep],
+                   scores[keep], thumbs[keep])
+    return scores, thumbs, ok
+
+# -------------------- Axis sensitivity --------------------
+
+def neighbour_differences(grid, sizes, thumbs, ok):
+    """
+    Mean absolute thumbnail difference between cells one step apart along each axis.
+    grid is the dense file id per cell (-1 = missing). Returns (per-axis mean difference,
+    NaN when an axis has no complete pair; per-file mean difference to its neighbours).
+    """
+    ids = np.asarray(grid, dtype=np.int64).reshape(sizes)
+    present = ids >= 0
+    present[present] = ok[ids[present]]
+    per_file = np.zeros(len(thumbs))
+    count = np.zeros(len(thumbs))
+    per_axis = []
+    for a, n in enumerate(sizes):
+        if n < 2:
+            per_axis.append(float("nan"))
+            continue
+        lo = [slice(None)] * len(sizes)
+        hi = [slice(None)] * len(sizes)
+        lo[a], hi[a] = slice(None, -1), slice(1, None)
+        both = present[tuple(lo)] & present[tuple(hi)]
+        f1 = ids[tuple(lo)][both]
+        f2 = ids[tuple(hi)][both]
+        total = 0.0
+        for s in range(0, len(f1), PAIR_CHUNK):
+            a1, a2 = f1[s:s + PAIR_CHUNK], f2[s:s + PAIR_CHUNK]
+            d = np.abs(thumbs[a1] - thumbs[a2]).mean(axis=1)
+            total += float(d.sum())
+            np.add.at(per_file, a1, d)
+            np.add.at(per_file, a2, d)
+            np.add.at(count, a1, 1)
+            np.add.at(count, a2, 1)
+        per_axis.append(total / len(f1) if len(f1) else float("nan"))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        per_file = np.where(count > 0, per_file / count, np.nan)
+    return per_axis, per_file
+
+def value_means(grid, sizes, values):
+    """Per axis, the mean of values (one per file id, NaN = none) for each axis value."""
+    cells = np.append(values, np.nan)[np.asarray(grid, dtype=np.int64)].reshape(sizes)
+    out = []
+    with np.errstate(invalid="ignore"):
+        for a in range(len(sizes)):
+            other = tuple(d for d in range(len(sizes)) if d != a)
+            valid = ~np.isnan(cells)
+            total = np.where(valid, cells, 0.0).sum(axis=other)
+            count = valid.sum(axis=other)
+            out.append(np.where(count > 0, total / np.maximum(count, 1), np.nan))
+    return out
+
+def finite(x):
+    """JSON-safe float: None for NaN/inf, rounded otherwise."""
+    x = float(x)
+    return round(x, 6) if np.isfinite(x) else None
+
+def axis_report(meta, values, per_axis_diff):
+    """
+    The "axes" section of the metrics file: per axis its label, value displays,
+    mean neighbour difference, and per metric the per-value means and their spread
+    (max - min of the means over the metric's standard deviation across the sweep).
+    """
+    sizes = [len(v) for v in meta["dim_values"]]
+    means = {m: value_means(meta["grid"], sizes, values[:, j]) for j, m in enumerate(METRICS)}
+    axes = []
+    for a, vals in enumerate(meta["dim_values"]):
+        ax = {
+            "label": meta["dim_labels"][a],
+            "values": [v["d"] for v in vals],
+            "change": finite(per_axis_diff[a]),
+            "means": {},
+            "spread": {},
+        }
+        for j, m in enumerate(METRICS):
+            col = values[:, j]
+            col = col[np.isfinite(col)]
+            std = float(col.std()) if col.size else 0.0
+            mv = means[m][a]
+            fin = mv[np.isfinite(mv)]
+            ax["means"][m] = [finite(x) for x in mv]
+            ax["spread"][m] = finite((fin.max() - fin.min()) / std) if fin.size > 1 and std > 0 else None
+        axes.append(ax)
+    return axes
+
+def print_report(axes, show_values):
+    width = max(len(ax["label"]) for ax in axes)
+    print()
+    print("Axis sensitivity, most output-changing first (change = mean pixel difference per step,")
+    print("0..1; metric columns = spread of the per-value means in standard deviations):")
+    print("  %-*s  %7s  %s" % (width, "axis", "change", "  ".join("%12s" % m for m in METRICS)))
+    order = sorted(axes, key=lambda ax: -(ax["change"] if ax["change"] is not None else -1))
+    for ax in order:
+        cols = ["%12s" % ("-" if ax["spread"][m] is None else "%.2f" % ax["spread"][m]) for m in METRICS]
+        change = "-" if ax["change"] is None else "%.4f" % ax["change"]
+        print("  %-*s  %7s  %s" % (width, ax["label"], change, "  ".join(cols)))
+    if not show_values:
+        return
+    for ax in axes:
+        print()
+        print("%s:" % ax["label"])
+        vwidth = max(len(str(v)) for v in ax["values"])
+        for i, v in enumerate(ax["values"]):
+            cols = []
+            for m in METRICS:
+                x = ax["means"][m][i]
+                cols.append("%12s" % ("-" if x is None else "%.4g" % x))
+            print("  %-*s  %s" % (vwidth, v, "  ".join(cols)))
+
+# -------------------- Metrics file --------------------
+
+def write_metrics(path, names, values, axes):
+    doc = {
+        "version": METRICS_VERSION,
+        "metrics": list(METRICS),
+        "files": {name: [finite(x) for x in row] for name, row in zip(names, values)},
+        "axes": axes,
+    }
+    tmp = str(path) + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(doc, f, separators=(",", ":"))
+    os.replace(tmp, path)
+
+# -------------------- Main --------------------
+
+def find_entries(img_dir):
+    """PNG (filename, parsed) entries, the way the viewers find them."""
+    manifest = read_manifest(img_dir / MANIFEST_NAME)
+    if manifest is not None:
+        records = folder_records(img_dir, manifest[0], manifest[1])
+        png_entries, _ = viewer_entries(manifest[0], records, parse_dimension_segment)
+        if png_entries:
+            return png_entries
+    parse, cache_name = parse_filename, SCAN_CACHE_NAME
+    if manifest is not None and is_ordinal(manifest[0]):
+        parse, cache_name = ordinal_parser(manifest[0], parse_dimension_segment), None
+    return scan_entries(img_dir, (".png",), parse, cache_name)[".png"]
+
+def main():
+    args = parse_args()
+    if np is None or not HAVE_PIL:
+        sys.exit("analyze_sweep.py requires NumPy and Pillow (pip install numpy pillow).")
+
+    basepath = Path(args.basepath).resolve()
+    def resolve_path(value, default):
+        if value is None:
+            return default
+        p = Path(value)
+        return p if p.is_absolute() else basepath / p
+
+    img_dir = resolve_path(args.image_dir, basepath / "params" / "images").resolve()
+    if not img_dir.is_dir():
+        sys.exit("Image directory not found: %s" % img_dir)
+    wf_path = resolve_path(args.workflow, basepath / "simple_image1.json")
+    node_titles = {}
+    if wf_path.is_file():
+        node_titles = load_node_titles(wf_path)
+    elif args.workflow:
+        sys.exit("Workflow JSON not found: %s" % wf_path)
+
+    index = ViewerIndex()
+    index.add_entries(find_entries(img_dir), [], strict=False)
+    if not index.posters:
+        sys.exit("No valid images found.")
+    meta = index.meta(node_titles, "")
+    files = meta["files"]
+    sizes = [len(v) for v in meta["dim_values"]]
+    print("Analyzing %d images (%s) in %s" % (len(files), " x ".join(str(n) for n in sizes), img_dir))
+
+    scores, thumbs, ok = score_files(img_dir, files, args.size, args.workers, not args.no_cache)
+    per_axis, per_file = neighbour_differences(meta["grid"], sizes, thumbs, ok)
+    values = np.column_stack([scores, per_file])
+    values[~ok] = np.nan
+
+    axes = axis_report(meta, values, per_axis)
+    out = img_dir / METRICS_NAME
+    write_metrics(out, files, values, axes)
+    print_report(axes, args.values)
+    print()
+    print("Wrote", out)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+# bench_sweep.py
+#
+# Benchmarks for the hot paths of a sweep, on synthetic data in a temp folder:
+#   plan     gen_images.SweepPlan setup + full traversal, and its peak memory (tracemalloc)
+#   scan     image_scan.scan_entries() with the viewer's filename parser (cold and warm
+#            parse cache) and sweep_manifest.folder_records() + viewer_entries() (the
+#            manifest path)
+#   viewer   make_aligned_viewer.py / make_axis_grid_viewer.py end to end: wall time,
+#            HTML + .data.js size and the time to parse the data file
+#   cleanup  gen_images.cleanup_folder() over the generated folder, with stray files to
+#            remove; runs last since it deletes whatever the plan does not expect
+#
+# The plan covers the full --sizes product (millions of combinations are fine); only the
+# first --max-files outputs are written, as tiny valid PNGs (plus an .mp4 each with
+# --videos), and recorded as done in a sweep manifest.
+#
+# Usage:
+#   python bench_sweep.py --sizes 40,30,10
+#   python bench_sweep.py --sizes 100,100,100 --naming ordinal --only plan,scan
+#   python bench_sweep.py --sizes 20,20,20,20 --max-files 50000 --json before.json
+#
+# Stdlib only; the viewer runs skip thumbnails and poster extraction.
+
+import argparse
+import json
+import os
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import zlib
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+import gen_images
+from image_scan import parse_dimension_segment, parse_filename, scan_entries
+from make_aligned_viewer import SCAN_CACHE_NAME
+from sweep_manifest import (MANIFEST_NAME, ManifestWriter, folder_records, ordinal_parser, read_manifest,
+                            viewer_entries)
+
+STEPS = ("plan", "scan", "viewer", "cleanup")
+VIEWERS = (("aligned", "make_aligned_viewer.py", []),
+           ("grid", "make_axis_grid_viewer.py", ["--no-thumbs"]))
+
+def parse_args():
+    p = argparse.ArgumentParser(
+        description="Benchmark sweep planning, folder cleanup/scan and viewer generation on synthetic data."
+    )
+    p.add_argument(
+        "--sizes",
+        dest="sizes",
+        default="20,20,10",
+        help="Comma-separated value count per axis, 1 to 7 axes (default: 20,20,10).",
+    )
+    p.add_argument(
+        "--text-axis",
+        dest="text_axis",
+        action="store_true",
+        help="Make the last axis a string axis (prompt-like values) instead of numbers.",
+    )
+    p.add_argument(
+        "--naming",
+        dest="naming",
+        choices=("segments", "ordinal"),
+        default="segments",
+        help="Output naming, as gen_images.py --naming (default: segments).",
+    )
+    p.add_argument(
+        "--max-files",
+        dest="max_files",
+        type=int,
+        default=20000,
+        help="Write at most this many outputs to disk (default: 20000).",
+    )
+    p.add_argument(
+        "--videos",
+        dest="videos",
+        action="store_true",
+        help="Write an .mp4 next to every PNG.",
+    )
+    p.add_argument(
+        "--stray",
+        dest="stray",
+        type=int,
+        default=100,
+        help="Unexpected files for cleanup_folder() to remove (default: 100).",
+    )
+    p.add_argument(
+        "--only",
+        dest="only",
+        default=",".join(STEPS),
+        help="Comma-separated steps to run: %s (default: all)." % ",".join(STEPS),
+    )
+    p.add_argument(
+        "--dir",
+        dest="work_dir",
+        default=None,
+        help="Parent folder for the synthetic sweep: a new cpv_bench_* subfolder is created in it "
+             "and kept (default: a new temp folder, removed afterwards).",
+    )
+    p.add_argument(
+        "--keep",
+        dest="keep",
+        action="store_true",
+        help="Keep the temp folder.",
+    )
+    p.add_argument(
+        "--json",
+        dest="json_out",
+        default=None,
+        help="Also write the results to this JSON file (to compare runs).",
+    )
+    return p.parse_args()
+
+# -------------------- Synthetic sweep --------------------
+
+def tiny_png(width=8, height=8):
+    """A valid grayscale PNG, so size probes and image readers accept the fakes."""
+    def chunk(tag, body):
+        return (struct.pack(">I", len(body)) + tag + body
+                + struct.pack(">I", zlib.crc32(tag + body) & 0xFFFFFFFF))
+    raw = b"".join(b"\x00" + b"\x80" * width for _ in range(height))
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(raw)) + chunk(b"IEND", b""))
+
+def make_axes(sizes, text_axis):
+    """Axis specs/values like gen_images.main() builds them: node 10+k, one input per axis."""
+    specs = {}
+    values = {a: [None] for a in gen_images.AXES}
+    types = {}
+    for k, n in enumerate(sizes):
+        axis = gen_images.AXES[k]
+        specs[axis] = (str(10 + k), "p%d" % k)
+        if text_axis and k == len(sizes) - 1:
+            values[axis] = ["prompt%d" % i for i in range(n)]
+            types[axis] = "string"
+        elif k % 2 == 0:
+            values[axis] = [round(0.5 + 0.25 * i, 2) for i in range(n)]
+            types[axis] = "float"
+        else:
+            values[axis] = [10 * (i + 1) for i in range(n)]
+            types[axis] = "int"
+    return specs, values, types
+
+def write_workflow(path, sizes):
+    nodes = [{"id": 10 + k, "type": "BenchNode%d" % k} for k in range(len(sizes))]
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"nodes": nodes}, f)
+
+def write_outputs(img_dir, plan, header, max_files, videos, stray):
+    """First max_files outputs as files + manifest records; returns the file count."""
+    os.makedirs(img_dir, exist_ok=True)
+    png = tiny_png()
+    manifest = ManifestWriter(os.path.join(img_dir, MANIFEST_NAME), header, reset=True)
+    seen = set()
+    count = 0
+    for idxs, stem, _ in plan:
+        if count >= max_files:
+            break
+        o = plan.output_ordinal(idxs)
+        if o in seen:
+            continue
+        seen.add(o)
+        names = [stem + plan.SUFFIX]
+        with open(os.path.join(img_dir, names[0]), "wb") as f:
+            f.write(png)
+        if videos:
+            names.append(stem + plan.SUFFIX[:-4] + ".mp4")
+            with open(os.path.join(img_dir, names[1]), "wb") as f:
+                f.write(b"\x00" * 64)
+        manifest.record(o, "done", files=names)
+        count += 1
+    manifest.close()
+    for i in range(stray):
+        with open(os.path.join(img_dir, "stray_%05d.tmp" % i), "wb"):
+            pass
+    return count
+
+# -------------------- Steps --------------------
+
+def timed(fn, *args, **kwargs):
+    t0 = time.perf_counter()
+    out = fn(*args, **kwargs)
+    return time.perf_counter() - t0, out
+
+def bench_plan(specs, values, naming):
+    def build_and_walk():
+        plan = gen_images.SweepPlan(specs, values, "", naming=naming)
+        n = 0
+        for _ in plan:
+            n += 1
+        return plan, n
+
+    t_setup, _ = timed(gen_images.SweepPlan, specs, values, "", naming=naming)
+    t_total, (plan, n) = timed(build_and_walk)
+    tracemalloc.start()
+    build_and_walk()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return dict(combos=n, outputs=plan.expected_count, setup_s=t_setup, iterate_s=t_total - t_setup,
+                per_sec=n / max(t_total, 1e-9), peak_mb=peak / 1e6)
+
+def bench_cleanup(img_dir, plan, stray):
+    before = len(os.listdir(img_dir))
+    t, _ = timed(gen_images.cleanup_folder, img_dir, plan)
+    removed = before - len(os.listdir(img_dir))
+    return dict(files=before, removed=removed, stray=stray, seconds=t,
+                per_sec=before / max(t, 1e-9))
+
+def bench_scan(img_dir, header):
+    if header.get("naming") == "ordinal":
+        parse = ordinal_parser(header, parse_dimension_segment)
+    else:
+        parse = parse_filename
+    cache = os.path.join(img_dir, SCAN_CACHE_NAME)
+    if os.path.exists(cache):
+        os.remove(cache)
+    exts = (".png", ".mp4")
+    t_cold, out = timed(scan_entries, img_dir, exts, parse, SCAN_CACHE_NAME)
+    t_warm, _ = timed(scan_entries, img_dir, exts, parse, SCAN_CACHE_NAME)
+    t_nocache, _ = timed(scan_entries, img_dir, exts, parse, None)
+    files = sum(len(v) for v in out.values())
+    unparsed = sum(1 for v in out.values() for _, p in v if not p)
+
+    def from_manifest():
+        header2, records = read_manifest(os.path.join(img_dir, MANIFEST_NAME))
+        records = folder_records(img_dir, header2, records)
+        return viewer_entries(header2, records, parse_dimension_segment)
+    t_manifest, (pngs, mp4s) = timed(from_manifest)
+    return dict(files=files, unparsed=unparsed, cold_s=t_cold, warm_s=t_warm, nocache_s=t_nocache,
+                manifest_s=t_manifest, manifest_files=len(pngs) + len(mp4s))
+
+def bench_viewer(root, img_dir, workflow, naming):
+    results = {}
+    for label, script, extra in VIEWERS:
+        variants = [("manifest", [])]
+        if naming != "ordinal":
+            variants.append(("scan", ["--no-manifest"]))
+        for variant, flags in variants:
+            # The scripts' default names, which gen_images' cleanup keeps (see the cleanup step)
+            stem = os.path.join(img_dir, "0000_%s_viewer" % ("aligned" if label == "aligned" else "axis_grid"))
+            out_html = stem + ".html"
+            cache = stem + ".scan.json"
+            if os.path.exists(cache):
+                os.remove(cache)
+            cmd = [sys.executable, os.path.join(HERE, script), "--base", root, "--images", img_dir,
+                   "--workflow", workflow, "--output", out_html, "--no-posters"] + extra + flags
+            t, proc = timed(subprocess.run, cmd, capture_output=True, text=True)
+            key = "%s_%s" % (label, variant)
+            if proc.returncode != 0:
+                results[key] = dict(error=(proc.stderr or proc.stdout).strip().splitlines()[-1:])
+                continue
+            data_path = stem + ".data.js"
+            with open(data_path, "r", encoding="utf-8") as f:
+                text = f.read()
+            body = text[text.index("=") + 1:].rstrip().rstrip(";")
+            t_load, meta = timed(json.loads, body)
+            results[key] = dict(seconds=t, html_kb=os.path.getsize(out_html) / 1024,
+                                data_kb=len(text.encode("utf-8")) / 1024, load_s=t_load,
+                                cells=len(meta["grid"]), files=len(meta["files"]))
+    return results
+
+# -------------------- Main --------------------
+
+def fmt(v):
+    if isinstance(v, float):
+        return "%.4g" % v
+    if isinstance(v, list):
+        return " ".join(v)
+    return str(v)
+
+def main():
+    args = parse_args()
+    try:
+        sizes = [int(t) for t in args.sizes.split(",") if t.strip()]
+    except ValueError:
+        sys.exit("--sizes must be comma-separated integers, e.g. 20,20,10")
+    if not 1 <= len(sizes) <= len(gen_images.AXES) or min(sizes) < 1:
+        sys.exit("--sizes needs 1 to %d positive counts" % len(gen_images.AXES))
+    steps = [s.strip() for s in args.only.split(",") if s.strip()]
+    unknown = [s for s in steps if s not in STEPS]
+    if unknown:
+        sys.exit("Unknown step(s) in --only: %s (use %s)" % (", ".join(unknown), ",".join(STEPS)))
+
+    specs, values, types = make_axes(sizes, args.text_axis)
+    plan = gen_images.SweepPlan(specs, values, "", naming=args.naming)
+    header = plan.manifest_header(types)
+    results = dict(sizes=sizes, naming=args.naming, text_axis=args.text_axis, videos=args.videos,
+                   python=sys.version.split()[0])
+    print("Sweep: %s = %d combinations (%s naming)"
+          % (" x ".join(map(str, sizes)), plan.total, args.naming))
+
+    if "plan" in steps:
+        results["plan"] = bench_plan(specs, values, args.naming)
+        print("plan     " + "  ".join("%s=%s" % (k, fmt(v)) for k, v in results["plan"].items()))
+
+    if not set(steps) & {"cleanup", "scan", "viewer"}:
+        return finish(args, results)
+
+    # Always a fresh folder: the cleanup step deletes whatever the plan does not expect
+    if args.work_dir:
+        os.makedirs(args.work_dir, exist_ok=True)
+    root = tempfile.mkdtemp(prefix="cpv_bench_", dir=args.work_dir)
+    img_dir = os.path.join(root, "params", "images")
+    try:
+        workflow = os.path.join(root, "bench_workflow.json")
+        os.makedirs(img_dir)
+        write_workflow(workflow, sizes)
+        t, written = timed(write_outputs, img_dir, plan, header, args.max_files, args.videos, args.stray)
+        print("files    written=%d%s in %.2fs (%s)"
+              % (written, " (+mp4)" if args.videos else "", t, img_dir))
+        results["files_written"] = written
+
+        if "scan" in steps:
+            results["scan"] = bench_scan(img_dir, header)
+            print("scan     " + "  ".join("%s=%s" % (k, fmt(v)) for k, v in results["scan"].items()))
+        if "viewer" in steps:
+            results["viewer"] = bench_viewer(root, img_dir, workflow, args.naming)
+            for key, res in results["viewer"].items():
+                print("viewer   %-16s " % key + "  ".join("%s=%s" % (k, fmt(v)) for k, v in res.items()))
+        if "cleanup" in steps:
+            results["cleanup"] = bench_cleanup(img_dir, plan, args.stray)
+            print("cleanup  " + "  ".join("%s=%s" % (k, fmt(v)) for k, v in results["cleanup"].items()))
+    finally:
+        if args.keep or args.work_dir:
+            print("Kept", root)
+        else:
+            shutil.rmtree(root, ignore_errors=True)
+    return finish(args, results)
+
+def finish(args, results):
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print("Results:", args.json_out)
+
+if __name__ == "__main__":
+    main()
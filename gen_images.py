@@ -16,22 +16,113 @@
 #
 # Cleanup + Resume:
 #   Images live in <basepath>/params/images (files only; subfolders untouched).
-#   For the planned sweep, we compute the complete set of expected filenames:
-#     "<segments>_00001.png" for each permutation (segments as above)
-#   - Remove any files in that folder that are NOT in the expected set.
-#   - Resume by skipping permutations whose expected file already exists.
+#   For the planned sweep, the expected filenames are:
+#     "<segments>_00001_.png" for each permutation (segments as above, ComfyUI's
+#     counter after it), plus the "<segments>_00001_.mp4" next to it
+#   The plan is lazy: permutations are generated on demand and a file name is
+#   recognized as expected by parsing it back against the axis value tokens.
+#   - Remove any files in that folder that are NOT expected (--dry-run only lists them).
+#     The manifest, viewer pages/caches and metrics files are kept (is_sweep_artifact).
+#   - Resume by skipping permutations whose expected file already exists
+#     (one folder listing into a bitmap over the output space).
+#
+# Naming:
+#   --naming ordinal replaces the segments with the output's zero-padded ordinal
+#   ("<subfolder>/000417" -> "000417_00001_.png"). Axis values then only live in the
+#   sweep manifest (0000_sweep_manifest.jsonl), which the viewers read to resolve
+#   them, so names stay short with many axes and string axes can hold any text.
+#   A name only means something under the manifest that wrote it, so gen_images.py
+#   refuses a folder holding ordinal outputs of a different sweep (e.g. after an axis
+#   gained a value) instead of resuming or cleaning up against the new numbering.
+#
+# Ordering:
+#   --order cost puts expensive axes outermost (loader nodes, inputs with many downstream
+#   nodes; override with --axis-cost s=100) so ComfyUI's node cache is reused between
+#   consecutive prompts. --order gray also snakes the inner axes so exactly one axis
+#   changes per prompt.
+#
+# Prompt building:
+#   The API graph is serialized once with placeholders in the touched inputs (axis
+#   inputs + save target); each permutation only dumps its values into the gaps.
 #
-# Stdlib only.
+# Submission:
+#   Prompts are POSTed over pooled keep-alive connections, --concurrency at a time,
+#   with retry/backoff on transient failures (--retries, --retry-backoff).
+#   --max-pending N drip-feeds the sweep: at most N of our prompts sit in the server
+#   queue, topped up as they finish (polling /queue). Ctrl+C removes the ones still
+#   pending, so a restart resumes from the files on disk without a stale backlog.
+#
+# Several servers:
+#   --server a --server b (or "a,b") spreads the sweep over several ComfyUI servers, one
+#   dispatch thread each with its own drip-feed window (--max-pending, default 2 here).
+#   Permutations sharing the values of the --affinity axes (default: axes set on loader
+#   nodes, i.e. checkpoint/LoRA) stay on one server, so each model is loaded once per
+#   server. Idle servers steal unstarted groups, then half of a running group; a server
+#   that stops answering hands its unfinished prompts to the others. Every server must
+#   write to the same images folder (e.g. a shared output directory).
+#
+# Shards:
+#   --shard i/N renders only the i-th of N contiguous ranges of output ordinals, so N
+#   machines (each with its own ComfyUI) can run the same command line with i = 1..N.
+#   The split depends on the axis values only. merge_shards.py then combines the shard
+#   folders and their manifests into one images folder for the viewers.
+#
+# Download:
+#   --download is for servers that do not save into the images folder (remote GPUs
+#   without a shared drive). Each prompt the monitor sees finish is looked up in
+#   /history and its files are streamed from /view by a pool of --download-workers
+#   threads while the sweep goes on. A body shorter than the server's Content-Length is
+#   retried. Files are written to a temp name, read back against the received length
+#   and sha256 (a check of the local write, not of the transfer) and PNG/MP4 structure,
+#   then renamed to "<segments>_00001_.png" (.mp4, ...), so resume and the viewers
+#   treat them like local outputs. The manifest's done record lists their sha256.
+#
+# Pruning:
+#   --prune renders a probe set first: around a few random base combinations (the same
+#   ones on every run, so a restart finds them rendered), every value of each axis in
+#   turn. Values whose images match at every base (perceptual hash within
+#   --prune-threshold bits) render like the first of them, so the combinations using
+#   them are skipped; an axis without any effect collapses to one value. The probe
+#   outputs must reach the images folder (shared output folder or --download). Which
+#   value renders like which is written to the manifest, so the viewers fill a skipped
+#   combination's cell with the image it would have matched.
+#
+# Monitor:
+#   --monitor follows /ws?clientId=<client_id> and maps prompt_ids back to permutations:
+#   per-image latency, images/minute and ETA as results land, then the average
+#   execution time per axis value (which axes are expensive).
+#
+# Stdlib only; --prune uses Pillow for its perceptual hash when installed (without it,
+# only pixel-identical images count as the same).
 
 import argparse
+import base64
 import copy
+import hashlib
+import http.client
 import itertools
 import json
 import os
+import random
 import re
+import socket
+import ssl
+import struct
 import sys
+import threading
+import time
 import uuid
-from urllib import request, error
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode, urlsplit
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+from sweep_manifest import (MANIFEST_NAME, is_ordinal, is_sweep_artifact, open_manifest, output_matcher,
+                            read_manifest, same_sweep)
 
 AXES = ["s", "t", "u", "v", "x", "y", "z"]  # s and t required
 DEFAULT_WORKFLOW_FILE = "simple_image1_API.json"
@@ -57,14 +148,710 @@ def set_input_literal(prompt, node_id, input_name, value):
         raise KeyError("Node '%s' has no 'inputs' dict." % node_id)
     node["inputs"][input_name] = value  # force literal (overrides any link)
 
-def post_prompt(server, prompt_dict, client_id):
-    payload = {"prompt": prompt_dict, "client_id": client_id}
-    data = json.dumps(payload).encode("utf-8")
-    req = request.Request(server.rstrip("/") + "/prompt", data=data,
-                          headers={"Content-Type": "application/json"}, method="POST")
-    with request.urlopen(req) as resp:
-        return resp.read()
+# -------------------- Pooled prompt submission --------------------
+
+class SubmitError(Exception):
+    """Permanent /prompt failure (e.g. HTTP 400 validation error); not retried."""
+
+class ServerUnavailable(SubmitError):
+    """The server stayed unreachable through all retries; its work can go to another server."""
+
+class PromptTemplate:
+    """
+    Precompiled API prompt. The graph is serialized once with a placeholder in every
+    touched input (axis inputs plus the save-target input); render() only dumps the
+    per-permutation values and splices them between the fixed JSON fragments, so the
+    cost per prompt no longer depends on the size of the workflow.
+    """
+
+    def __init__(self, prompt_base, slots):
+        # slots: [(node_id, input_name), ...]; raise like set_input_literal on bad targets
+        prompt = copy.deepcopy(prompt_base)
+        marker = "@@slot-%s-" % uuid.uuid4().hex
+        self.slots = []
+        for key in slots:
+            if key in self.slots:
+                continue
+            set_input_literal(prompt, key[0], key[1], "%s%d" % (marker, len(self.slots)))
+            self.slots.append(key)
+        text = json.dumps(prompt)
+        # Order slots by where they landed in the serialized graph, then cut around them
+        found = sorted((text.index(json.dumps("%s%d" % (marker, i))), i) for i in range(len(self.slots)))
+        self.slots = [self.slots[i] for _, i in found]
+        self.fragments = []
+        pos = 0
+        for start, i in found:
+            self.fragments.append(text[pos:start])
+            pos = start + len(json.dumps("%s%d" % (marker, i)))
+        self.fragments.append(text[pos:])
+
+    def render(self, values):
+        """values: {(node_id, input_name): literal} for every slot. Returns prompt JSON text."""
+        out = [self.fragments[0]]
+        for key, frag in zip(self.slots, self.fragments[1:]):
+            out.append(json.dumps(values[key]))
+            out.append(frag)
+        return "".join(out)
+
+def build_payload(prompt_json, client_id, number=None):
+    """/prompt body around an already serialized prompt (see PromptTemplate.render)."""
+    head = '{"prompt": %s, "client_id": %s' % (prompt_json, json.dumps(client_id))
+    if number is not None:
+        head += ', "number": %s' % json.dumps(number)
+    return (head + "}").encode("utf-8")
+
+class PromptSubmitter:
+    """
+    POSTs prompts to <server>/prompt from a small thread pool. Each worker keeps one
+    keep-alive HTTP connection. At most 'concurrency' POSTs are in flight and at most
+    2*concurrency bodies are waiting, so a lazy plan is never drained into memory.
+
+    With concurrency > 1 arrival order is not guaranteed, so each payload carries an
+    explicit queue 'number' (ComfyUI orders its queue by it) to keep the fixed axis order.
+    Connection errors, HTTP 429 and 5xx are retried with exponential backoff; anything
+    else is fatal and stops further submissions. A POST that may have reached ComfyUI
+    (connection lost after sending, 5xx) is only sent again once /queue and /history
+    show that our client_id has no such prompt, so a retry never queues it twice.
+    """
+
+    RETRY_STATUS = (429, 500, 502, 503, 504)
+    HISTORY_LOOKBACK = 256      # recent /history entries searched before a resubmit
+
+    def __init__(self, server, client_id, concurrency=1, retries=5, backoff=1.0, timeout=60.0):
+        u = urlsplit(server)
+        self.https = u.scheme == "https"
+        self.host = u.hostname or "127.0.0.1"
+        self.port = u.port
+        self.base_path = u.path.rstrip("/")
+        self.server = server
+        self.client_id = client_id
+        self.concurrency = max(1, int(concurrency))
+        self.retries = max(0, int(retries))
+        self.backoff = backoff
+        self.timeout = timeout
+        self.failed = None
+        self.ok = 0
+        self._local = threading.local()
+        self._slots = threading.BoundedSemaphore(self.concurrency * 2)
+        self._pool = ThreadPoolExecutor(max_workers=self.concurrency,
+                                        thread_name_prefix="submit")
+        self._number_base = self._queue_number_base() if self.concurrency > 1 else None
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+            conn = cls(self.host, self.port, timeout=self.timeout)
+            self._local.conn = conn
+        return conn
+
+    def _drop_connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def request(self, method, path, body=None, sink=None, reconnect=True):
+        """
+        One request over this thread's keep-alive connection. Returns (status, bytes).
+        With sink (called with each chunk), a 200 body is streamed to it instead and the
+        byte count is returned in place of the bytes; a body shorter than the server's
+        Content-Length raises HTTPException. A stale pooled connection is reopened once
+        before reporting the error (not once the body has started, nor without reconnect).
+        """
+        headers = {"Connection": "keep-alive"}
+        if body is not None:
+            headers["Content-Type"] = "application/json"
+        for attempt in (0, 1):
+            conn = self._connection()
+            streamed = False
+            try:
+                conn.request(method, self.base_path + path, body=body, headers=headers)
+                resp = conn.getresponse()
+                if sink is not None and resp.status == 200:
+                    data = 0
+                    for chunk in iter(lambda: resp.read(1 << 16), b""):
+                        streamed = True
+                        sink(chunk)
+                        data += len(chunk)
+                    # http.client ends a body cut off by the server without an error
+                    expected = resp.getheader("Content-Length")
+                    if expected is not None and expected.isdigit() and int(expected) != data:
+                        raise http.client.HTTPException("body ended after %d of %s bytes (Content-Length)"
+                                                        % (data, expected))
+                else:
+                    data = resp.read()
+                if resp.will_close:
+                    self._drop_connection()
+                return resp.status, data
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                self._drop_connection()
+                if attempt or streamed or not reconnect:
+                    raise
+            except Exception:
+                self._drop_connection()
+                raise
+
+    def _queue_number_base(self):
+        # Continue after anything already queued so our explicit numbers sort last
+        try:
+            status, data = self.request("GET", "/queue")
+            q = json.loads(data.decode("utf-8")) if status == 200 else {}
+            nums = [item[0] for key in ("queue_running", "queue_pending")
+                    for item in q.get(key, []) if item]
+            return int(max(nums)) + 1 if nums else 0
+        except Exception:
+            return 0
+
+    def number_for(self, seq):
+        return None if self._number_base is None else self._number_base + seq
+
+    def find_prompt(self, body):
+        """prompt_id under which the server already holds body's prompt for our client_id, else None."""
+        prompt = json.loads(body.decode("utf-8"))["prompt"]
+        status, data = self.request("GET", "/queue")
+        if status != 200:
+            raise SubmitError("GET /queue returned HTTP %d" % status)
+        q = json.loads(data.decode("utf-8"))
+        items = q.get("queue_running", []) + q.get("queue_pending", [])
+        status, data = self.request("GET", "/history?max_items=%d" % self.HISTORY_LOOKBACK)
+        if status != 200:
+            raise SubmitError("GET /history returned HTTP %d" % status)
+        items += [entry.get("prompt") for entry in json.loads(data.decode("utf-8")).values()]
+        for item in items:
+            # [number, prompt_id, prompt, extra_data, outputs_to_execute]
+            if (isinstance(item, list) and len(item) > 3 and isinstance(item[3], dict)
+                    and item[3].get("client_id") == self.client_id and item[2] == prompt):
+                return item[1]
+        return None
+
+    def post(self, body):
+        """POST one payload with retry/backoff. Returns the decoded /prompt response."""
+        delay = self.backoff
+        maybe_sent = False
+        for attempt in range(self.retries + 1):
+            try:
+                if maybe_sent:
+                    # The last attempt may have been queued: look before sending it again
+                    pid = self.find_prompt(body)
+                    if pid is not None:
+                        print("[RETRY] prompt was queued after all (%s)" % pid, file=sys.stderr)
+                        return {"prompt_id": pid}
+                    maybe_sent = False
+                status, data = self.request("POST", "/prompt", body, reconnect=False)
+            except ConnectionRefusedError as e:
+                reason = str(e) or e.__class__.__name__     # never reached the server
+            except (OSError, http.client.HTTPException, SubmitError, ValueError) as e:
+                reason = str(e) or e.__class__.__name__
+                maybe_sent = True
+            else:
+                if status == 200:
+                    return json.loads(data.decode("utf-8")) if data else {}
+                msg = data.decode("utf-8", errors="ignore")
+                if status not in self.RETRY_STATUS:
+                    raise SubmitError("HTTP %d: %s" % (status, msg))
+                reason = "HTTP %d" % status
+                maybe_sent = status != 429
+            if attempt == self.retries:
+                raise ServerUnavailable("%s (gave up after %d attempts)" % (reason, attempt + 1))
+            print("[RETRY] %s; retrying in %.1fs" % (reason, delay), file=sys.stderr)
+            time.sleep(delay)
+            delay = min(delay * 2, 30.0)
+
+    def submit(self, body, on_ok=None):
+        """Queue one POST; blocks while the pending window is full."""
+        self._slots.acquire()
+        try:
+            fut = self._pool.submit(self.post, body)
+        except Exception:
+            self._slots.release()
+            raise
+        fut.add_done_callback(lambda f: self._done(f, on_ok))
+        return fut
+
+    def _done(self, fut, on_ok):
+        self._slots.release()
+        exc = fut.exception()
+        if exc is not None:
+            if self.failed is None:
+                self.failed = exc
+                print("[ERR] %s" % str(exc), file=sys.stderr)
+            return
+        self.ok += 1
+        if on_ok is not None:
+            on_ok(fut.result())
+
+    def close(self, cancel=False):
+        self._pool.shutdown(wait=True, cancel_futures=cancel)
+
+# -------------------- Drip-feed (bounded server queue) --------------------
+
+class QueueThrottle:
+    """
+    Keeps at most max_pending of OUR prompts queued or running on the server.
+    Tracks the prompt_ids we queued and, once the window is full, polls GET /queue
+    until some of them have left it. On abort, cancel_pending() deletes the ones
+    still waiting so a restart resumes from the files on disk without a backlog.
+    With max_failures, that many failed polls in a row raise ServerUnavailable.
+    """
+
+    def __init__(self, submitter, max_pending, poll_interval=2.0, max_failures=0):
+        self.submitter = submitter
+        self.max_pending = max(1, int(max_pending))
+        self.poll_interval = poll_interval
+        self.max_failures = max_failures
+        self.failures = 0
+        self.outstanding = set()
+        self.reserved = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+
+    def _queue_ids(self):
+        status, data = self.submitter.request("GET", "/queue")
+        if status != 200:
+            raise SubmitError("GET /queue returned HTTP %d" % status)
+        q = json.loads(data.decode("utf-8"))
+        running = {item[1] for item in q.get("queue_running", []) if len(item) > 1}
+        pending = {item[1] for item in q.get("queue_pending", []) if len(item) > 1}
+        return running, pending
+
+    def refresh(self):
+        """Forget our prompts that have left the server queue. Returns False if the poll failed."""
+        with self._lock:
+            # Only ids tracked before the poll can be judged by its snapshot
+            known = set(self.outstanding)
+        try:
+            running, pending = self._queue_ids()
+        except (OSError, http.client.HTTPException, ValueError) as e:
+            self.failures += 1
+            if self.max_failures and self.failures >= self.max_failures:
+                raise ServerUnavailable("queue poll failed %d times in a row: %s" % (self.failures, str(e)))
+            print("[WARN] queue poll failed: %s" % str(e), file=sys.stderr)
+            return False
+        self.failures = 0
+        with self._lock:
+            self.outstanding -= known - (running | pending)
+        return True
+
+    def acquire(self):
+        """Block until another prompt may be queued, then reserve its slot."""
+        while self.submitter.failed is None:
+            with self._lock:
+                if len(self.outstanding) + self.reserved < self.max_pending:
+                    self.reserved += 1
+                    return
+            if self.refresh():
+                with self._lock:
+                    if len(self.outstanding) + self.reserved < self.max_pending:
+                        continue
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    def finished(self, prompt_id):
+        """Completion hint (e.g. from the websocket monitor); frees the slot without a poll."""
+        with self._lock:
+            self.outstanding.discard(prompt_id)
+        self._wake.set()
+
+    def pending_ids(self):
+        with self._lock:
+            return set(self.outstanding)
+
+    def track(self, resp):
+        with self._lock:
+            self.reserved -= 1
+            pid = resp.get("prompt_id")
+            if pid:
+                self.outstanding.add(pid)
+
+    def cancel_pending(self):
+        """Delete our prompts that have not started yet. Returns how many were removed."""
+        try:
+            _, pending = self._queue_ids()
+            with self._lock:
+                ids = sorted(self.outstanding & pending)
+            if ids:
+                body = json.dumps({"delete": ids}).encode("utf-8")
+                self.submitter.request("POST", "/queue", body)
+            return len(ids)
+        except (OSError, http.client.HTTPException, ValueError, SubmitError) as e:
+            print("[WARN] could not cancel pending prompts: %s" % str(e), file=sys.stderr)
+            return 0
+
+# -------------------- Websocket completion monitor --------------------
+
+class ComfyEvents:
+    """
+    Minimal stdlib websocket client for ComfyUI's /ws?clientId=<id> event stream.
+    recv() returns decoded JSON for text frames and None for binary (preview) frames.
+    """
+
+    def __init__(self, server, client_id, timeout=None):
+        u = urlsplit(server)
+        self.secure = u.scheme == "https"
+        self.host = u.hostname or "127.0.0.1"
+        self.port = u.port or (443 if self.secure else 80)
+        self.path = "%s/ws?clientId=%s" % (u.path.rstrip("/"), client_id)
+        self.timeout = timeout
+        self.sock = None
+        self._buf = b""
+
+    def connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=10)
+        if self.secure:
+            sock = ssl.create_default_context().wrap_socket(sock, server_hostname=self.host)
+        key = base64.b64encode(os.urandom(16)).decode("ascii")
+        req = ("GET %s HTTP/1.1\r\nHost: %s:%d\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+               "Sec-WebSocket-Key: %s\r\nSec-WebSocket-Version: 13\r\n\r\n"
+               % (self.path, self.host, self.port, key))
+        sock.sendall(req.encode("ascii"))
+        self.sock = sock
+        head = b""
+        while b"\r\n\r\n" not in head:
+            chunk = sock.recv(4096)
+            if not chunk:
+                raise ConnectionError("websocket handshake: connection closed")
+            head += chunk
+        head, self._buf = head.split(b"\r\n\r\n", 1)
+        status = head.split(b"\r\n", 1)[0]
+        if b" 101 " not in status + b" ":
+            raise ConnectionError("websocket handshake failed: %s" % status.decode("latin-1"))
+        sock.settimeout(self.timeout)
+
+    def _read(self, n):
+        while len(self._buf) < n:
+            chunk = self.sock.recv(max(65536, n - len(self._buf)))
+            if not chunk:
+                raise ConnectionError("websocket closed")
+            self._buf += chunk
+        data, self._buf = self._buf[:n], self._buf[n:]
+        return data
+
+    def _send(self, opcode, payload=b""):
+        mask = os.urandom(4)
+        masked = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+        self.sock.sendall(struct.pack("!BB", 0x80 | opcode, 0x80 | len(payload)) + mask + masked)
+
+    def recv(self):
+        message, msg_op = b"", None
+        while True:
+            b0, b1 = self._read(2)
+            opcode, n = b0 & 0x0F, b1 & 0x7F
+            if n == 126:
+                n = struct.unpack("!H", self._read(2))[0]
+            elif n == 127:
+                n = struct.unpack("!Q", self._read(8))[0]
+            mask = self._read(4) if b1 & 0x80 else None
+            payload = self._read(n)
+            if mask:
+                payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+            if opcode == 0x8:
+                raise ConnectionError("websocket closed by server")
+            if opcode == 0x9:
+                self._send(0xA, payload[:125])
+                continue
+            if opcode == 0xA:
+                continue
+            if opcode in (0x1, 0x2):
+                message, msg_op = payload, opcode
+            else:
+                message += payload
+            if b0 & 0x80:
+                if msg_op == 0x1:
+                    return json.loads(message.decode("utf-8"))
+                return None
+
+    def close(self):
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            finally:
+                self.sock = None
+
+def format_duration(seconds):
+    seconds = int(max(0, seconds))
+    return "%d:%02d:%02d" % (seconds // 3600, seconds // 60 % 60, seconds % 60)
+
+class SweepMonitor:
+    """
+    Follows ComfyUI execution events for our client_id and maps prompt_ids back to
+    permutations. Prints per-image latency, images/minute and ETA as results land, and
+    a per-axis-value average execution time table at the end (which axes are expensive).
+    One event stream per server; prompt_ids are unique across servers.
+    """
+
+    def __init__(self, servers, client_id, axis_specs, axis_values, remaining, on_finish=None):
+        self.streams = [ComfyEvents(server, client_id) for server in servers]
+        self.axis_specs = axis_specs
+        self.axis_values = axis_values
+        self.remaining = remaining
+        self.on_finish = on_finish
+        self.jobs = {}        # prompt_id -> {"idxs", "tag", "queued", "start"}
+        self.early = {}       # events that arrived before the POST response: prompt_id -> [(type, t)]
+        self.finished = set()
+        self.done = 0
+        self.failed = 0
+        self.first_start = None
+        self.per_value = {}   # (axis, value index) -> [sum_seconds, count]
+        self.files = {}       # prompt_id -> output filenames from "executed" events
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._threads = []
+
+    def start(self):
+        for events in self.streams:
+            events.connect()
+        for events in self.streams:
+            t = threading.Thread(target=self._run, args=(events,), name="monitor", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def expect(self, resp, idxs, tag):
+        pid = resp.get("prompt_id")
+        if not pid:
+            return
+        with self._lock:
+            self.jobs[pid] = {"idxs": idxs, "tag": tag, "queued": time.time(), "start": None}
+            early = self.early.pop(pid, [])
+        for etype, t, err in early:
+            self._handle(pid, etype, t, err)
+
+    def _run(self, events):
+        while True:
+            try:
+                msg = events.recv()
+            except (OSError, ValueError) as e:
+                print("[WARN] monitor disconnected from %s: %s" % (events.host, str(e)), file=sys.stderr)
+                with self._lock:
+                    self._idle.notify_all()
+                return
+            if not isinstance(msg, dict):
+                continue
+            etype = msg.get("type")
+            data = msg.get("data") or {}
+            pid = data.get("prompt_id")
+            if etype == "executing" and data.get("node") is None:
+                etype = "execution_success"
+            if etype == "executed" and pid:
+                # Output node finished: remember the files it wrote
+                names = [item["filename"] for items in (data.get("output") or {}).values()
+                         if isinstance(items, list)
+                         for item in items if isinstance(item, dict) and "filename" in item]
+                with self._lock:
+                    self.files.setdefault(pid, []).extend(names)
+                continue
+            if not pid or etype not in ("execution_start", "execution_success", "execution_error",
+                                        "execution_interrupted"):
+                continue
+            err = data.get("exception_message") if etype == "execution_error" else None
+            now = time.time()
+            with self._lock:
+                if pid not in self.jobs:
+                    self.early.setdefault(pid, []).append((etype, now, err))
+                    continue
+            self._handle(pid, etype, now, err)
+
+    def _handle(self, pid, etype, t, err):
+        with self._lock:
+            job = self.jobs.get(pid)
+            if job is None or pid in self.finished:
+                return
+            if etype == "execution_start":
+                job["start"] = t
+                if self.first_start is None:
+                    self.first_start = t
+                return
+            self.finished.add(pid)
+            self.remaining = max(0, self.remaining - 1)
+            began = job["start"] or job["queued"]
+            latency = t - began
+            if etype == "execution_success":
+                self.done += 1
+                for axis, i in zip(AXES, job["idxs"]):
+                    if axis in self.axis_specs:
+                        acc = self.per_value.setdefault((axis, i), [0.0, 0])
+                        acc[0] += latency
+                        acc[1] += 1
+            else:
+                self.failed += 1
+            elapsed = t - (self.first_start or job["queued"])
+            rate = (self.done + self.failed) / elapsed * 60.0 if elapsed > 0 else 0.0
+            eta = self.remaining / rate * 60.0 if rate > 0 else 0.0
+            status = "DONE" if etype == "execution_success" else "FAIL"
+            print("[%s] %s in %.1fs | %.1f img/min | %d left | ETA %s%s"
+                  % (status, job["tag"], latency, rate, self.remaining, format_duration(eta),
+                     (" (%s)" % err) if err else ""))
+            job.update(ok=(etype == "execution_success"), latency=latency, files=self.files.pop(pid, []))
+            self._idle.notify_all()
+        if self.on_finish is not None:
+            self.on_finish(pid, job)
+
+    def wait(self, expected):
+        """Block until 'expected' prompts have finished (or the stream drops)."""
+        with self._lock:
+            while len(self.finished) < expected and self.connected():
+                self._idle.wait(1.0)
+
+    def connected(self):
+        """True while at least one event stream is still being followed."""
+        return any(t.is_alive() for t in self._threads)
+
+    def report(self):
+        with self._lock:
+            rows = sorted(self.per_value.items(), key=lambda kv: (AXES.index(kv[0][0]), kv[0][1]))
+            print("[STATS] %d images done, %d failed" % (self.done, self.failed))
+            last_axis = None
+            for (axis, i), (total, count) in rows:
+                if axis != last_axis:
+                    nid, inp = self.axis_specs[axis]
+                    print("[STATS] axis %s (%s:%s) avg execution time per value:" % (axis, nid, inp))
+                    last_axis = axis
+                print("[STATS]   %-24s %7.2fs  (n=%d)" % (str(self.axis_values[axis][i]), total / count, count))
+
+    def close(self):
+        for events in self.streams:
+            events.close()
 
+# -------------------- Output download --------------------
+
+def check_written(path, size, digest):
+    """
+    Raise ValueError unless path holds exactly the size bytes hashed to digest (sha256),
+    i.e. the bytes received made it to disk, and a PNG/MP4 is not cut short. This checks
+    the local write only; request() checks the transfer against Content-Length.
+    """
+    h = hashlib.sha256()
+    n = 0
+    with open(path, "rb") as f:
+        head = f.read(12)
+        f.seek(0)
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+            n += len(chunk)
+        f.seek(max(0, n - 12))
+        tail = f.read()
+    if n != size or h.hexdigest() != digest:
+        raise ValueError("%s: %d bytes on disk, %d received (or hash mismatch)" % (os.path.basename(path), n, size))
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".png" and (head[:8] != b"\x89PNG\r\n\x1a\n" or tail[-8:-4] != b"IEND"):
+        raise ValueError("%s: truncated PNG" % os.path.basename(path))
+    if ext == ".mp4" and head[4:8] != b"ftyp":
+        raise ValueError("%s: not an MP4" % os.path.basename(path))
+
+class OutputFetcher:
+    """
+    Downloads the outputs of finished prompts while the sweep keeps running, for servers
+    that do not save into our images folder. A thread pool looks each prompt up in
+    /history/<prompt_id> and streams its files from /view, using the submitters'
+    keep-alive connections (one per thread and server). Every file is written to a temp
+    name, read back against the received length and sha256 (and PNG/MP4 structure), then
+    renamed to the name ComfyUI would have saved: <stem>_00001_.png, <stem>_00001_.mp4
+    (a second file of the same type becomes _00002_).
+    """
+
+    def __init__(self, folder, workers=4, retries=5, backoff=1.0):
+        self.folder = folder
+        self.retries = max(0, int(retries))
+        self.backoff = backoff
+        self.files = 0
+        self.bytes = 0
+        self.failed = 0
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max(1, int(workers)), thread_name_prefix="fetch")
+
+    def fetch(self, submitter, pid, stem, on_done):
+        """Queue the outputs of prompt pid; on_done(names, sha256s, None) or on_done(None, None, error)."""
+        self._pool.submit(self._run, submitter, pid, stem, on_done)
+
+    def _retry(self, what, fn):
+        delay = self.backoff
+        for attempt in range(self.retries + 1):
+            try:
+                return fn()
+            except (OSError, http.client.HTTPException, ValueError) as e:
+                if attempt == self.retries:
+                    raise
+                reason = str(e) or e.__class__.__name__
+            print("[RETRY] %s: %s; retrying in %.1fs" % (what, reason, delay), file=sys.stderr)
+            time.sleep(delay)
+            delay = min(delay * 2, 30.0)
+
+    def _outputs(self, submitter, pid):
+        """[{"filename", "subfolder", "type"}, ...] saved by a finished prompt."""
+        status, data = submitter.request("GET", "/history/%s" % pid)
+        if status != 200:
+            raise ValueError("GET /history returned HTTP %d" % status)
+        entry = json.loads(data.decode("utf-8")).get(pid)
+        if entry is None:
+            # The completion event can arrive just before the history entry is stored
+            raise ValueError("prompt %s not in /history yet" % pid)
+        return [item for out in (entry.get("outputs") or {}).values()
+                for items in out.values() if isinstance(items, list)
+                for item in items if isinstance(item, dict) and "filename" in item
+                and item.get("type", "output") == "output"]
+
+    def _download(self, submitter, item, name):
+        path = os.path.join(self.folder, name)
+        tmp = "%s.%d.tmp" % (path, threading.get_ident())
+        query = urlencode({"filename": item["filename"], "subfolder": item.get("subfolder", ""),
+                           "type": item.get("type", "output")})
+
+        def attempt():
+            h = hashlib.sha256()
+            with open(tmp, "wb") as f:
+                def sink(chunk):
+                    f.write(chunk)
+                    h.update(chunk)
+                status, size = submitter.request("GET", "/view?" + query, sink=sink)
+            if status == 404:
+                raise SubmitError("%s not found on the server" % item["filename"])
+            if status != 200:
+                raise ValueError("GET /view returned HTTP %d" % status)
+            check_written(tmp, size, h.hexdigest())
+            return size, h.hexdigest()
+
+        try:
+            size, digest = self._retry(name, attempt)
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        with self._lock:
+            self.files += 1
+            self.bytes += size
+        return digest
+
+    def _run(self, submitter, pid, stem, on_done):
+        try:
+            items = self._retry("history of %s" % pid, lambda: self._outputs(submitter, pid))
+            names, digests, count = [], [], {}
+            for item in items:
+                ext = os.path.splitext(item["filename"])[1].lower()
+                count[ext] = count.get(ext, 0) + 1
+                name = "%s_%05d_%s" % (stem, count[ext], ext)
+                digests.append(self._download(submitter, item, name))
+                names.append(name)
+        except (OSError, http.client.HTTPException, ValueError, SubmitError) as e:
+            with self._lock:
+                self.failed += 1
+            print("[WARN] download for %s failed: %s" % (stem, str(e)), file=sys.stderr)
+            on_done(None, None, str(e))
+            return
+        if not names:
+            print("[WARN] %s saved no output files" % stem, file=sys.stderr)
+        on_done(names, digests, None)
+
+    def close(self, cancel=False):
+        """Wait for the downloads (with cancel, only the ones already running)."""
+        self._pool.shutdown(wait=True, cancel_futures=cancel)
+
+    def report(self):
+        dt = max(time.time() - self.started, 1e-6)
+        print("[FETCH] %d files, %.1f MB in %s (%.1f MB/s)%s"
+              % (self.files, self.bytes / 1e6, format_duration(dt), self.bytes / 1e6 / dt,
+                 (", %d prompts failed" % self.failed) if self.failed else ""))
+
 # -------------------- Axis spec + values --------------------
 
 _axis_spec_re = re.compile(r"^(?P<nid>\d+)-(?P<input>[A-Za-z0-9_]+)\.txt$")
@@ -156,31 +943,329 @@ def safe_value_str(v):
     else:
         s = str(v)
     return s.replace(".", "_")
-
-def build_segments(axis_specs, axis_values_for_combo):
+
+# -------------------- Sweep planner --------------------
+
+class SweepPlan:
     """
-    Build the segment string from FINAL values per (node_id,input) pair in first-appearance
-    order by axis (s,t,u,v,x,y,z). Later axes override earlier ones.
-    Returns: segments string "<id>-<prop>-<val>--..."
-    """
-    final_map = {}
-    order = []
-    for axis in AXES:
-        spec = axis_specs.get(axis)
-        if not spec:
-            continue
-        val = axis_values_for_combo.get(axis, None)
-        if val is None:
-            continue
-        nid, prop = spec
-        key = (nid, prop)
-        final_map[key] = val
-        if key not in order:
-            order.append(key)
-    parts = []
-    for (nid, prop) in order:
-        parts.append("%s-%s-%s" % (nid, prop, safe_value_str(final_map[(nid, prop)])))
-    return "--".join(parts)
+    Lazy view of the permutation space (default traversal: fixed axis order s,t,u,v,x,y,z;
+    see set_order for cache-friendly traversals).
+
+    Nothing is materialized up front: iterating yields (idxs, segments, filename_prefix)
+    on demand, and expected filenames are recognized by parsing them back against the
+    per-axis value tokens instead of being collected into a set. Existing outputs are
+    tracked in a bitmap over the *output* space, i.e. only the axes whose value ends up
+    in the filename (an axis overridden by a later axis on the same node/input is free).
+    """
+
+    SUFFIX = "_%05d_.png" % 1  # ComfyUI's counter, always _00001_.png per unique prefix
+    OUTPUT_EXTS = (".png", ".mp4")   # the image, and the video next to it (video workflows)
+
+    def __init__(self, axis_specs, axis_values, prefix_folder, naming="segments"):
+        self.axis_specs = axis_specs
+        self.axis_values = axis_values
+        self.clean_prefix = prefix_folder.rstrip("/\\")
+        self.ordinal_names = naming == "ordinal"
+        self.sizes = [len(axis_values[a]) for a in AXES]
+        self.total = 1
+        for n in self.sizes:
+            self.total *= n
+        self.order = list(range(len(AXES)))  # traversal: outermost -> innermost axis position
+        self.snake = False
+
+        # (node_id,input) keys in first-appearance order; the LAST axis setting a key wins
+        order = []
+        deciding = {}
+        for axis in AXES:
+            spec = axis_specs.get(axis)
+            if not spec:
+                continue
+            if spec not in deciding:
+                order.append(spec)
+            deciding[spec] = axis
+        self.layout = [(key, AXES.index(deciding[key])) for key in order]
+
+        # Per key: pre-rendered "<id>-<prop>-<val>" parts, value index -> canonical index.
+        # Ordinal names keep text values as-is (they never reach a filename).
+        self.parts = []
+        self.canon = []
+        self.radix = []
+        self.weights = []      # per key: canonical index -> values sharing that token
+        self.free = self.total  # permutations per output with every token used once
+        for (nid, prop), pos in self.layout:
+            vals = axis_values[AXES[pos]]
+            parts, tokens, canon = [], {}, []
+            for v in vals:
+                tok = self.token_for(v)
+                parts.append("%s-%s-%s" % (nid, prop, tok))
+                canon.append(tokens.setdefault(tok, len(tokens)))
+            self.parts.append(parts)
+            self.canon.append(canon)
+            self.radix.append(len(tokens))
+            weights = [0] * len(tokens)
+            for c in canon:
+                weights[c] += 1
+            self.weights.append(weights)
+            self.free //= len(vals)
+        self.expected_count = 1
+        for n in self.radix:
+            self.expected_count *= n
+        self.done = bytearray((self.expected_count + 7) // 8)
+        self.ordinal_width = len(str(self.expected_count - 1))
+        self.shard = None       # (index, count, first ordinal, end ordinal), see set_shard
+        self.merged = [{} for _ in self.layout]     # per key: {canonical index: representative}
+        self._matcher = output_matcher(self.manifest_header({}))
+
+    def token_for(self, v):
+        return v if self.ordinal_names and isinstance(v, str) else safe_value_str(v)
+
+    def segments_for(self, idxs):
+        return "--".join(self.parts[k][idxs[pos]] for k, (_, pos) in enumerate(self.layout))
+
+    def stem_for(self, idxs):
+        """File name stem (before ComfyUI's counter): the segments, or the padded ordinal."""
+        if self.ordinal_names:
+            return "%0*d" % (self.ordinal_width, self.output_ordinal(idxs))
+        return self.segments_for(idxs)
+
+    def filename_prefix_for(self, segments):
+        # Full filename_prefix: "<prefix_folder>/<segments>"
+        return "%s/%s" % (self.clean_prefix, segments) if self.clean_prefix else segments
+
+    def set_order(self, axis_order, snake=False):
+        """
+        Traverse axes in axis_order (outermost first, e.g. ["t", "s", ...]); idxs stay in
+        s..z order. With snake, inner axes run back and forth instead of resetting, so
+        consecutive permutations differ in exactly one axis (reflected Gray code).
+        """
+        self.order = [AXES.index(a) for a in axis_order]
+        self.snake = snake
+
+    def _traverse(self):
+        sizes = [self.sizes[pos] for pos in self.order]
+        if not self.snake:
+            return itertools.product(*[range(n) for n in sizes])
+        return snake_product(sizes)
+
+    def __iter__(self):
+        idxs = [0] * len(AXES)
+        for digits in self._traverse():
+            for pos, d in zip(self.order, digits):
+                idxs[pos] = d
+            t = tuple(idxs)
+            segments = self.stem_for(t)
+            yield t, segments, self.filename_prefix_for(segments)
+
+    def output_ordinal(self, idxs):
+        o = 0
+        for k, (_, pos) in enumerate(self.layout):
+            o = o * self.radix[k] + self.canon[k][idxs[pos]]
+        return o
+
+    def match_name(self, name):
+        """
+        Output ordinal for an expected "<segments>_00001_.png" (or .mp4) file name, else None
+        (sweep_manifest.output_matcher over this plan's header, so every tool agrees).
+        """
+        if os.path.splitext(name)[1].lower() not in self.OUTPUT_EXTS:
+            return None
+        return self._matcher(name)
+
+    def __contains__(self, name):
+        return self.match_name(name) is not None
+
+    def mark_done(self, o):
+        self.done[o >> 3] |= 1 << (o & 7)
+
+    def _mark_range(self, lo, hi):
+        while lo < hi and lo & 7:
+            self.mark_done(lo)
+            lo += 1
+        while hi > lo and hi & 7:
+            hi -= 1
+            self.mark_done(hi)
+        self.done[lo >> 3:hi >> 3] = b"\xff" * ((hi - lo) >> 3)
+
+    def set_shard(self, index, count):
+        """
+        Restrict rendering to shard index (1-based) of count: a contiguous range of output
+        ordinals, fixed by the plan alone (not by which files exist), so every machine
+        computes the same split. Outputs of the other shards are marked done, so resume,
+        pending_count() and the enqueue loops skip them; they still count as expected
+        names, so cleanup leaves them alone in a merged folder.
+        """
+        lo = (index - 1) * self.expected_count // count
+        hi = index * self.expected_count // count
+        self.shard = (index, count, lo, hi)
+        self._mark_range(0, lo)
+        self._mark_range(hi, self.expected_count)
+
+    def mark_existing(self, names):
+        """Set the resume bit for every expected file name in names. Returns {ordinal: [names]}."""
+        found = {}
+        for name in names:
+            o = self.match_name(name)
+            if o is not None:
+                self.mark_done(o)
+                found.setdefault(o, []).append(name)
+        return found
+
+    def manifest_header(self, type_map):
+        """Header for sweep_manifest: axis specs/values/types and the output key layout."""
+        axes = []
+        for axis in AXES:
+            if axis in self.axis_specs:
+                nid, inp = self.axis_specs[axis]
+                axes.append({"axis": axis, "node": nid, "input": inp, "type": type_map.get(axis) or "auto",
+                             "values": self.axis_values[axis]})
+        keys = []
+        for k, ((nid, inp), pos) in enumerate(self.layout):
+            vals = self.axis_values[AXES[pos]]
+            tokens = [None] * self.radix[k]
+            values = [None] * self.radix[k]
+            for v, ci in zip(vals, self.canon[k]):
+                if tokens[ci] is None:
+                    tokens[ci] = self.token_for(v)
+                    values[ci] = v
+            keys.append({"node": nid, "input": inp, "axis": AXES[pos], "tokens": tokens, "values": values})
+        header = {"manifest": 1, "prefix": self.clean_prefix, "suffix": self.SUFFIX, "axes": axes,
+                  "keys": keys, "total": self.total, "outputs": self.expected_count}
+        if self.ordinal_names:
+            header["naming"] = "ordinal"
+        return header
+
+    def prune(self, k, merged):
+        """
+        Skip every output whose key k uses a merged value ({canonical index: representative},
+        see PruneProbe). Checked per digit in is_done(), so nothing is marked output by output.
+        """
+        self.merged[k] = dict(merged)
+
+    def merge_table(self):
+        """Per key, the representative of every canonical index (for the manifest)."""
+        return [[m.get(c, c) for c in range(n)] for m, n in zip(self.merged, self.radix)]
+
+    def weight(self, o, weights=None):
+        """Permutations that render output o (values sharing a token each add one)."""
+        if weights is None:
+            weights = self.weights
+        w = self.free
+        for k in range(len(self.radix) - 1, -1, -1):
+            o, c = divmod(o, self.radix[k])
+            w *= weights[k][c]
+        return w
+
+    def pending_count(self):
+        """Permutations still to render (exact): neither done in the bitmap nor pruned."""
+        if self.expected_count * self.free == self.total and not any(self.merged):
+            # No repeated tokens: every output stands for the same number of permutations
+            have = bin(int.from_bytes(self.done, "little")).count("1")
+            return self.total - have * self.free
+        # Pruned values weigh nothing, so pruned outputs drop out of both terms
+        live = [[0 if c in m else w for c, w in enumerate(ws)] for ws, m in zip(self.weights, self.merged)]
+        todo = self.free
+        for ws in live:
+            todo *= sum(ws)
+        have = 0
+        for i, byte in enumerate(self.done):
+            while byte:
+                low = byte & -byte
+                have += self.weight((i << 3) + low.bit_length() - 1, live)
+                byte ^= low
+        return todo - have
+
+    def is_done(self, idxs):
+        o = self.output_ordinal(idxs)
+        if self.done[o >> 3] & (1 << (o & 7)):
+            return True
+        for k, (_, pos) in enumerate(self.layout):
+            if self.merged[k] and self.canon[k][idxs[pos]] in self.merged[k]:
+                return True     # pruned
+        return False
+
+# -------------------- Sweep ordering --------------------
+
+# ComfyUI caches node outputs between consecutive prompts, so an axis is as expensive
+# as the work it invalidates: its own node (loaders dominate) plus everything downstream.
+NODE_TYPE_COST = (
+    ("Loader", 50.0),       # CheckpointLoaderSimple, LoraLoader, UNETLoader, CLIPLoader, VAELoader...
+    ("LoadImage", 5.0),
+    ("TextEncode", 5.0),    # CLIPTextEncode and friends
+)
+
+def snake_product(sizes):
+    """Mixed-radix reflected Gray code: like itertools.product, one digit changes per step."""
+    idx = [0] * len(sizes)
+    dirs = [1] * len(sizes)
+    total = 1
+    for n in sizes:
+        total *= n
+    if not total:
+        return
+    yield tuple(idx)
+    for _ in range(total - 1):
+        for k in range(len(sizes) - 1, -1, -1):
+            nxt = idx[k] + dirs[k]
+            if 0 <= nxt < sizes[k]:
+                idx[k] = nxt
+                break
+            dirs[k] = -dirs[k]
+        yield tuple(idx)
+
+def downstream_counts(prompt):
+    """node_id -> number of nodes that (transitively) consume its outputs."""
+    consumers = {}
+    for nid, node in prompt.items():
+        for v in (node.get("inputs") or {}).values():
+            if isinstance(v, list) and len(v) == 2 and str(v[0]) in prompt:
+                consumers.setdefault(str(v[0]), set()).add(nid)
+    counts = {}
+    for nid in prompt:
+        seen, stack = set(), [nid]
+        while stack:
+            for c in consumers.get(stack.pop(), ()):
+                if c not in seen:
+                    seen.add(c)
+                    stack.append(c)
+        counts[nid] = len(seen)
+    return counts
+
+def axis_costs(prompt, axis_specs, hints=None):
+    """
+    Estimated cost of changing each provided axis: node-type weight + downstream node
+    count. hints ({axis: cost}, from --axis-cost) override the estimate.
+    """
+    below = downstream_counts(prompt)
+    costs = {}
+    for axis, (nid, _) in axis_specs.items():
+        ctype = str(prompt.get(nid, {}).get("class_type", ""))
+        weight = 0.0
+        for needle, w in NODE_TYPE_COST:
+            if needle in ctype:
+                weight = max(weight, w)
+        costs[axis] = weight + below.get(nid, 0)
+    costs.update(hints or {})
+    return costs
+
+def parse_axis_costs(items):
+    """['s=100', 't=1,u=5'] -> {'s': 100.0, 't': 1.0, 'u': 5.0}"""
+    hints = {}
+    for item in items:
+        for part in item.split(","):
+            if not part.strip():
+                continue
+            axis, sep, val = part.partition("=")
+            axis = axis.strip()
+            if not sep or axis not in AXES:
+                raise ValueError("--axis-cost entries must look like '<axis>=<cost>' (e.g. 's=100'), got '%s'" % part)
+            hints[axis] = float(val)
+    return hints
+
+def cost_order(axis_specs, costs):
+    """Axes outermost-first: expensive axes change least often; ties keep s..z order."""
+    provided = [a for a in AXES if a in axis_specs]
+    unused = [a for a in AXES if a not in axis_specs]
+    return sorted(provided, key=lambda a: -costs.get(a, 0.0)) + unused
 
 # -------------------- Images folder cleanup + resume --------------------
 
@@ -192,26 +1277,556 @@ def list_files(path):
         return [n for n in os.listdir(path) if os.path.isfile(os.path.join(path, n))]
     except FileNotFoundError:
         return []
+
+def parse_shard(text):
+    """'2/4' -> (2, 4); shards are numbered from 1."""
+    m = re.match(r"^\s*(\d+)\s*/\s*(\d+)\s*$", text)
+    if not m or not 1 <= int(m.group(1)) <= int(m.group(2)):
+        raise ValueError("--shard must look like 'i/N' with 1 <= i <= N (e.g. '2/4'), got '%s'" % text)
+    return int(m.group(1)), int(m.group(2))
 
-def cleanup_folder(images_dir_for_prefix, expected_names, verbose=False):
+def cleanup_folder(images_dir_for_prefix, expected_names, verbose=False, dry_run=False):
     """
-    Remove any files in images_dir_for_prefix that are not in expected_names.
-    Do not touch subfolders.
+    Remove any files in images_dir_for_prefix that are not in expected_names
+    (any container supporting 'in', e.g. a SweepPlan) and are not sweep artifacts
+    (manifest, viewer and metrics files). Do not touch subfolders.
+    With dry_run, only list them. Returns the number of files (to be) removed.
     """
     if not os.path.isdir(images_dir_for_prefix):
         if verbose:
             print("[INFO] Images folder %s does not exist; skipping cleanup." % images_dir_for_prefix)
-        return
+        return 0
     current = set(list_files(images_dir_for_prefix))
+    removed = 0
     for name in sorted(current):
-        if name not in expected_names:
+        if name not in expected_names and not is_sweep_artifact(name):
+            if dry_run:
+                print("[DRY] Would remove extraneous file:", name)
+                removed += 1
+                continue
             try:
                 os.remove(os.path.join(images_dir_for_prefix, name))
+                removed += 1
                 if verbose:
                     print("[CLEAN] Removed extraneous file:", name)
             except Exception as e:
                 print("[WARN] Could not remove %s: %s" % (name, str(e)), file=sys.stderr)
+    return removed
 
+def foreign_ordinal_outputs(images_dir_for_prefix, existing, header):
+    """
+    Files in the folder that are ordinal-named outputs of another sweep. An ordinal name
+    only means something under the manifest header that wrote it: after an axis changes,
+    '000004_00001_.png' is another combination (or out of range). existing is the folder's
+    read_manifest() result; without a manifest, no ordinal-named file can be attributed.
+    Segment names describe themselves, so they are never foreign.
+    """
+    if existing is not None:
+        if same_sweep(existing[0], header) or not is_ordinal(existing[0]):
+            return []
+        header = existing[0]
+    elif not is_ordinal(header):
+        return []
+    match = output_matcher(header)
+    return sorted(n for n in list_files(images_dir_for_prefix) if match(n) is not None)
+
+# -------------------- Enqueue loop --------------------
+
+def permutation_values(axis_specs, axis_values, idxs, target, filename_prefix):
+    """Input literals for one permutation (later axes override earlier ones) and its log tag."""
+    values = {}
+    log_parts = []
+    for axis, i in zip(AXES, idxs):
+        val = axis_values[axis][i]
+        spec = axis_specs.get(axis)
+        if spec is None or val is None:
+            continue
+        values[spec] = val
+        log_parts.append("%s=%s" % (axis, str(val)))
+    # Set ONLY on the specified target node and input
+    values[target] = filename_prefix
+    return values, (" ".join(log_parts) if log_parts else "(no axes set)")
+
+def enqueue_plan(plan, template, axis_specs, axis_values, target, submitter, throttle,
+                 client_id, images_dir_for_prefix, monitor=None, manifest=None, verbose=False):
+    """Walk the plan in order and queue every permutation whose output is missing."""
+    seq = 0
+    for idxs, segments, filename_prefix in plan:
+        if submitter.failed is not None:
+            break
+        # If this expected file already exists, skip
+        if plan.is_done(idxs):
+            if verbose:
+                print("[SKIP] %s already exists" % os.path.join(images_dir_for_prefix, segments + plan.SUFFIX))
+            continue
+
+        # Apply axis values in axis order (later axes override earlier ones) + save target
+        values, tag = permutation_values(axis_specs, axis_values, idxs, target, filename_prefix)
+        body = build_payload(template.render(values), client_id, submitter.number_for(seq))
+        seq += 1
+        if throttle is not None:
+            throttle.acquire()
+            if submitter.failed is not None:
+                break
+
+        def on_ok(resp, tag=tag, fp=filename_prefix, idxs=idxs):
+            if throttle is not None:
+                throttle.track(resp)
+            if manifest is not None:
+                manifest.record(plan.output_ordinal(idxs), "queued", pid=resp.get("prompt_id"))
+            if monitor is not None:
+                monitor.expect(resp, idxs, tag)
+            print("[OK]  %s -> queued (prefix=%s)" % (tag, fp))
+
+        submitter.submit(body, on_ok=on_ok)
+
+# -------------------- Multi-server sharding --------------------
+
+SHARD_PENDING = 2           # per-server drip-feed window when --max-pending is not set
+SHARD_POLL_FAILURES = 3     # failed /queue polls in a row before a server counts as down
+
+def split_servers(items):
+    """['http://a:8188,http://b:8188', 'http://c:8188'] -> URLs in order, duplicates dropped."""
+    servers = []
+    for item in items:
+        for url in item.split(","):
+            url = url.strip()
+            if url and url not in servers:
+                servers.append(url)
+    return servers
+
+def affinity_axes(prompt, axis_specs):
+    """Provided axes that set an input of a loader node (checkpoint, LoRA, ...)."""
+    return [a for a in AXES if a in axis_specs
+            and "Loader" in str(prompt.get(axis_specs[a][0], {}).get("class_type", ""))]
+
+def parse_affinity(text, axis_specs):
+    """'s,t' -> ['s', 't'] (provided axes only); 'none' -> []."""
+    if text.strip().lower() == "none":
+        return []
+    axes = [a.strip() for a in text.split(",") if a.strip()]
+    bad = [a for a in axes if a not in axis_specs]
+    if bad:
+        raise ValueError("--affinity takes provided axes (e.g. 's,t') or 'none', got '%s'" % ",".join(bad))
+    return [a for a in AXES if a in axes]
+
+class ShardServer:
+    """One server of a sharded sweep: its submitter, drip-feed window and queued prompts."""
+
+    def __init__(self, url, submitter, max_pending, poll_interval):
+        self.url = url
+        self.submitter = submitter
+        self.throttle = QueueThrottle(submitter, max_pending, poll_interval, max_failures=SHARD_POLL_FAILURES)
+        self.jobs = {}          # prompt_id -> idxs of prompts that may still be on the server
+        self.key = None         # affinity values of the group it works on (the loaded model)
+        self.dead = False
+        self.sent = 0
+
+    def unfinished(self):
+        """idxs of our prompts still queued or running here (as of the last poll)."""
+        live = self.throttle.pending_ids()
+        self.jobs = {pid: idxs for pid, idxs in self.jobs.items() if pid in live}
+        return list(self.jobs.values())
+
+class ShardScheduler:
+    """
+    Hands a plan's permutations out to several servers.
+
+    Permutations sharing the values of the affinity axes (by default the ones set on
+    loader nodes: checkpoint, LoRA, ...) form a group, numbered in the plan's traversal
+    order. Each server starts on its own contiguous block of groups and renders a group
+    in plan order, so it loads each model once and keeps ComfyUI's cache warm. A server
+    that runs dry takes the work of a failed server, then steals the back half of the
+    largest unstarted block, then the back half of another server's current group.
+    A server that goes down hands back its block, its group and its unfinished prompts.
+    """
+
+    STEAL_MIN = 2       # smallest remainder of a group worth splitting
+
+    def __init__(self, plan, affinity, servers):
+        self.plan = plan
+        outer = {AXES.index(a) for a in affinity}
+        self.outer = [pos for pos in plan.order if pos in outer]
+        self.inner = [pos for pos in plan.order if pos not in outer]
+        self.group_count = 1
+        for pos in self.outer:
+            self.group_count *= plan.sizes[pos]
+        self.group_size = plan.total // self.group_count
+        self.servers = servers
+        n = len(servers)
+        self.blocks = {srv: [k * self.group_count // n, (k + 1) * self.group_count // n]
+                       for k, srv in enumerate(servers)}
+        self.ranges = {srv: None for srv in servers}    # [group, next, end] being rendered
+        self.retry = []         # idxs handed back by a failed server
+        self.handed_back = 0
+        self.failed = None
+        self._cond = threading.Condition()
+
+    def _digits(self, i, positions, idxs):
+        """Write index i of the sub-space over positions (outermost first) into idxs."""
+        sizes = [self.plan.sizes[pos] for pos in positions]
+        digits = []
+        for n in reversed(sizes):
+            digits.append(i % n)
+            i //= n
+        digits.reverse()
+        above = 0
+        for pos, n, d in zip(positions, sizes, digits):
+            # Snake order (see snake_product): a digit runs backwards when the count above it is odd
+            idxs[pos] = n - 1 - d if self.plan.snake and above & 1 else d
+            above = above * n + d
+
+    def _idxs(self, group, i):
+        idxs = [0] * len(AXES)
+        self._digits(group, self.outer, idxs)
+        self._digits(i, self.inner, idxs)
+        return tuple(idxs)
+
+    def _key(self, idxs):
+        return tuple(idxs[pos] for pos in self.outer)
+
+    def describe(self, idxs):
+        return " ".join("%s=%s" % (AXES[pos], self.plan.axis_values[AXES[pos]][idxs[pos]])
+                        for pos in self.outer) or "all"
+
+    def _start(self, srv, r):
+        self.ranges[srv] = r
+        key = self._key(self._idxs(r[0], 0))
+        if key != srv.key:
+            srv.key = key
+            print("[SHARD] %s: %s (%d permutations)" % (srv.url, self.describe(self._idxs(r[0], 0)), r[2] - r[1]))
+
+    def _refill(self, srv):
+        """Give srv new work; False when there is nothing left to hand out."""
+        blk = self.blocks[srv]
+        if blk[0] < blk[1]:
+            self._start(srv, [blk[0], 0, self.group_size])
+            blk[0] += 1
+            return True
+        for other in self.servers:
+            if not other.dead:
+                continue
+            r = self.ranges[other]
+            if r is not None and r[1] < r[2]:
+                self.ranges[other] = None
+                self._start(srv, r)
+                return True
+            b = self.blocks[other]
+            if b[0] < b[1]:
+                self.blocks[srv] = list(b)
+                b[0] = b[1]
+                return True
+        alive = [o for o in self.servers if o is not srv and not o.dead]
+        victim = max(alive, key=lambda o: self.blocks[o][1] - self.blocks[o][0], default=None)
+        if victim is not None:
+            b = self.blocks[victim]
+            left = b[1] - b[0]
+            if left > 0:
+                self.blocks[srv] = [b[1] - (left + 1) // 2, b[1]]
+                b[1] = self.blocks[srv][0]
+                return True
+        busy = [o for o in alive if self.ranges[o] is not None]
+        victim = max(busy, key=lambda o: self.ranges[o][2] - self.ranges[o][1], default=None)
+        if victim is not None:
+            r = self.ranges[victim]
+            left = r[2] - r[1]
+            if left >= self.STEAL_MIN:
+                self._start(srv, [r[0], r[2] - left // 2, r[2]])
+                r[2] -= left // 2
+                return True
+        return False
+
+    def take(self, srv):
+        """Next permutation (idxs) for srv, or None when there is nothing to hand out now."""
+        with self._cond:
+            while self.failed is None:
+                if self.retry:
+                    k = next((k for k, idxs in enumerate(self.retry) if self._key(idxs) == srv.key), 0)
+                    return self.retry.pop(k)
+                r = self.ranges[srv]
+                if r is not None and r[1] < r[2]:
+                    idxs = self._idxs(r[0], r[1])
+                    r[1] += 1
+                    if not self.plan.is_done(idxs):
+                        return idxs
+                elif not self._refill(srv):
+                    return None
+            return None
+
+    def finished(self):
+        """True once everything is handed out and every live server has drained its queue."""
+        with self._cond:
+            if self.failed is not None:
+                return True
+            if self.retry:
+                return False
+            for srv in self.servers:
+                r, b = self.ranges[srv], self.blocks[srv]
+                if (r is not None and r[1] < r[2]) or b[0] < b[1]:
+                    return False
+            return all(srv.dead or not srv.throttle.pending_ids() for srv in self.servers)
+
+    def wait(self, timeout):
+        with self._cond:
+            self._cond.wait(timeout)
+
+    def server_down(self, srv, idxs=None):
+        """Mark srv failed and hand back its unfinished prompts (plus idxs, if it held one)."""
+        with self._cond:
+            srv.dead = True
+            back = srv.unfinished() + ([idxs] if idxs is not None else [])
+            self.retry.extend(back)
+            self.handed_back += len(back)
+            if all(o.dead for o in self.servers):
+                self.abort(ServerUnavailable("all servers are down"))
+            self._cond.notify_all()
+        return len(back)
+
+    def abort(self, exc):
+        with self._cond:
+            if self.failed is None:
+                self.failed = exc
+            for srv in self.servers:
+                srv.submitter.failed = exc      # releases a worker blocked in throttle.acquire()
+            self._cond.notify_all()
+
+def shard_worker(sched, srv, prepare, manifest=None, monitor=None):
+    """Dispatch loop of one server: take, render, queue; returns when the sweep is done."""
+    idxs = None
+    try:
+        while sched.failed is None:
+            idxs = sched.take(srv)
+            if idxs is None:
+                if sched.finished():
+                    return
+                # Nothing to hand out: keep following our own queue (a failure now still
+                # moves its prompts) and wait for work handed back by a failed server
+                srv.throttle.refresh()
+                sched.wait(srv.throttle.poll_interval)
+                continue
+            body, tag, filename_prefix = prepare(idxs)
+            srv.throttle.acquire()
+            if sched.failed is not None:
+                return
+            resp = srv.submitter.post(body)
+            srv.throttle.track(resp)
+            pid = resp.get("prompt_id")
+            if pid:
+                srv.jobs[pid] = idxs
+            srv.sent += 1
+            if manifest is not None:
+                manifest.record(sched.plan.output_ordinal(idxs), "queued", pid=pid, server=srv.url)
+            if monitor is not None:
+                monitor.expect(resp, idxs, tag)
+            idxs = None
+            print("[OK]  %s -> queued on %s (prefix=%s)" % (tag, srv.url, filename_prefix))
+    except ServerUnavailable as e:
+        n = sched.server_down(srv, idxs)
+        print("[FAILOVER] %s is down (%s); %d prompt(s) moved to the other servers."
+              % (srv.url, str(e), n), file=sys.stderr)
+    except SubmitError as e:
+        print("[ERR] %s: %s" % (srv.url, str(e)), file=sys.stderr)
+        sched.abort(e)
+
+def run_shards(sched, prepare, manifest=None, monitor=None):
+    """One dispatch thread per server; returns when all are done (Ctrl+C propagates)."""
+    threads = []
+    for k, srv in enumerate(sched.servers):
+        t = threading.Thread(target=shard_worker, args=(sched, srv, prepare, manifest, monitor),
+                             name="shard-%d" % k, daemon=True)
+        t.start()
+        threads.append(t)
+    try:
+        for t in threads:
+            while t.is_alive():
+                t.join(0.5)
+    except KeyboardInterrupt:
+        sched.abort(SubmitError("interrupted"))
+        for t in threads:
+            t.join()
+        raise
+
+# -------------------- Adaptive pruning --------------------
+
+PRUNE_HASH = 16         # dHash grid side: PRUNE_HASH^2 bits per image
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+def image_hash(path):
+    """
+    Perceptual difference hash (int, PRUNE_HASH^2 bits) of an image, with Pillow. Without
+    it, a digest (str) of the PNG's header and decompressed pixel stream, so only images
+    with identical pixels compare equal (the embedded workflow text is ignored either way).
+    """
+    if Image is not None:
+        with Image.open(path) as im:
+            im.draft("L", (PRUNE_HASH * 8, PRUNE_HASH * 8))
+            px = im.convert("L").resize((PRUNE_HASH + 1, PRUNE_HASH), Image.BILINEAR).tobytes()
+        bits = 0
+        for y in range(PRUNE_HASH):
+            row = px[y * (PRUNE_HASH + 1):(y + 1) * (PRUNE_HASH + 1)]
+            for x in range(PRUNE_HASH):
+                bits = bits << 1 | (row[x] < row[x + 1])
+        return bits
+    h = hashlib.sha256()
+    z = zlib.decompressobj()
+    with open(path, "rb") as f:
+        if f.read(8) != PNG_SIGNATURE:
+            raise ValueError("not a PNG (install Pillow to compare other formats)")
+        while True:
+            head = f.read(8)
+            if len(head) < 8:
+                raise ValueError("truncated PNG")
+            size, kind = struct.unpack(">I4s", head)
+            data = f.read(size)
+            f.read(4)       # CRC
+            if kind == b"IHDR":
+                h.update(data)
+            elif kind == b"IDAT":
+                h.update(z.decompress(data))
+            elif kind == b"IEND":
+                break
+    h.update(z.flush())
+    return h.hexdigest()
+
+def hash_distance(a, b):
+    """Differing bits of two image_hash() values (digests: 0 or 'all')."""
+    if isinstance(a, int) and isinstance(b, int):
+        return bin(a ^ b).count("1")
+    return 0 if a == b else PRUNE_HASH * PRUNE_HASH
+
+class PruneProbe:
+    """
+    Probe set and value merging for --prune, over the plan's output keys (an axis
+    overridden by a later one on the same input is already free).
+
+    A few base outputs are picked at random, seeded by the plan's size so every run
+    picks the same ones; the probes are the outputs that differ from a base in one key
+    only, for every value of every key with more than one value. Once they have
+    rendered, a key's values are grouped: a value joins the first earlier value whose
+    probe images hash alike at every base. The plan then skips the outputs using any
+    value that was merged into another one (SweepPlan.prune).
+    """
+
+    def __init__(self, plan, bases=3, threshold=3):
+        self.plan = plan
+        self.threshold = threshold
+        rng = random.Random(plan.expected_count)
+        self.bases = [[rng.randrange(n) for n in plan.radix] for _ in range(max(1, bases))]
+        self.ordinals = set()
+        for base in self.bases:
+            for k, n in enumerate(plan.radix):
+                if n > 1:
+                    self.ordinals.update(self._ordinal(base, k, c) for c in range(n))
+        self.files = {}         # probe ordinal -> output file names
+        self.arrived = 0
+        self.merged = {}        # key index -> {merged value index: representative}
+        self._saved = None
+        self._cond = threading.Condition()
+
+    def _ordinal(self, base, k, c):
+        o = 0
+        for j, n in enumerate(self.plan.radix):
+            o = o * n + (c if j == k else base[j])
+        return o
+
+    def record(self, o, names):
+        """Output files of a probe that is already rendered (resume)."""
+        if o in self.ordinals and names:
+            self.files[o] = list(names)
+
+    def landed(self, o, names):
+        """A probe prompt finished (names None when it failed or its download did)."""
+        if o not in self.ordinals:
+            return
+        with self._cond:
+            self.record(o, names)
+            self.arrived += 1
+            self._cond.notify_all()
+
+    def wait(self, count, monitor):
+        """Block until count probe prompts have landed (or the monitor lost the server)."""
+        with self._cond:
+            while self.arrived < count and monitor.connected():
+                self._cond.wait(1.0)
+
+    def restrict(self):
+        """Leave only the missing probes to render; prune() restores the bitmap."""
+        plan = self.plan
+        self._saved = bytes(plan.done)
+        plan._mark_range(0, plan.expected_count)
+        for o in self.ordinals:
+            if not self._saved[o >> 3] & (1 << (o & 7)):
+                plan.done[o >> 3] &= ~(1 << (o & 7)) & 0xFF
+        return len(self.ordinals) - sum(1 for o in self.ordinals if plan.done[o >> 3] & (1 << (o & 7)))
+
+    def describe(self, k, c):
+        pos = self.plan.layout[k][1]
+        return str(self.plan.axis_values[AXES[pos]][self.plan.canon[k].index(c)])
+
+    def _hashes(self, folder):
+        hashes = {}
+        missing = 0
+        for o in sorted(self.ordinals):
+            names = [n for n in self.files.get(o, ()) if os.path.splitext(n)[1].lower() == ".png"]
+            if not names:
+                continue
+            path = os.path.join(folder, os.path.basename(names[0]))
+            try:
+                hashes[o] = image_hash(path)
+            except FileNotFoundError:
+                missing += 1
+            except (OSError, ValueError) as e:
+                print("[WARN] --prune: cannot hash %s: %s" % (os.path.basename(path), str(e)), file=sys.stderr)
+        if missing:
+            print("[WARN] --prune: %d probe outputs are not in %s; --prune needs the outputs there "
+                  "(shared output folder or --download)." % (missing, folder), file=sys.stderr)
+        return hashes
+
+    def _same(self, hashes, k, a, b):
+        for base in self.bases:
+            ha = hashes.get(self._ordinal(base, k, a))
+            hb = hashes.get(self._ordinal(base, k, b))
+            if ha is None or hb is None or hash_distance(ha, hb) > self.threshold:
+                return False
+        return True
+
+    def prune(self, folder):
+        """Group values by their probe images, skip the merged ones. Returns permutations skipped."""
+        plan = self.plan
+        plan.done[:] = self._saved
+        for o in self.files:
+            plan.mark_done(o)
+        before = plan.pending_count()
+        hashes = self._hashes(folder)
+        for k, n in enumerate(plan.radix):
+            if n < 2:
+                continue
+            reps = []
+            merged = {}
+            for c in range(n):
+                rep = next((r for r in reps if self._same(hashes, k, r, c)), None)
+                if rep is None:
+                    reps.append(c)
+                else:
+                    merged[c] = rep
+            if not merged:
+                continue
+            self.merged[k] = merged
+            (nid, inp), pos = plan.layout[k]
+            label = "axis %s (%s:%s)" % (AXES[pos], nid, inp)
+            if len(reps) == 1:
+                print("[PRUNE] %s has no effect at %d probe(s); only %s is rendered"
+                      % (label, len(self.bases), self.describe(k, 0)))
+            else:
+                for r in reps:
+                    same = [self.describe(k, c) for c, to in sorted(merged.items()) if to == r]
+                    if same:
+                        print("[PRUNE] %s: %s render like %s; skipped" % (label, ", ".join(same), self.describe(k, r)))
+            plan.prune(k, merged)
+        skipped = before - plan.pending_count()
+        print("[PRUNE] %d of %d permutations skipped" % (skipped, plan.total))
+        return skipped
+
 # -------------------- Main --------------------
 
 def main():
@@ -222,8 +1837,9 @@ def main():
                     help="Project base folder (default: current working directory). Must contain 'params' subfolder.")
     ap.add_argument("--workflow_api", default=None,
                     help="Path to API-format workflow JSON (default: <basepath>/%s)." % DEFAULT_WORKFLOW_FILE)
-    ap.add_argument("--server", default="http://127.0.0.1:8188",
-                    help="ComfyUI server base URL.")
+    ap.add_argument("--server", action="append", default=[],
+                    help="ComfyUI server base URL (default: http://127.0.0.1:8188). Repeat it, or give "
+                         "a comma-separated list, to spread the sweep over several servers.")
     ap.add_argument("--client-id", default=None,
                     help="Optional client_id (default: random UUID4).")
 
@@ -243,10 +1859,65 @@ def main():
                     help=("Target node, input, and base subfolder, e.g. '9:filename_prefix:SampleImageDemo'. "
                           "The script sets that node's input to '<subfolder>/<segments>' for each permutation."))
 
+    ap.add_argument("--concurrency", type=int, default=1,
+                    help="Number of in-flight POSTs over pooled keep-alive connections (default: 1; single server). "
+                         "Above 1, prompts carry an explicit queue number to keep the axis order.")
+    ap.add_argument("--retries", type=int, default=5,
+                    help="Retries per prompt on connection errors, HTTP 429 and 5xx (default: 5).")
+    ap.add_argument("--retry-backoff", type=float, default=1.0,
+                    help="Initial retry delay in seconds; doubles per attempt up to 30s (default: 1.0).")
+    ap.add_argument("--max-pending", type=int, default=0,
+                    help="Drip-feed: keep at most N of this sweep's prompts queued on the server, "
+                         "topping up as they finish (default: 0 = queue everything at once).")
+    ap.add_argument("--poll-interval", type=float, default=2.0,
+                    help="Seconds between /queue polls while the drip-feed window is full (default: 2.0).")
+    ap.add_argument("--order", choices=("fixed", "cost", "gray"), default="fixed",
+                    help="Traversal order. fixed: s,t,u,v,x,y,z (default). cost: expensive axes "
+                         "(loaders, inputs with many downstream nodes) outermost so ComfyUI's cache "
+                         "is reused. gray: cost order, inner axes snake back and forth so only one "
+                         "axis changes between consecutive prompts.")
+    ap.add_argument("--axis-cost", action="append", default=[],
+                    help="Cost hint overriding the node-type heuristic, e.g. 's=100' or 's=100,t=1'. Repeatable.")
+    ap.add_argument("--shard", default=None,
+                    help="Render only part i of N of the sweep, e.g. '2/4' (a fixed range of outputs, "
+                         "the same on every machine). Combine the folders with merge_shards.py.")
+    ap.add_argument("--affinity", default=None,
+                    help="With several servers: axes whose values stay together on one server to avoid "
+                         "model reloads, e.g. 's,t', or 'none' (default: axes set on loader nodes).")
+    ap.add_argument("--monitor", action="store_true",
+                    help="Follow completions on ComfyUI's websocket and report per-image latency, "
+                         "images/minute, ETA and per-axis-value average execution time.")
+    ap.add_argument("--download", action="store_true",
+                    help="Fetch every finished output over /history and /view into the images folder as "
+                         "'<segments>_00001_.png' (for servers that do not save there). Implies --monitor.")
+    ap.add_argument("--download-workers", type=int, default=4,
+                    help="Parallel downloads with --download (default: 4).")
+    ap.add_argument("--prune", action="store_true",
+                    help="Adaptive pruning: render a probe set first (every value of each axis around a few "
+                         "random base combinations), compare the images with a perceptual hash and skip the "
+                         "combinations using values that render like another value. Implies --monitor; the "
+                         "outputs must reach the images folder (shared output folder or --download).")
+    ap.add_argument("--prune-probes", type=int, default=3,
+                    help="Base combinations each axis is probed at with --prune (default: 3). More make a "
+                         "false 'no effect' (a value that only matters with other settings) less likely.")
+    ap.add_argument("--prune-threshold", type=int, default=3,
+                    help="Differing hash bits (of %d) up to which two probe images count as the same "
+                         "(default: 3; 0 = equal hashes). Without Pillow only identical pixels count."
+                         % (PRUNE_HASH * PRUNE_HASH))
+    ap.add_argument("--naming", choices=("segments", "ordinal"), default="segments",
+                    help="Output file names. segments: '<nodeId>-<input>-<value>--...' (default). "
+                         "ordinal: the output's number, e.g. '000417_00001_.png'; axis values are "
+                         "resolved through %s, so keep it next to the images." % MANIFEST_NAME)
+    ap.add_argument("--trust-manifest", action="store_true",
+                    help="Resume from %s in the images folder instead of scanning it "
+                         "(also skips cleanup). Falls back to a scan if it does not match the sweep." % MANIFEST_NAME)
     ap.add_argument("--dry-run", action="store_true", help="Do not POST; just print plan and cleanup actions.")
     ap.add_argument("--verbose", action="store_true", help="Verbose logging.")
 
     args = ap.parse_args()
+    servers = split_servers(args.server) or ["http://127.0.0.1:8188"]
+    if args.download or args.prune:
+        args.monitor = True     # completions come from the websocket
 
     # Resolve basepath relative to the current working directory
     basepath = os.path.abspath(args.basepath)
@@ -340,95 +2011,266 @@ def main():
             print("[INFO] Axis %s -> node %s, input '%s', count=%d"
                   % (axis, nid, inp, len(vals)))
 
-    # Build all permutations (in fixed axis order)
-    dims = [range(len(axis_values[a])) for a in AXES]
-    combos = list(itertools.product(*dims))
-    total = len(combos)
+    # Lazy permutation plan; nothing is enumerated up front
+    plan = SweepPlan(axis_specs, axis_values, prefix_folder, naming=args.naming)
+    total = plan.total
+    if args.order != "fixed":
+        try:
+            costs = axis_costs(prompt_base, axis_specs, parse_axis_costs(args.axis_cost))
+        except ValueError as e:
+            print("Error: %s" % str(e), file=sys.stderr)
+            sys.exit(1)
+        order = cost_order(axis_specs, costs)
+        plan.set_order(order, snake=(args.order == "gray"))
+        print("[INFO] Order (%s, outermost first): %s" % (args.order, " > ".join(
+            "%s(%s:%s cost=%g)" % ((a,) + axis_specs[a] + (costs[a],)) for a in order if a in axis_specs)))
 
-    # Compute expected filenames for cleanup and resume
+    # Manifest (axis specs, values, per-output status) lives next to the images
     images_dir_for_prefix = os.path.join(images_root, prefix_folder)
-    expected_files = set()
-    seg_cache = []  # keep segments in order alongside combos for resume loop
+    manifest_path = os.path.join(images_dir_for_prefix, MANIFEST_NAME)
+    header = plan.manifest_header(type_map)
+    existing = read_manifest(manifest_path)
 
-    for idxs in combos:
-        # Value snapshot for this combo
-        axis_val = {axis: axis_values[axis][i] for axis, i in zip(AXES, idxs)}
-        # Build segments from final values by (node_id,input)
-        segments = build_segments(axis_specs, axis_val)
-        seg_cache.append(segments)
-        expected_files.add("%s_%05d.png" % (segments, 1))  # always _00001.png per unique prefix
+    # Ordinal names of another sweep would resume as the wrong combinations (or be cleaned
+    # up), so the folder must first be checked against the header that wrote them
+    foreign = foreign_ordinal_outputs(images_dir_for_prefix, existing, header)
+    if foreign:
+        why = ("%s describes a different sweep" % MANIFEST_NAME if existing is not None
+               else "there is no %s saying which sweep wrote them" % MANIFEST_NAME)
+        print("Error: %d file(s) in %s (e.g. %s) are ordinal-named outputs and %s. Their names would "
+              "be read as other combinations or removed by cleanup. Use a new --save-target subfolder, "
+              "or move those files away." % (len(foreign), images_dir_for_prefix, foreign[0], why),
+              file=sys.stderr)
+        sys.exit(1)
 
-    # Cleanup anything not expected (files only)
-    cleanup_folder(images_dir_for_prefix, expected_files, verbose=args.verbose)
+    trusted = None
+    if args.trust_manifest:
+        if existing is not None and same_sweep(existing[0], header):
+            trusted = existing[1]
+            if args.verbose:
+                print("[INFO] Using manifest %s; skipping folder scan." % manifest_path)
+        else:
+            print("[WARN] No matching manifest at %s; scanning the folder instead." % manifest_path)
+
+    if args.shard is not None:
+        if args.prune:
+            print("Error: --prune cannot be combined with --shard (every shard would probe and "
+                  "decide on its own).", file=sys.stderr)
+            sys.exit(1)
+        try:
+            plan.set_shard(*parse_shard(args.shard))
+        except ValueError as e:
+            print("Error: %s" % str(e), file=sys.stderr)
+            sys.exit(1)
+        index, count, lo, hi = plan.shard
+        print("[INFO] Shard %d/%d: outputs %d-%d (%d of %d)" % (index, count, lo, hi - 1, hi - lo, plan.expected_count))
+
+    # Several servers: groups of permutations that share the affinity axes' values
+    affinity = []
+    if len(servers) > 1:
+        try:
+            affinity = (parse_affinity(args.affinity, axis_specs) if args.affinity is not None
+                        else affinity_axes(prompt_base, axis_specs))
+        except ValueError as e:
+            print("Error: %s" % str(e), file=sys.stderr)
+            sys.exit(1)
+        print("[INFO] %d servers; affinity axes: %s" % (len(servers), ", ".join(
+            "%s(%s:%s)" % ((a,) + axis_specs[a]) for a in affinity) or "none"))
+
+    # Cleanup anything not expected (files only); expected names are recognized by parsing
+    if trusted is None:
+        cleanup_folder(images_dir_for_prefix, plan, verbose=args.verbose, dry_run=args.dry_run)
+
+    probe = None
+    if args.prune:
+        probe = PruneProbe(plan, args.prune_probes, max(0, args.prune_threshold))
+        if Image is None:
+            print("[WARN] Pillow is not installed (pip install pillow); --prune only merges values "
+                  "whose images are pixel-identical.")
 
     # Dry-run: show plan and exit
     print("Planned permutations: " + " * ".join(str(len(axis_values[a])) for a in AXES) + " = %d" % total)
     if args.dry_run:
         print("[DRY] Folder = %s" % images_dir_for_prefix)
-        print("[DRY] Expected file count = %d" % len(expected_files))
+        print("[DRY] Expected file count = %d" % plan.expected_count)
+        if probe is not None:
+            print("[DRY] --prune: %d probe outputs (%d base combination(s)) are rendered first"
+                  % (len(probe.ordinals), len(probe.bases)))
         # Show a couple examples
-        for i, s in enumerate(seg_cache[:min(5, len(seg_cache))], 1):
-            print("[DRY] e.g. %s" % os.path.join(images_dir_for_prefix, "%s_00001.png" % s))
+        todo = (s for idxs, s, _ in plan if not plan.is_done(idxs))
+        for s in itertools.islice(todo, 5):
+            print("[DRY] e.g. %s" % os.path.join(images_dir_for_prefix, s + plan.SUFFIX))
         return
 
+    # Precompile the prompt: only axis inputs and the save-target input change per permutation
+    slots = [axis_specs[a] for a in AXES if a in axis_specs] + [(target_node_id, target_param)]
+    try:
+        template = PromptTemplate(prompt_base, slots)
+    except Exception as e:
+        print("[ERR] input assign failed: %s" % str(e), file=sys.stderr)
+        sys.exit(1)
+
+    ensure_dir(images_dir_for_prefix)
+    manifest, records = open_manifest(manifest_path, header)
+
+    # Resume: from the manifest, or one folder listing into the bitmap (recording finds)
+    if trusted is not None:
+        for o, rec in records.items():
+            if rec.get("st") == "done":
+                plan.mark_done(o)
+                if probe is not None:
+                    probe.record(o, rec.get("files"))
+    else:
+        for o, names in plan.mark_existing(list_files(images_dir_for_prefix)).items():
+            rec = records.get(o)
+            if rec is None or rec.get("st") != "done":
+                manifest.record(o, "done", files=sorted(names))
+            if probe is not None:
+                probe.record(o, sorted(names))
+    probe_todo = 0
+    if probe is not None:
+        # Probe phase first: the plan only lacks the probes that are not rendered yet
+        probe_todo = probe.restrict()
+        print("[PRUNE] %d probe outputs at %d base combination(s), %d to render"
+              % (len(probe.ordinals), len(probe.bases), probe_todo))
+
     # Enqueue, skipping combos whose file already exists
     client_id = args.client_id or str(uuid.uuid4())
-    enq = 0
+    target = (target_node_id, target_param)
+    sched = None
+    shards = None
+    submitter = None
+    throttle = None
+    if len(servers) > 1:
+        # One dispatch thread per server, each with its own drip-feed window
+        window = args.max_pending if args.max_pending > 0 else SHARD_PENDING
+        shards = [ShardServer(url, PromptSubmitter(url, client_id, retries=args.retries, backoff=args.retry_backoff),
+                              window, args.poll_interval) for url in servers]
+        print("[INFO] Drip-feed: keeping at most %d prompts queued per server" % window)
+    elif args.max_pending > 0:
+        print("[INFO] Drip-feed: keeping at most %d prompts queued on the server" % args.max_pending)
 
-    for idxs, segments in zip(combos, seg_cache):
-        # If this expected file already exists, skip
-        target_png = os.path.join(images_dir_for_prefix, "%s_00001.png" % segments)
-        if os.path.isfile(target_png):
-            if args.verbose:
-                print("[SKIP] %s already exists" % target_png)
-            continue
+    fetcher = None
+    if args.download:
+        fetcher = OutputFetcher(images_dir_for_prefix, args.download_workers, args.retries, args.retry_backoff)
 
-        # Deep copy API prompt and apply axis values
-        prompt = copy.deepcopy(prompt_base)
-        log_parts = []
-
-        for axis, i in zip(AXES, idxs):
-            val = axis_values[axis][i]
-            spec = axis_specs.get(axis)
-            if spec is None or val is None:
-                continue
-            nid, inp = spec
-            try:
-                set_input_literal(prompt, nid, inp, val)
-            except Exception as e:
-                print("[ERR] axis %s -> %s:%s assign failed: %s" % (axis, nid, inp, str(e)), file=sys.stderr)
-                sys.exit(1)
-            log_parts.append("%s=%s" % (axis, str(val)))
+    def on_finish(pid, job):
+        # Completion from the monitor: free the drip-feed slot, record it (once downloaded)
+        source = submitter
+        if throttle is not None:
+            throttle.finished(pid)
+        for srv in (sched.servers if sched is not None else ()):
+            if pid in srv.jobs:
+                srv.throttle.finished(pid)
+                source = srv.submitter
+        o = plan.output_ordinal(job["idxs"])
+        sec = round(job["latency"], 3)
+        if fetcher is None or not job["ok"]:
+            manifest.record(o, "done" if job["ok"] else "failed", pid=pid, sec=sec, files=job["files"] or None)
+            if probe is not None:
+                probe.landed(o, job["files"] if job["ok"] else None)
+            return
+
+        def fetched(names, digests, err):
+            if err is not None:
+                manifest.record(o, "failed", pid=pid, sec=sec, err="download: %s" % err)
+            else:
+                manifest.record(o, "done", pid=pid, sec=sec, files=names, sha256=digests)
+            if probe is not None:
+                probe.landed(o, names)
+        fetcher.fetch(source, pid, plan.stem_for(job["idxs"]), fetched)
 
-        # Build full filename_prefix: "<prefix_folder>/<segments>"
-        clean_prefix = prefix_folder.rstrip("/\\")
-        filename_prefix = "%s/%s" % (clean_prefix, segments) if clean_prefix else segments
+    def prepare(idxs):
+        # Sharded sweeps render permutations out of plan order (see ShardScheduler)
+        filename_prefix = plan.filename_prefix_for(plan.stem_for(idxs))
+        values, tag = permutation_values(axis_specs, axis_values, idxs, target, filename_prefix)
+        return build_payload(template.render(values), client_id), tag, filename_prefix
 
-        # Set ONLY on the specified target node and input
+    def dispatch():
+        # Queue what the plan's bitmap still lacks: (failure or None, prompts queued, prompts to wait for)
+        nonlocal sched, submitter, throttle
+        if shards is not None:
+            sent = sum(srv.sent for srv in shards)
+            sched = ShardScheduler(plan, affinity, [srv for srv in shards if not srv.dead])
+            run_shards(sched, prepare, manifest=manifest, monitor=monitor)
+            queued = sum(srv.sent for srv in shards) - sent
+            return sched.failed, queued, queued - sched.handed_back
+        submitter = PromptSubmitter(servers[0], client_id, concurrency=args.concurrency,
+                                    retries=args.retries, backoff=args.retry_backoff)
+        throttle = QueueThrottle(submitter, args.max_pending, args.poll_interval) if args.max_pending > 0 else None
+        enqueue_plan(plan, template, axis_specs, axis_values, target,
+                     submitter, throttle, client_id, images_dir_for_prefix, monitor=monitor,
+                     manifest=manifest, verbose=args.verbose)
+        submitter.close()
+        return submitter.failed, submitter.ok, submitter.ok
+
+    monitor = None
+    if args.monitor:
+        monitor = SweepMonitor(servers, client_id, axis_specs, axis_values, plan.pending_count(),
+                               on_finish=on_finish)
         try:
-            set_input_literal(prompt, target_node_id, target_param, filename_prefix)
-        except Exception as e:
-            print("[ERR] save-target set failed on node %s input '%s': %s" % (target_node_id, target_param, str(e)), file=sys.stderr)
-            sys.exit(1)
-
-        tag = " ".join(log_parts) if log_parts else "(no axes set)"
-        try:
-            post_prompt(args.server, prompt, client_id)
-            enq += 1
-            print("[OK]  %s -> queued (prefix=%s)" % (tag, filename_prefix))
-        except error.HTTPError as e:
-            try:
-                msg = e.read().decode("utf-8", errors="ignore")
-            except Exception:
-                msg = str(e)
-            print("[ERR] HTTP %d: %s" % (e.code, msg), file=sys.stderr)
-            sys.exit(1)
-        except Exception as e:
-            print("[ERR] %s" % str(e), file=sys.stderr)
-            sys.exit(1)
+            monitor.start()
+        except (OSError, ConnectionError) as e:
+            monitor.close()
+            if fetcher is not None or probe is not None:
+                print("Error: --%s needs the websocket event stream (%s)."
+                      % ("download" if fetcher is not None else "prune", str(e)), file=sys.stderr)
+                sys.exit(1)
+            print("[WARN] monitor unavailable (%s); continuing without it." % str(e), file=sys.stderr)
+            monitor = None
+
+    try:
+        failed, queued, expected = None, 0, 0
+        if probe_todo:
+            failed, queued, expected = dispatch()
+            if failed is None:
+                print("[PRUNE] Probes queued; waiting for them before the rest of the sweep.")
+                probe.wait(expected, monitor)
+        if probe is not None and failed is None:
+            probe.prune(images_dir_for_prefix)
+            manifest.merge(plan.merge_table())
+            monitor.remaining = plan.pending_count()
+        if failed is None:
+            failed, sent, more = dispatch()
+            queued += sent
+            expected += more
+        if monitor is not None and failed is None:
+            print("[INFO] All prompts queued; waiting for completions (Ctrl+C to stop watching).")
+            monitor.wait(expected)
+        if fetcher is not None:
+            fetcher.close()
+    except KeyboardInterrupt:
+        print("[ABORT] Interrupted; waiting for in-flight POSTs.", file=sys.stderr)
+        throttles = []
+        if shards is not None:
+            throttles = [srv.throttle for srv in shards if not srv.dead]
+        elif submitter is not None:
+            submitter.close(cancel=True)
+            throttles = [throttle] if throttle is not None else []
+        if throttles:
+            n = sum(t.cancel_pending() for t in throttles)
+            print("[ABORT] Removed %d pending prompts from the server queue." % n, file=sys.stderr)
+        if fetcher is not None:
+            fetcher.close(cancel=True)
+        if monitor is not None:
+            monitor.report()
+        manifest.close()
+        sys.exit(130)
+
+    if monitor is not None:
+        monitor.report()
+        monitor.close()
+    if fetcher is not None:
+        fetcher.report()
+    manifest.close()
+    if shards is not None:
+        for srv in shards:
+            print("[SHARD] %s: %d prompts%s" % (srv.url, srv.sent, " (went down)" if srv.dead else ""))
+    if failed is not None:
+        sys.exit(1)
 
     print("Done. Enqueued %d prompts to %s. Images folder: %s" %
-          (enq, args.server, images_dir_for_prefix))
+          (queued, ", ".join(servers), images_dir_for_prefix))
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# image_scan.py
+#
+# Single-pass folder scan with a persistent parse cache, shared by make_*_viewer.py.
+#
+# One os.scandir() pass collects every wanted extension at once. Parsed filenames are
+# remembered in <images folder>/<cache name> (JSON), keyed by file name and validated
+# by (mtime_ns, size), so regenerating a viewer after a few new images only parses the
+# new files. Each viewer passes its own cache name since their parse results differ.
+#
+# parse_filename() is the segment-name parser of make_aligned_viewer.py, also used by
+# analyze_sweep.py and bench_sweep.py ("3-cfg-7_5--3-steps-20_00001_.png").
+#
+# Stdlib only.
+
+import json
+import os
+import re
+from pathlib import Path
+
+CACHE_VERSION = 2      # bump when a viewer's parse_filename() output changes
+
+def strip_counter(token: str) -> str:
+    # remove optional trailing ComfyUI counter _00001 or _00001_
+    m = re.match(r"^(.*?)(_+\d{5,}_?)$", token)
+    if m and m.group(1):
+        return m.group(1)
+    return token
+
+def parse_dimension_segment(seg: str):
+    parts = seg.split("-")
+    if len(parts) != 3:
+        return None
+    node_str, prop, val_token = parts
+    if not node_str.isdigit():
+        return None
+    node_id = int(node_str)
+    if not re.fullmatch(r"[A-Za-z0-9_]+", prop or ""):
+        return None
+    dotted = val_token.replace("_", ".")
+    try:
+        vnum = float(dotted)
+        shown = dotted[:-2] if dotted.endswith(".0") else dotted  # "8_0" shows as 8
+        return node_id, prop, vnum, shown, shown
+    except ValueError:
+        if not re.fullmatch(r"[A-Za-z0-9_]+", val_token or ""):
+            return None
+        return node_id, prop, None, val_token, val_token
+
+def parse_filename(fname: str):
+    # The counter only follows the last segment; "7_5" in a segment is the value 7.5
+    stem = strip_counter(Path(fname).stem)
+    segs = stem.split("--")
+    dims = []
+    for seg in segs:
+        p = parse_dimension_segment(seg)
+        if p is None:
+            return None
+        dims.append(p)
+    return dims
+
+def _load_cache(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            doc = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(doc, dict) or doc.get("version") != CACHE_VERSION:
+        return {}
+    files = doc.get("files")
+    return files if isinstance(files, dict) else {}
+
+def _save_cache(path, files):
+    tmp = path + ".tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": CACHE_VERSION, "files": files}, f, separators=(",", ":"))
+        os.replace(tmp, path)
+    except OSError as e:
+        print("[WARN] Could not write scan cache %s: %s" % (path, e))
+
+def scan_entries(img_dir, exts, parse, cache_name=None):
+    """
+    Return {ext: [(filename, parsed), ...]} (sorted by name) for every file in img_dir
+    whose lowercased extension is in exts. parse(filename) is only called for files
+    that are new or changed since the cache was written; cache_name=None disables it.
+    """
+    img_dir = os.fspath(img_dir)
+    cache_path = os.path.join(img_dir, cache_name) if cache_name else None
+    cached = _load_cache(cache_path) if cache_path else {}
+    fresh = {}
+    out = {ext: [] for ext in exts}
+    parsed_count = 0
+    with os.scandir(img_dir) as it:
+        for entry in it:
+            ext = os.path.splitext(entry.name)[1].lower()
+            if ext not in out or not entry.is_file():
+                continue
+            st = entry.stat()
+            stamp = [st.st_mtime_ns, st.st_size]
+            hit = cached.get(entry.name)
+            if hit is not None and hit[:2] == stamp:
+                parsed = hit[2]
+            else:
+                parsed = parse(entry.name)
+                parsed_count += 1
+            fresh[entry.name] = stamp + [parsed]
+            out[ext].append((entry.name, parsed))
+    for entries in out.values():
+        entries.sort(key=lambda e: e[0])
+    if cache_path and (parsed_count or len(fresh) != len(cached)):
+        _save_cache(cache_path, fresh)
+    return out
@@ -5,13 +5,19 @@
 # Everything else remains the same.
 
 import json
-import re
 import argparse
 from pathlib import Path
 import sys
 from string import Template
 import os
 
+from sweep_manifest import MANIFEST_NAME, folder_records, is_ordinal, ordinal_parser, read_manifest, viewer_entries
+from image_scan import parse_dimension_segment, parse_filename, scan_entries
+from viewer_index import ViewerIndex, data_script, live_script, watch_folder, write_data_file
+from thumbs import build_posters
+
+SCAN_CACHE_NAME = "0000_aligned_viewer.scan.json"
+
 def parse_args():
     p = argparse.ArgumentParser(
         description="ComfyUI compact ND viewer (lazy-load only, with theme toggle)."
@@ -41,6 +47,60 @@ def parse_args():
         default=".",
         help="Base directory for resolving relative paths (default: current directory).",
     )
+    p.add_argument(
+        "--no-manifest",
+        dest="no_manifest",
+        action="store_true",
+        help="Ignore %s and scan/parse the image filenames instead "
+             "(not possible for gen_images.py --naming ordinal sweeps)." % MANIFEST_NAME,
+    )
+    p.add_argument(
+        "--no-scan-cache",
+        dest="no_scan_cache",
+        action="store_true",
+        help="Re-parse every filename instead of using/updating %s." % SCAN_CACHE_NAME,
+    )
+    p.add_argument(
+        "--no-posters",
+        dest="no_posters",
+        action="store_true",
+        help="Do not extract poster frames (ffmpeg) for .mp4 files that have no .png.",
+    )
+    p.add_argument(
+        "--workers",
+        dest="workers",
+        type=int,
+        default=None,
+        help="Processes for building poster frames (default: CPU count).",
+    )
+    p.add_argument(
+        "--prefetch",
+        dest="prefetch",
+        type=int,
+        default=2,
+        help="Images to preload on each side of every slider position (default: 2, 0 = off).",
+    )
+    p.add_argument(
+        "--cache-mb",
+        dest="cache_mb",
+        type=int,
+        default=256,
+        help="Browser-side decoded image cache budget in MB (default: 256).",
+    )
+    p.add_argument(
+        "--watch",
+        dest="watch",
+        action="store_true",
+        help="Keep running: add newly arrived images and update the viewer's .data.js "
+             "file (the open page picks them up) instead of exiting.",
+    )
+    p.add_argument(
+        "--interval",
+        dest="interval",
+        type=float,
+        default=5.0,
+        help="Seconds between folder checks in --watch mode (default: 5).",
+    )
     p.add_argument(
         "legacy_args",
         nargs="*",
@@ -48,44 +108,6 @@ def parse_args():
     )
     return p.parse_args()
 
-def strip_counter(token: str) -> str:
-    # remove optional trailing _00001 or _00001_
-    m = re.match(r"^(.*?)(_+\d+_?)$", token)
-    if m and m.group(1):
-        return m.group(1)
-    return token
-
-def parse_dimension_segment(seg: str):
-    parts = seg.split("-")
-    if len(parts) != 3:
-        return None
-    node_str, prop, val_token = parts
-    if not node_str.isdigit():
-        return None
-    node_id = int(node_str)
-    if not re.fullmatch(r"[A-Za-z0-9_]+", prop or ""):
-        return None
-    val_token = strip_counter(val_token)
-    dotted = val_token.replace("_", ".")
-    try:
-        vnum = float(dotted)
-        return node_id, prop, vnum, dotted, dotted
-    except ValueError:
-        if not re.fullmatch(r"[A-Za-z0-9_]+", val_token or ""):
-            return None
-        return node_id, prop, None, val_token, val_token
-
-def parse_filename(fname: str):
-    stem = Path(fname).stem
-    segs = stem.split("--")
-    dims = []
-    for seg in segs:
-        p = parse_dimension_segment(seg)
-        if p is None:
-            return None
-        dims.append(p)
-    return dims
-
 def load_node_titles(workflow_path: Path):
     with open(workflow_path, "r", encoding="utf-8") as f:
         wf = json.load(f)
@@ -157,100 +179,49 @@ def main():
 
     node_titles = load_node_titles(wf_path)
 
-    images = []
-    dim_signature = None
-    dim_count = None
-    dim_info = []
-    # Track posters and videos by dimension key string
-    posters_by_key = {}
-    videos_by_key = {}
-    for f in sorted(img_dir.glob("*.png")):
-        parsed = parse_filename(f.name)
-        if not parsed:
-            continue
-        if dim_count is None:
-            dim_count = len(parsed)
-            dim_info = [{'keys': {}, 'all_numeric': True} for _ in range(dim_count)]
-            dim_signature = [(d[0], d[1]) for d in parsed]
-        elif len(parsed) != dim_count:
-            raise ValueError(f"Inconsistent dimension count in {f.name}")
-        this_sig = [(d[0], d[1]) for d in parsed]
-        if this_sig != dim_signature:
-            raise ValueError(f"Dimension signature mismatch in {f.name}")
-        value_keys = []
-        for i,(nid,prop,vnum,vkey,vdisp) in enumerate(parsed):
-            if vnum is None:
-                dim_info[i]['all_numeric'] = False
-            dim_info[i]['keys'].setdefault(vkey, {'num': vnum, 'disp': vdisp})
-            value_keys.append(vkey)
-        key_tuple = tuple(value_keys)
-        images.append((key_tuple, f.name))
-        posters_by_key["|".join(key_tuple)] = f.name
-    if not images:
+    def find_entries(verbose=False):
+        # Prefer the sweep manifest written by gen_images.py: no filename parsing, and files
+        # it has no "done" record for yet are matched against its header
+        manifest = None if args.no_manifest else read_manifest(img_dir / MANIFEST_NAME)
+        if manifest is not None:
+            records = folder_records(img_dir, manifest[0], manifest[1])
+            png_entries, mp4_entries = viewer_entries(manifest[0], records, parse_dimension_segment)
+            if png_entries:
+                if verbose:
+                    print("Using sweep manifest:", img_dir / MANIFEST_NAME)
+                return png_entries, mp4_entries
+        parse = parse_filename
+        cache_name = None if args.no_scan_cache else SCAN_CACHE_NAME
+        if manifest is not None and is_ordinal(manifest[0]):
+            # Ordinal file names carry no values; resolving them is a lookup, so no cache
+            parse = ordinal_parser(manifest[0], parse_dimension_segment)
+            cache_name = None
+        # One scandir pass; only files new or changed since the last run are parsed
+        scanned = scan_entries(img_dir, (".png", ".mp4"), parse, cache_name)
+        return scanned[".png"], scanned[".mp4"]
+
+    def collect_entries(verbose=False):
+        png_entries, mp4_entries = find_entries(verbose)
+        if not args.no_posters:
+            png_entries = png_entries + build_posters(img_dir, png_entries, mp4_entries, args.workers)
+        return png_entries, mp4_entries
+
+    index = ViewerIndex()
+    index.add_entries(*collect_entries(verbose=True))
+    if not index.posters and args.watch:
+        print("Waiting for images in", img_dir)
+        watch_folder(index, collect_entries, None, args.interval, until_ready=True)
+    if not index.posters:
         sys.exit("No valid images found.")
 
-    # Optional: scan for mp4s and associate by the same dimension key
-    for f in sorted(img_dir.glob("*.mp4")):
-        parsed = parse_filename(f.name)
-        if not parsed:
-            continue
-        if dim_count is None:
-            # Should not happen if PNGs exist, but guard anyway
-            dim_count = len(parsed)
-            dim_info = [{'keys': {}, 'all_numeric': True} for _ in range(dim_count)]
-            dim_signature = [(d[0], d[1]) for d in parsed]
-        elif len(parsed) != dim_count:
-            # ignore mismatched
-            continue
-        this_sig = [(d[0], d[1]) for d in parsed]
-        if this_sig != dim_signature:
-            continue
-        value_keys = []
-        for i,(nid,prop,vnum,vkey,vdisp) in enumerate(parsed):
-            value_keys.append(vkey)
-        videos_by_key["|".join(value_keys)] = f.name
-
-    dim_values = []
-    for i in range(dim_count):
-        items = dim_info[i]['keys']
-        if dim_info[i]['all_numeric']:
-            order = sorted(items.keys(), key=lambda k: (items[k]['num'], k))
-        else:
-            order = sorted(items.keys())
-        dim_values.append([{'k': k, 'd': items[k]['disp']} for k in order])
-
-    poster_lookup = {"|".join(vals): fname for vals, fname in images}
-
-    # Prepare meta payload for lazy-load only
-    dim_labels = []
-    max_label = 0
-    for (nid, prop) in dim_signature:
-        title = node_titles.get(nid, f"Node {nid}")
-        label = f"{title}:{nid}:{prop}"
-        dim_labels.append(label)
-        max_label = max(max_label, len(label))
-
-    label_em = max(8.0, min(60.0, max_label * 0.62))
-
-    # Lazy-load only: no base64 embedding
-    poster_urls = {
-        fname: relpath_for_html(img_dir / fname, out_base)
-        for _, fname in images
-    }
-    video_urls = {
-        fname: relpath_for_html(img_dir / fname, out_base)
-        for fname in videos_by_key.values()
-    }
-    meta = dict(
-        dim_values=dim_values,
-        poster_lookup=poster_lookup,
-        video_lookup=videos_by_key,
-        dim_labels=dim_labels,
-        label_em=label_em,
-        lazy=True,
-        poster_urls=poster_urls,
-        video_urls=video_urls
-    )
+    # Lazy-load only: image URLs are <base><filename>, the data lives next to the HTML
+    base = relpath_for_html(img_dir, out_base)
+    base = "" if base == "." else base + "/"
+    meta = index.meta(node_titles, base)
+    label_em = meta["label_em"]
+    data_path = out_html.with_name(out_html.stem + ".data.js")
+    write_data_file(data_path, meta)
+    data_src = relpath_for_html(data_path, out_base)
 
     html_template = Template("""<!DOCTYPE html>
 <html>
@@ -308,7 +279,7 @@ input[type=range]:hover::-moz-range-thumb{width:26px;height:26px;}
     <canvas id="canvas"></canvas>
   </div>
 </div>
-<script>
+${data_script}<script>
 (function(){
   const saved=localStorage.getItem("viewer_theme");
   if(saved==="dark"||( !saved && window.matchMedia && window.matchMedia("(prefers-color-scheme: dark)").matches)){
@@ -320,7 +291,7 @@ input[type=range]:hover::-moz-range-thumb{width:26px;height:26px;}
     else{document.documentElement.setAttribute("data-theme","dark");localStorage.setItem("viewer_theme","dark");}
   };
 })();
-const data=${meta_json};
+const data=window.VIEWER_DATA;
 const dims=data.dim_values.length;
 const curIdx=new Array(dims).fill(0);
 const locked=new Array(dims).fill(false);
@@ -330,30 +301,129 @@ const fnameLink=document.getElementById("filenameLink");
 const slidersRoot=document.getElementById("sliders");
 const wrap=document.getElementById("canvas-wrap");
 let videoEl=null;
-
-// Image LRU cache for lazy mode
-const CAP=64;
-const map=new Map();
+const sliderEls=[];
+const bubbleEls=[];
+
+// Decoded-bitmap LRU cache for lazy mode, bounded by memory (w*h*4 bytes per entry).
+// Entries are ImageBitmaps pre-scaled to the canvas size they were made for, so showing
+// a cached position is a plain blit: no re-decode, no resample.
+const CACHE_BYTES=${cache_mb}*1024*1024;
+const map=new Map();   // fname -> {bmp, nw, nh, w, h, cost}
+let cacheBytes=0;
+let retired=null;   // replaced bitmap still on screen as a stand-in; closed once swapped out
+function freeBitmap(bmp){ if(bmp && bmp.close) bmp.close(); }
 const imgs={
   has:(k)=>map.has(k),
-  get:(k)=>map.get(k),
-  set:(k,img)=>{
-    if(map.has(k)) map.delete(k);
-    map.set(k,img);
-    if(map.size>CAP){
+  // cached at the size the canvas would use for it right now
+  fresh:(k)=>{
+    const e=map.get(k);
+    if(!e) return false;
+    const t=fitSize(e.nw, e.nh);
+    return e.w===t.w && e.h===t.h;
+  },
+  get:(k)=>{
+    const e=map.get(k);
+    if(!e) return undefined;
+    map.delete(k); map.set(k,e);   // most recently used
+    return e;
+  },
+  set:(k,e)=>{
+    if(map.has(k)){
+      const old=map.get(k);
+      cacheBytes-=old.cost;
+      if(old.bmp!==currentImg) freeBitmap(old.bmp);
+      else if(old.bmp!==e.bmp){ freeBitmap(retired); retired=old.bmp; }
+      map.delete(k);
+    }
+    e.cost=e.cost || Math.max(1,e.w*e.h*4);
+    map.set(k,e);
+    cacheBytes+=e.cost;
+    while(cacheBytes>CACHE_BYTES && map.size>1){
       const oldest=map.keys().next().value;
-      const oldImg=map.get(oldest);
-      oldImg.src="";
+      const old=map.get(oldest);
+      if(old.bmp===currentImg){ map.delete(oldest); map.set(oldest,old); continue; }
+      freeBitmap(old.bmp);
+      cacheBytes-=old.cost;
       map.delete(oldest);
     }
   }
 };
 
+// Decoded <img> -> cache entry holding a bitmap at the canvas size for that image
+function toBitmap(im){
+  const nw=im.naturalWidth, nh=im.naturalHeight;
+  const t=fitSize(nw, nh);
+  if(!window.createImageBitmap){
+    return Promise.resolve({bmp:im, nw:nw, nh:nh, w:t.w, h:t.h, cost:nw*nh*4});
+  }
+  return createImageBitmap(im, {resizeWidth:t.w, resizeHeight:t.h, resizeQuality:"high"})
+    .catch(()=>createImageBitmap(im))
+    .then((bmp)=>({bmp:bmp, nw:nw, nh:nh, w:bmp.width, h:bmp.height}));
+}
+
+// Prefetch: when idle, warm the +-K neighbours along each unlocked dimension (the one
+// scrubbed last first): Image.decode() off the main thread, then a canvas-sized bitmap
+const PREFETCH_K=${prefetch};
+const PREFETCH_PARALLEL=4;
+const inflight=new Map();   // fname -> Promise<cache entry>
+let lastDim=0;
+let prefetchGen=0;
+const whenIdle=window.requestIdleCallback ? (fn)=>window.requestIdleCallback(fn,{timeout:500}) : (fn)=>setTimeout(fn,50);
+
+function loadImage(fname){
+  if(inflight.has(fname)) return inflight.get(fname);
+  const im=new Image();
+  im.src=fileUrl(fname);
+  const ready=im.decode ? im.decode() : new Promise((res,rej)=>{im.onload=res;im.onerror=rej;});
+  const p=ready.then(()=>toBitmap(im)).then(
+    (e)=>{ inflight.delete(fname); imgs.set(fname, e); return e; },
+    (err)=>{ inflight.delete(fname); throw err; });
+  inflight.set(fname, p);
+  return p;
+}
+
+function prefetchList(){
+  const order=[lastDim];
+  for(let d=0; d<dims; d++){ if(d!==lastDim) order.push(d); }
+  const list=[];
+  for(const d of order){
+    if(locked[d]) continue;
+    const here=curIdx[d];
+    for(let step=1; step<=PREFETCH_K; step++){
+      for(const i of [here+step, here-step]){
+        if(i<0 || i>=data.dim_values[d].length) continue;
+        curIdx[d]=i;
+        const f=posterName(key());
+        curIdx[d]=here;
+        if(f && !imgs.fresh(f) && !inflight.has(f)) list.push(f);
+      }
+    }
+  }
+  return list;
+}
+
+function schedulePrefetch(){
+  if(PREFETCH_K<=0) return;
+  const gen=++prefetchGen;
+  whenIdle(()=>{
+    if(gen!==prefetchGen) return;
+    const queue=prefetchList();
+    let running=0;
+    const next=()=>{
+      while(running<PREFETCH_PARALLEL && queue.length && gen===prefetchGen){
+        running++;
+        loadImage(queue.shift()).catch(()=>{}).then(()=>{ running--; next(); });
+      }
+    };
+    next();
+  });
+}
+
 // Track current natural image size
 let natW=0, natH=0;
 
 // Compute scaled canvas size to fit viewport with 16px L/R/B margins, no upscaling
-function sizeCanvasFor(nw, nh){
+function fitSize(nw, nh){
   const MLR = 16; // left/right margin
   const MB = 16;  // bottom margin
   const availW = Math.max(1, window.innerWidth - (MLR*2));
@@ -361,8 +431,13 @@ function sizeCanvasFor(nw, nh){
   const bottomOfHeader = anchor.getBoundingClientRect().bottom; // px from top
   const availH = Math.max(1, window.innerHeight - bottomOfHeader - MB);
   const scale = Math.min(1, availW / nw, availH / nh);
-  const sw = Math.max(1, Math.floor(nw * scale));
-  const sh = Math.max(1, Math.floor(nh * scale));
+  return { w: Math.max(1, Math.floor(nw * scale)), h: Math.max(1, Math.floor(nh * scale)) };
+}
+
+function sizeCanvasFor(nw, nh){
+  const fit = fitSize(nw, nh);
+  const sw = fit.w;
+  const sh = fit.h;
   if (canvas.width !== sw || canvas.height !== sh){
     canvas.width = sw;
     canvas.height = sh;
@@ -389,14 +464,20 @@ function initAfterFirstImage(w,h){
   sizeCanvasFor(natW, natH);
   buildUI(); updateImage();
   window.addEventListener("resize",redrawCurrent);
+  // Once resizing settles, re-make the current bitmap at the new canvas size
+  let resizeTimer=null;
+  window.addEventListener("resize",()=>{
+    clearTimeout(resizeTimer);
+    resizeTimer=setTimeout(()=>{ if(currentKey!==null && !videoEl) updateImage(); },250);
+  });
 }
 
 // Load one arbitrary image to size the canvas
-const firstFname = Object.values(data.poster_lookup)[0];
+const firstFname = data.files[0];
 const probe=new Image();
 probe.onload=()=>initAfterFirstImage(probe.naturalWidth, probe.naturalHeight);
 probe.onerror=()=>initAfterFirstImage(512,512);
-probe.src=data.poster_urls[firstFname];
+probe.src=fileUrl(firstFname);
 
 function sliderWidth(n){return Math.min(680,Math.max(140,140+(n-2)*36));}
 function buildUI(){
@@ -410,13 +491,19 @@ function buildUI(){
     slider.min=0;slider.max=data.dim_values[i].length-1;slider.step=1;slider.value=0;
     slider.style.width=sliderWidth(data.dim_values[i].length)+"px";
     lock.onchange=()=>{locked[i]=lock.checked;slider.disabled=lock.checked;};
-    slider.oninput=()=>{if(locked[i])return;curIdx[i]=+slider.value;bubble.textContent=data.dim_values[i][curIdx[i]].d;updateImage();};
+    slider.oninput=()=>{if(locked[i])return;curIdx[i]=+slider.value;lastDim=i;bubble.textContent=data.dim_values[i][curIdx[i]].d;updateImage();};
     wrap.appendChild(bubble);wrap.appendChild(slider);
+    sliderEls.push(slider);bubbleEls.push(bubble);
     row.appendChild(lock);row.appendChild(label);row.appendChild(wrap);
     slidersRoot.appendChild(row);
   }
 }
-function key(){return curIdx.map((v,d)=>data.dim_values[d][v].k).join("|");}
+function key(){let cell=0;for(let d=0;d<dims;d++)cell=cell*data.dim_values[d].length+curIdx[d];return cell;}
+
+// Data file lookups: cell = row-major index over dim_values, file ids index data.files
+function posterName(cell){ const f=data.grid[cell]; return f>=0 ? data.files[f] : undefined; }
+function videoName(cell){ const f=data.vgrid ? data.vgrid[cell] : -1; return f>=0 ? data.files[f] : undefined; }
+function fileUrl(fname){ return data.base+fname; }
 
 let currentUrl=null;
 let currentImg=null;
@@ -426,28 +513,34 @@ function updateImage(){
   const k=key();
   currentKey=k;
   stopVideo();
-  const fname=data.poster_lookup[k];
+  const fname=posterName(k);
   if(!fname){ fnameLink.textContent="No match"; fnameLink.removeAttribute("href"); currentUrl=null; hasVideoCurrent=false; return; }
-  const url=data.poster_urls[fname];
-  hasVideoCurrent = !!data.video_lookup[k];
-  let im = imgs.has(fname) ? imgs.get(fname) : null;
-  if(im && im.complete){
-    drawAndLink(im, url, fname);
+  const url=fileUrl(fname);
+  hasVideoCurrent = !!videoName(k);
+  if(imgs.fresh(fname)){
+    drawAndLink(imgs.get(fname), url, fname);
+    schedulePrefetch();
     return;
   }
-  im = new Image();
-  im.onload=()=>{ imgs.set(fname, im); drawAndLink(im, url, fname); };
-  im.onerror=()=>{ fnameLink.textContent="Failed to load: "+fname; currentUrl=null; };
-  im.src=url;
+  // A bitmap made for another canvas size stands in until the right one is ready
+  if(imgs.has(fname)) drawAndLink(imgs.get(fname), url, fname);
+  loadImage(fname).then(
+    (e)=>{ if(currentKey===k){ drawAndLink(e, url, fname); schedulePrefetch(); } },
+    ()=>{ if(currentKey===k){ fnameLink.textContent="Failed to load: "+fname; currentUrl=null; } });
 }
 
-function drawAndLink(im, url, fname){
-  currentImg = im;
-  natW = im.naturalWidth || im.width;
-  natH = im.naturalHeight || im.height;
+function drawAndLink(e, url, fname){
+  currentImg = e.bmp;
+  if(retired && retired!==currentImg){ freeBitmap(retired); retired=null; }
+  natW = e.nw;
+  natH = e.nh;
   sizeCanvasFor(natW, natH);
   ctx.clearRect(0,0,canvas.width,canvas.height);
-  ctx.drawImage(im, 0, 0, canvas.width, canvas.height);
+  if(e.bmp.width === canvas.width && e.bmp.height === canvas.height){
+    ctx.drawImage(e.bmp, 0, 0);   // same size: straight blit
+  } else {
+    ctx.drawImage(e.bmp, 0, 0, canvas.width, canvas.height);
+  }
   currentUrl=url;
   fnameLink.textContent=fname;
   fnameLink.href=url;
@@ -463,8 +556,8 @@ document.getElementById("canvas").addEventListener("contextmenu",e=>{
 // Hover/click to toggle video if available
 canvas.addEventListener('click', (e)=>{
   if(!hasVideoCurrent) return;
-  const vf = data.video_lookup[currentKey];
-  const vurl = vf ? data.video_urls[vf] : null;
+  const vf = videoName(currentKey);
+  const vurl = vf ? fileUrl(vf) : null;
   if(!vurl) return;
   if(e.shiftKey){
     window.open(vurl, '_blank', 'noopener,noreferrer');
@@ -475,9 +568,9 @@ canvas.addEventListener('click', (e)=>{
 
 function launchVideo(){
   if(videoEl) return;
-  const vf = data.video_lookup[currentKey];
+  const vf = videoName(currentKey);
   if(!vf) return;
-  const vurl = data.video_urls[vf];
+  const vurl = fileUrl(vf);
   videoEl = document.createElement('video');
   videoEl.controls = true;
   videoEl.autoplay = true;
@@ -508,9 +601,9 @@ function stopVideo(updateLinkBack){
   videoEl=null;
   canvas.style.display='block';
   if(updateLinkBack){
-    const pf = data.poster_lookup[currentKey];
+    const pf = posterName(currentKey);
     if(pf){
-      const purl = data.poster_urls[pf];
+      const purl = fileUrl(pf);
       fnameLink.textContent = pf;
       fnameLink.href = purl;
       fnameLink.download = pf;
@@ -518,19 +611,46 @@ function stopVideo(updateLinkBack){
   }
 }
 
-</script>
+// Watch mode: swap in a newer data file, keeping the selected values
+function applyData(nd){
+  const keep=curIdx.map((v,d)=>data.dim_values[d][v].k);
+  Object.assign(data, nd);
+  if(!sliderEls.length) return;
+  for(let d=0; d<dims; d++){
+    const vals=data.dim_values[d];
+    curIdx[d]=Math.max(0, vals.findIndex(v=>v.k===keep[d]));
+    sliderEls[d].max=vals.length-1;
+    sliderEls[d].value=curIdx[d];
+    sliderEls[d].style.width=sliderWidth(vals.length)+"px";
+    bubbleEls[d].textContent=vals[curIdx[d]].d;
+  }
+  currentKey=key();
+  hasVideoCurrent=!!videoName(currentKey);
+  if(!currentUrl) updateImage();
+}
+${live_js}</script>
 </body>
 </html>
 """)
 
     html = html_template.substitute(
         label_em=f"{label_em:.1f}",
-        meta_json=json.dumps(meta)
+        prefetch=max(0, args.prefetch),
+        cache_mb=max(16, args.cache_mb),
+        data_script=data_script(data_src),
+        live_js=live_script(data_src, args.interval) if args.watch else "",
     )
 
     out_html.write_text(html, encoding="utf-8")
     print("Generated HTML:", out_html)
+    print("Viewer data:", data_path)
     print("Note: Viewer uses lazy-load only. Keep the PNGs in place so the HTML can load them.")
+    if args.watch:
+        print("Watching %s every %gs; updating %s (Ctrl+C to stop)"
+              % (img_dir, args.interval, data_path.name))
+        watch_folder(index, collect_entries,
+                     lambda: write_data_file(data_path, index.meta(node_titles, base)),
+                     args.interval)
 
 if __name__ == "__main__":
     main()
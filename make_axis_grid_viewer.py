@@ -10,6 +10,9 @@
 # - Unique axis choices per picklist; disable slider when set to X or Y.
 # - Uniform 10px grid spacing; min image size 256px; horizontal scroll when too many X items.
 # - Single-image mode auto-fits in viewport without scrolling.
+# - Grid modes are virtualized: only cells near the visible area exist, headers are sticky.
+# - With analyze_sweep.py results (0000_sweep_metrics.json), cells can be tinted by a metric
+#   and the X/Y values sorted by its mean in the current view.
 
 import json
 import re
@@ -19,6 +22,15 @@ import sys
 from string import Template
 import os
 
+from sweep_manifest import (MANIFEST_NAME, METRICS_NAME, folder_records, is_ordinal, ordinal_parser, read_manifest,
+                            read_metrics, viewer_entries)
+from image_scan import scan_entries
+from viewer_index import ViewerIndex, data_script, live_script, watch_folder, write_data_file
+from thumbs import (HAVE_PIL, THUMB_DIR, THUMB_LEVELS, build_atlases, build_posters, build_thumbs,
+                    parse_levels, png_size)
+
+SCAN_CACHE_NAME = "0000_axis_grid_viewer.scan.json"
+
 def parse_args():
     p = argparse.ArgumentParser(
         description="ComfyUI ND image viewer with axis grids (lazy-load only)."
@@ -48,6 +60,74 @@ def parse_args():
         default=".",
         help="Base directory for resolving relative paths (default: current directory).",
     )
+    p.add_argument(
+        "--no-manifest",
+        dest="no_manifest",
+        action="store_true",
+        help="Ignore %s and scan/parse the image filenames instead "
+             "(not possible for gen_images.py --naming ordinal sweeps)." % MANIFEST_NAME,
+    )
+    p.add_argument(
+        "--no-scan-cache",
+        dest="no_scan_cache",
+        action="store_true",
+        help="Re-parse every filename instead of using/updating %s." % SCAN_CACHE_NAME,
+    )
+    p.add_argument(
+        "--no-thumbs",
+        dest="no_thumbs",
+        action="store_true",
+        help="Do not build %s/ thumbnails; grid cells load the full-size PNGs." % THUMB_DIR,
+    )
+    p.add_argument(
+        "--thumb-sizes",
+        dest="thumb_sizes",
+        type=parse_levels,
+        default=",".join(str(lv) for lv in THUMB_LEVELS),
+        help="Thumbnail levels, longest side in px (default: %(default)s).",
+    )
+    p.add_argument(
+        "--atlas",
+        dest="atlas",
+        default=None,
+        metavar="X,Y",
+        help="Pack each plane spanned by dimensions X and Y (0-based slider order) into one "
+             "atlas image, so a grid with those axes loads a single image per page.",
+    )
+    p.add_argument(
+        "--atlas-size",
+        dest="atlas_size",
+        type=int,
+        default=256,
+        help="Atlas cell size, longest side in px (default: %(default)s).",
+    )
+    p.add_argument(
+        "--no-posters",
+        dest="no_posters",
+        action="store_true",
+        help="Do not extract poster frames (ffmpeg) for .mp4 files that have no .png.",
+    )
+    p.add_argument(
+        "--workers",
+        dest="workers",
+        type=int,
+        default=None,
+        help="Processes for building thumbnails/posters (default: CPU count).",
+    )
+    p.add_argument(
+        "--watch",
+        dest="watch",
+        action="store_true",
+        help="Keep running: add newly arrived images and update the viewer's .data.js "
+             "file (the open page picks them up) instead of exiting.",
+    )
+    p.add_argument(
+        "--interval",
+        dest="interval",
+        type=float,
+        default=5.0,
+        help="Seconds between folder checks in --watch mode (default: 5).",
+    )
     p.add_argument(
         "legacy_args",
         nargs="*",
@@ -56,7 +136,7 @@ def parse_args():
     return p.parse_args()
 
 def strip_counter(token: str) -> str:
-    m = re.match(r"^(.*?)(_+\d+_?)$", token)
+    m = re.match(r"^(.*?)(_+\d{5,}_?)$", token)
     if m and m.group(1):
         return m.group(1)
     return token
@@ -71,18 +151,19 @@ def parse_dimension_segment(seg: str):
     node_id = int(node_str)
     if not re.fullmatch(r"[A-Za-z0-9_]+", prop or ""):
         return None
-    val_token = strip_counter(val_token)
     dotted = val_token.replace("_", ".")
     try:
         vnum = float(dotted)
-        return node_id, prop, vnum, val_token, dotted  # key, display
+        shown = dotted[:-2] if dotted.endswith(".0") else dotted  # "8_0" shows as 8
+        return node_id, prop, vnum, val_token, shown  # key, display
     except ValueError:
         if not re.fullmatch(r"[A-Za-z0-9_]+", val_token or ""):
             return None
         return node_id, prop, None, val_token, val_token
 
 def parse_filename(fname: str):
-    stem = Path(fname).stem
+    # The counter only follows the last segment; "7_5" in a segment is the value 7.5
+    stem = strip_counter(Path(fname).stem)
     segs = stem.split("--")
     dims = []
     for seg in segs:
@@ -163,86 +244,95 @@ def main():
 
     node_titles = load_node_titles(wf_path)
 
-    images = []
-    dim_signature = None
-    dim_count = None
-    dim_info = []
-    for f in sorted(img_dir.glob("*.png")):
-        parsed = parse_filename(f.name)
-        if not parsed:
-            continue
-        if dim_count is None:
-            dim_count = len(parsed)
-            dim_info = [{'keys': {}, 'all_numeric': True} for _ in range(dim_count)]
-            dim_signature = [(d[0], d[1]) for d in parsed]
-        elif len(parsed) != dim_count:
-            raise ValueError(f"Inconsistent dimension count in {f.name}")
-        this_sig = [(d[0], d[1]) for d in parsed]
-        if this_sig != dim_signature:
-            raise ValueError(f"Dimension signature mismatch in {f.name}")
-        value_keys = []
-        for i,(nid,prop,vnum,vkey,vdisp) in enumerate(parsed):
-            if vnum is None:
-                dim_info[i]['all_numeric'] = False
-            dim_info[i]['keys'].setdefault(vkey, {'num': vnum, 'disp': vdisp})
-            value_keys.append(vkey)
-        images.append((tuple(value_keys), f.name))
-    if not images:
+    def find_entries(verbose=False):
+        # Prefer the sweep manifest written by gen_images.py: no filename parsing, and files
+        # it has no "done" record for yet are matched against its header
+        manifest = None if args.no_manifest else read_manifest(img_dir / MANIFEST_NAME)
+        if manifest is not None:
+            records = folder_records(img_dir, manifest[0], manifest[1])
+            png_entries, mp4_entries = viewer_entries(manifest[0], records, parse_dimension_segment)
+            if png_entries:
+                if verbose:
+                    print("Using sweep manifest:", img_dir / MANIFEST_NAME)
+                return png_entries, mp4_entries
+        parse = parse_filename
+        cache_name = None if args.no_scan_cache else SCAN_CACHE_NAME
+        if manifest is not None and is_ordinal(manifest[0]):
+            # Ordinal file names carry no values; resolving them is a lookup, so no cache
+            parse = ordinal_parser(manifest[0], parse_dimension_segment)
+            cache_name = None
+        # One scandir pass; only files new or changed since the last run are parsed
+        scanned = scan_entries(img_dir, (".png", ".mp4"), parse, cache_name)
+        return scanned[".png"], scanned[".mp4"]
+
+    def collect_entries(verbose=False):
+        png_entries, mp4_entries = find_entries(verbose)
+        if not args.no_posters:
+            png_entries = png_entries + build_posters(img_dir, png_entries, mp4_entries, args.workers)
+        return png_entries, mp4_entries
+
+    index = ViewerIndex()
+    index.add_entries(*collect_entries(verbose=True))
+    if not index.posters and args.watch:
+        print("Waiting for images in", img_dir)
+        watch_folder(index, collect_entries, None, args.interval, until_ready=True)
+    if not index.posters:
         sys.exit("No valid images found.")
 
-    dim_values = []
-    for i in range(dim_count):
-        items = dim_info[i]['keys']
-        if dim_info[i]['all_numeric']:
-            order = sorted(items.keys(), key=lambda k: (items[k]['num'], k))
-        else:
-            order = sorted(items.keys())
-        dim_values.append([{'k': k, 'd': items[k]['disp']} for k in order])
-
-    poster_lookup = {"|".join(vals): fname for vals, fname in images}
-
-    dim_labels = []
-    max_label = 0
-    for (nid, prop) in dim_signature:
-        title = node_titles.get(nid, f"Node {nid}")
-        label = f"{title}:{nid}:{prop}"
-        dim_labels.append(label)
-        max_label = max(max_label, len(label))
-
-    label_em = max(8.0, min(60.0, max_label * 0.62))
-
-    # Also detect optional MP4s and pair via the same parsed key
-    videos_by_key = {}
-    for f in sorted(img_dir.glob("*.mp4")):
-        parsed = parse_filename(f.name)
-        if not parsed:
-            continue
-        this_sig = [(d[0], d[1]) for d in parsed]
-        if this_sig != dim_signature:
-            continue
-        value_keys = []
-        for (nid, prop, vnum, vkey, vdisp) in parsed:
-            value_keys.append(vkey)
-        videos_by_key["|".join(value_keys)] = f.name
-
-    poster_urls = {
-        fname: relpath_for_html(img_dir / fname, out_base)
-        for _, fname in images
-    }
-    video_urls = {
-        fname: relpath_for_html(img_dir / fname, out_base)
-        for fname in videos_by_key.values()
-    }
-    meta = dict(
-        dim_values=dim_values,
-        poster_lookup=poster_lookup,
-        video_lookup=videos_by_key,
-        dim_labels=dim_labels,
-        label_em=label_em,
-        lazy=True,
-        poster_urls=poster_urls,
-        video_urls=video_urls
-    )
+    # Lazy-load only: image URLs are <base><filename>, the data lives next to the HTML
+    base = relpath_for_html(img_dir, out_base)
+    base = "" if base == "." else base + "/"
+    thumb_levels = None if args.no_thumbs else args.thumb_sizes
+    if thumb_levels and not HAVE_PIL:
+        print("[WARN] Pillow is not installed (pip install pillow); grid cells will load full-size PNGs.")
+        thumb_levels = None
+
+    atlas_dims = None
+    if args.atlas:
+        ndims = len(index.signature)
+        try:
+            atlas_dims = [int(t) for t in args.atlas.split(",")]
+        except ValueError:
+            atlas_dims = []
+        if (len(atlas_dims) != 2 or atlas_dims[0] == atlas_dims[1]
+                or not all(0 <= d < ndims for d in atlas_dims)):
+            sys.exit("--atlas needs two different dimension indices from 0 to %d, e.g. --atlas 0,1"
+                     % (ndims - 1))
+        if not HAVE_PIL:
+            print("[WARN] Pillow is not installed (pip install pillow); --atlas ignored.")
+            atlas_dims = None
+
+    def build_meta():
+        meta = index.meta(node_titles, base)
+        if thumb_levels:
+            built = build_thumbs(img_dir, sorted(set(index.posters.values())), thumb_levels, args.workers)
+            if built:
+                levels, size = built
+                meta.update(thumb_base=base + THUMB_DIR + "/", thumb_levels=levels, size=list(size))
+        if "size" not in meta:
+            # Cell sizes are known before any image loads (and the page can pick ?w= widths)
+            try:
+                size = png_size(os.path.join(img_dir, meta["files"][0]))
+            except OSError:
+                size = None
+            if size:
+                meta["size"] = list(size)
+        metrics = read_metrics(img_dir / METRICS_NAME)
+        if metrics:
+            # One list per metric, aligned with meta["files"] (null: not scored, e.g. videos)
+            names, scores = metrics
+            rows = [scores.get(f) or [None] * len(names) for f in meta["files"]]
+            meta["metrics"] = dict(names=names, values=[[r[j] for r in rows] for j in range(len(names))])
+        if atlas_dims:
+            meta["atlas"] = build_atlases(img_dir, meta, atlas_dims[0], atlas_dims[1],
+                                          args.atlas_size, args.workers)
+        return meta
+
+    meta = build_meta()
+    label_em = meta["label_em"]
+    data_path = out_html.with_name(out_html.stem + ".data.js")
+    write_data_file(data_path, meta)
+    data_src = relpath_for_html(data_path, out_base)
 
     html = Template("""<!DOCTYPE html>
 <html>
@@ -259,6 +349,9 @@ h1{margin:0;font-size:1.05rem;font-weight:600;}
 .meta{font-size:0.85rem;color:var(--muted);margin-bottom:8px;}
 .toggle{border:1px solid var(--border);background:transparent;color:var(--fg);
        border-radius:8px;padding:4px 8px;cursor:pointer;}\r\n/* Scale control */\r\n.controls{display:flex;align-items:center;gap:10px;}\r\n.scale-wrap{display:flex;align-items:center;gap:6px;color:var(--muted);font-size:0.9rem;}\r\n.scale-wrap input[type=range]{width:180px;}
+.metric-wrap{display:flex;align-items:center;gap:6px;color:var(--muted);font-size:0.9rem;}
+.metric-wrap[hidden]{display:none;}
+.metric-wrap select{padding:2px 6px;border:1px solid var(--border);border-radius:6px;background:var(--bg);color:var(--fg);}
 
 #sliders{border:1px solid var(--border);border-radius:8px;padding:8px 10px 2px 10px;
          background:rgba(127,127,127,0.03);}
@@ -313,6 +406,13 @@ input[type=checkbox]{
   background:#000;
   max-width:none;
 }
+/* Virtualized grid: #gridWrap scrolls both ways and the headers stay in view */
+#gridWrap.virtual{max-height:calc(100vh - 24px);}
+#gridWrap.virtual .hdr{justify-self:stretch;align-self:stretch;box-sizing:border-box;}
+#gridWrap.virtual .xhdr{position:sticky;top:0;z-index:1;}
+#gridWrap.virtual .yhdr{position:sticky;left:0;z-index:1;}
+#gridWrap.virtual .corner{top:0;z-index:2;}
+#gridWrap.virtual .vwrap img{display:block;}
 /* Removed play overlay; click or shift-click behavior handled in JS */
 .footer{display:none;}
 input[type=range]{height:26px;background:transparent;}
@@ -339,6 +439,11 @@ input[type=range]::-moz-range-thumb{
         <input id="scaleSlider" type="range" min="1" max="200" value="100" />
         <span id="scaleValue">100%</span>
       </div>
+      <div class="metric-wrap" id="metricWrap" hidden>
+        <label for="metricSel">Heat map:</label>
+        <select id="metricSel"><option value="-1">none</option></select>
+        <label><input id="sortChk" type="checkbox" disabled /> Sort</label>
+      </div>
     </div>
   </div>
   <div class="meta">
@@ -352,7 +457,7 @@ input[type=range]::-moz-range-thumb{
   </div>
 </div>
 
-<script>
+${data_script}<script>
 (function(){
   const saved=localStorage.getItem("viewer_theme");
   if(saved==="dark"||( !saved && window.matchMedia && window.matchMedia("(prefers-color-scheme: dark)").matches)){
@@ -365,7 +470,7 @@ input[type=range]::-moz-range-thumb{
   };
 })();
 
-const data=${meta_json};
+const data=window.VIEWER_DATA;
 const dims=data.dim_values.length;
 const curIdx=new Array(dims).fill(0);
 const locked=new Array(dims).fill(false);
@@ -376,14 +481,16 @@ const gridRoot=document.getElementById("grid");
 const gridHint=document.getElementById("gridHint");
 
 const sliderEls=[];
+const bubbleEls=[];
 const lockEls=[];
 const axisSelEls=[];
 
 // Track current grid structure to avoid teardown/rebuild (reduces flicker)
-let curStruct = { mode:"", xLen:0, yLen:0 };
-let imageCells = []; // Array of <img> elements in row-major order (no headers)
+let curStruct = { mode:"", xLen:0, yLen:0, virtual:false };
+let imageCells = []; // Array of <img> elements in row-major order (no headers); live cells only when virtual
 
 function applyGridColumnWidths(hasX, hasY, xLen){
+  if(curStruct.virtual){ applyVirtualTracks(); return; }
   // Make the first column size to its content (y labels), independent of image scale
   if(hasX && hasY){ gridRoot.style.gridTemplateColumns = "max-content " + Array(xLen).fill("auto").join(" "); }
   else if(hasX){ gridRoot.style.gridTemplateColumns = "max-content " + Array(xLen).fill("auto").join(" "); }
@@ -391,6 +498,7 @@ function applyGridColumnWidths(hasX, hasY, xLen){
   else { gridRoot.style.gridTemplateColumns = "auto"; }
 }// ---- Global scaling state ----
 let natW = 0, natH = 0;           // natural dimensions (assumed uniform across images)
+if (data.size){ natW = data.size[0]; natH = data.size[1]; }  // known up front when thumbnails exist
 let autoScale = 1;                 // computed to fit X columns within viewport width (<=1)
 let userScalePct = 100;            // 1..200
 let scaleMode = 'auto';            // 'auto' or 'user'
@@ -439,8 +547,17 @@ function applyScaleToImages(){
   const s = effectiveScale();
   if (natW>0){
     const w = Math.max(1, Math.floor(natW * s));
-    for(const im of imageCells){ im.style.width = w + 'px'; }
+    for(const im of imageCells){
+      im.style.width = w + 'px';
+      if(im.dataset.loaded==="atlas"){ placeAtlasCell(im, w); continue; }
+      // Bigger cells may need a larger thumbnail level
+      if(curStruct.mode!=="single" && im.dataset.fname && im.dataset.loaded==="ok"){
+        const src = srcFor(im.dataset.fname);
+        if(im.getAttribute("src") !== src) im.src = src;
+      }
+    }
     syncVideoSizes();
+    scheduleVirtual();   // cell size changed: other cells are now in view
   }
 }
 
@@ -467,6 +584,7 @@ function buildUI(){
     wrap.appendChild(bubble);wrap.appendChild(slider);
     row.appendChild(wrap);
     sliderEls.push(slider);
+    bubbleEls.push(bubble);
 
     const axisWrap=document.createElement("div");axisWrap.className="axis-wrap";
     const axisSel=document.createElement("select");
@@ -517,41 +635,205 @@ function setAxis(i, v){
 }
 
 function keyFrom(idxOverride){
-  const arr=[];
+  let cell=0;
   for(let d=0; d<dims; d++){
     const i = (idxOverride && Object.prototype.hasOwnProperty.call(idxOverride, d)) ? idxOverride[d] : curIdx[d];
-    arr.push(data.dim_values[d][i].k);
+    cell = cell*data.dim_values[d].length + i;
+  }
+  return cell;
+}
+
+// Data file lookups: cell = row-major index over dim_values, file ids index data.files
+function posterName(cell){ const f=data.grid[cell]; return f>=0 ? data.files[f] : undefined; }
+function videoName(cell){ const f=data.vgrid ? data.vgrid[cell] : -1; return f>=0 ? data.files[f] : undefined; }
+function fileUrl(fname){ return data.base+fname; }
+
+// Atlas sheet for the current page when the grid axes are the packed pair (either way
+// round) and the cells are not displayed larger than the atlas cells; null otherwise
+const BLANK_GIF = "data:image/gif;base64,R0lGODlhAQABAIAAAAAAAP///yH5BAEAAAAALAAAAAABAAEAAAIBRAA7";
+function atlasFor(xDim, yDim){
+  const at = data.atlas;
+  if(!at || !natW) return null;
+  let swap;
+  if(at.x === xDim && at.y === yDim) swap = false;
+  else if(at.x === yDim && at.y === xDim) swap = true;
+  else return null;
+  if(natW * effectiveScale() * (window.devicePixelRatio || 1) > at.cw * 1.1) return null;
+  let rest = 0;
+  for(let d=0; d<dims; d++){
+    if(d === at.x || d === at.y) continue;
+    rest = rest * data.dim_values[d].length + curIdx[d];
+  }
+  const sheet = at.planes[rest];
+  return sheet ? { url: at.base + sheet, swap: swap } : null;
+}
+
+function placeAtlasCell(im, w){
+  const at = data.atlas;
+  const h = Math.max(1, Math.round(w * at.ch / at.cw));
+  im.style.height = h + 'px';
+  im.style.backgroundSize = (at.cols * w) + 'px ' + (at.rows * h) + 'px';
+  im.style.backgroundPosition = (-im.dataset.ax * w) + 'px ' + (-im.dataset.ay * h) + 'px';
+}
+
+function clearAtlasCell(im){
+  if(im.dataset.loaded !== "atlas") return;
+  im.style.backgroundImage = "";
+  im.style.height = "";
+  im.dataset.loaded = "";
+}
+
+// Smallest thumbnail level that covers the displayed cell width (full-res when none does).
+// Without thumbnails, a page served over http asks for a ?w= variant instead; serve_viewer.py
+// resizes those on demand and other servers ignore the query.
+const RESIZE_WIDTHS = [64, 128, 256, 512, 1024, 2048];
+function srcFor(fname){
+  if(!natW) return fileUrl(fname);
+  const need = natW * effectiveScale() * (window.devicePixelRatio || 1);
+  const levels = data.thumb_levels;
+  if(levels && levels.length){
+    const longSide = Math.max(natW, natH);
+    for(const lv of levels){
+      if(lv * natW / longSide >= need){
+        return data.thumb_base + lv + "/" + fname.slice(0, fname.lastIndexOf(".")) + ".jpg";
+      }
+    }
+  } else if(location.protocol.startsWith("http")){
+    for(const w of RESIZE_WIDTHS){
+      if(w >= need && w < natW) return fileUrl(fname) + "?w=" + w;
+    }
   }
-  return arr.join("|");
+  return fileUrl(fname);
 }
 
-function fnameFor(idxOverride){
-  const k = keyFrom(idxOverride);
-  return data.poster_lookup[k];
+// ---- Virtualized grid ----
+// In grid modes, once the image size is known, only the cells that intersect the visible
+// part of #gridWrap (plus VIRTUAL_MARGIN px) exist. Tracks have fixed sizes so the grid
+// still scrolls over the whole plane, and cells leaving the view are recycled.
+const VIRTUAL_MARGIN = 600;
+let gridCtx = null;          // axes of the current render, set by renderGrid()
+let liveCells = new Map();   // cell index -> <img>
+const cellPool = [];         // detached <img> cells for reuse
+let xHdrEls = [], yHdrEls = [];
+let virtualQueued = false;
+
+function cellSize(){
+  const w = Math.max(1, Math.floor(natW * effectiveScale()));
+  return { w:w, h:Math.max(1, Math.ceil(w * natH / natW)) };
+}
+
+function applyVirtualTracks(){
+  const c = gridCtx, sz = cellSize();
+  gridRoot.style.gridTemplateColumns = "max-content " + (c.hasX ? "repeat(" + c.xLen + ", " + sz.w + "px)" : sz.w + "px");
+  gridRoot.style.gridTemplateRows = (c.hasX ? "auto " : "") + "repeat(" + c.yLen + ", " + sz.h + "px)";
+}
+
+// [from, to) of n tracks (first one starting at first px, pitch px apart) that meet lo..hi
+function visibleSpan(first, pitch, lo, hi, n){
+  const from = Math.max(0, Math.floor((lo - VIRTUAL_MARGIN - first) / pitch));
+  const to = Math.min(n, Math.ceil((hi + VIRTUAL_MARGIN - first) / pitch));
+  return [from, Math.max(from, to)];
+}
+
+function scheduleVirtual(){
+  if(virtualQueued || !curStruct.virtual) return;
+  virtualQueued = true;
+  requestAnimationFrame(() => layoutVirtual(false));
+}
+
+// Create the cells that came into view, recycle the ones that left; refresh re-renders all
+function layoutVirtual(refresh){
+  virtualQueued = false;
+  if(!curStruct.virtual) return;
+  const c = gridCtx, sz = cellSize();
+  applyVirtualTracks();
+  const wr = gridWrap.getBoundingClientRect();
+  const left = Math.max(wr.left, 0), right = Math.min(wr.right, window.innerWidth);
+  const top = Math.max(wr.top, 0), bottom = Math.min(wr.bottom, window.innerHeight);
+  const cols = c.hasX ? visibleSpan(xHdrEls[0].getBoundingClientRect().left, sz.w + gapPx, left, right, c.xLen) : [0, 1];
+  const rows = c.hasY ? visibleSpan(yHdrEls[0].getBoundingClientRect().top, sz.h + gapPx, top, bottom, c.yLen) : [0, 1];
+  const want = new Set();
+  for(let ry=rows[0]; ry<rows[1]; ry++){
+    for(let cx=cols[0]; cx<cols[1]; cx++) want.add(ry * c.xLen + cx);
+  }
+  for(const [i, im] of liveCells){
+    if(want.has(i)) continue;
+    stopVideoForCell(im, false);
+    clearAtlasCell(im);
+    im.onload = null;
+    im.removeAttribute("src");
+    im.dataset.loaded = "";
+    im.parentElement.parentElement.remove();
+    liveCells.delete(i);
+    cellPool.push(im);
+  }
+  for(const i of want){
+    let im = liveCells.get(i);
+    if(im){
+      if(refresh) updateCell(im, i);
+      continue;
+    }
+    im = cellPool.pop() || makeImgCell();
+    const item = im.parentElement.parentElement;
+    item.style.gridColumn = String(i % c.xLen + 2);
+    item.style.gridRow = String(Math.floor(i / c.xLen) + (c.hasX ? 2 : 1));
+    im.style.width = sz.w + "px";
+    gridRoot.appendChild(item);
+    liveCells.set(i, im);
+    updateCell(im, i);
+  }
+  imageCells = Array.from(liveCells.values());
 }
 
-function ensureStructure(hasX, hasY, xLen, yLen){
+gridWrap.addEventListener("scroll", scheduleVirtual, { passive:true });
+window.addEventListener("scroll", scheduleVirtual, { passive:true });
+
+function ensureStructure(hasX, hasY, xLen, yLen, virtual){
   let desiredMode = "single";
   if(hasX && hasY) desiredMode="xy";
   else if(hasX) desiredMode="x";
   else if(hasY) desiredMode="y";
+  virtual = virtual && desiredMode!=="single";
 
-  if(curStruct.mode===desiredMode && curStruct.xLen===xLen && curStruct.yLen===yLen){
+  if(curStruct.mode===desiredMode && curStruct.xLen===xLen && curStruct.yLen===yLen && curStruct.virtual===virtual){
     return; // no structural change; reuse DOM
   }
 
   // rebuild structure
+  for(const im of imageCells) stopVideoForCell(im, false);
   gridRoot.innerHTML="";
+  gridRoot.style.gridTemplateRows = "";
   imageCells = [];
-  curStruct = { mode:desiredMode, xLen:xLen, yLen:yLen };
+  liveCells = new Map();
+  cellPool.length = 0;
+  curStruct = { mode:desiredMode, xLen:xLen, yLen:yLen, virtual:virtual };
+  gridWrap.classList.toggle("virtual", virtual);
+  xHdrEls = []; yHdrEls = [];
+
+  if(virtual){
+    // Headers only; layoutVirtual() places the cells it needs at explicit grid positions
+    const makeHdr=(txt, cls, row, col)=>{
+      const d=document.createElement("div"); d.className="hdr "+cls; d.textContent=txt;
+      d.style.gridRow=String(row); d.style.gridColumn=String(col);
+      gridRoot.appendChild(d); return d;
+    };
+    if(hasX){
+      makeHdr("", "yhdr corner", 1, 1);
+      for(let cx=0; cx<xLen; cx++){ xHdrEls.push(makeHdr(data.dim_values[axis.indexOf("x")][cx].d, "xhdr", 1, cx+2)); }
+    }
+    if(hasY){
+      for(let ry=0; ry<yLen; ry++){ yHdrEls.push(makeHdr(data.dim_values[axis.indexOf("y")][ry].d, "yhdr", ry+(hasX ? 2 : 1), 1)); }
+    }
+    return;
+  }
 
   if(desiredMode==="xy"){
     gridRoot.style.gridTemplateColumns = "auto " + Array(xLen).fill("auto").join(" ");
     const makeHdr=(txt, cls)=>{ const d=document.createElement("div"); d.className="hdr "+(cls||""); d.textContent=txt; return d; };
     gridRoot.appendChild(makeHdr("", "yhdr"));
-    for(let cx=0; cx<xLen; cx++){ gridRoot.appendChild(makeHdr(data.dim_values[axis.indexOf("x")][cx].d, "")); }
+    for(let cx=0; cx<xLen; cx++){ xHdrEls.push(gridRoot.appendChild(makeHdr(data.dim_values[axis.indexOf("x")][cx].d, ""))); }
     for(let ry=0; ry<yLen; ry++){
-      gridRoot.appendChild(makeHdr(data.dim_values[axis.indexOf("y")][ry].d, "yhdr"));
+      yHdrEls.push(gridRoot.appendChild(makeHdr(data.dim_values[axis.indexOf("y")][ry].d, "yhdr")));
       for(let cx=0; cx<xLen; cx++){
         const img = makeImgCell();
         imageCells.push(img);
@@ -562,7 +844,7 @@ function ensureStructure(hasX, hasY, xLen, yLen){
     gridRoot.style.gridTemplateColumns = "auto " + Array(xLen).fill("auto").join(" ");
     const makeHdr=(txt, cls)=>{ const d=document.createElement("div"); d.className="hdr "+(cls||""); d.textContent=txt; return d; };
     gridRoot.appendChild(makeHdr("", "yhdr"));
-    for(let cx=0; cx<xLen; cx++){ gridRoot.appendChild(makeHdr(data.dim_values[axis.indexOf("x")][cx].d, "")); }
+    for(let cx=0; cx<xLen; cx++){ xHdrEls.push(gridRoot.appendChild(makeHdr(data.dim_values[axis.indexOf("x")][cx].d, ""))); }
     for(let cx=0; cx<xLen; cx++){
       const img = makeImgCell();
       imageCells.push(img);
@@ -572,7 +854,7 @@ function ensureStructure(hasX, hasY, xLen, yLen){
     gridRoot.style.gridTemplateColumns = "auto auto";
     const makeHdr=(txt, cls)=>{ const d=document.createElement("div"); d.className="hdr "+(cls||""); d.textContent=txt; return d; };
     for(let ry=0; ry<yLen; ry++){
-      gridRoot.appendChild(makeHdr(data.dim_values[axis.indexOf("y")][ry].d, "yhdr"));
+      yHdrEls.push(gridRoot.appendChild(makeHdr(data.dim_values[axis.indexOf("y")][ry].d, "yhdr")));
       const img = makeImgCell();
       imageCells.push(img);
       gridRoot.appendChild(img.parentElement.parentElement);
@@ -599,8 +881,8 @@ function makeImgCell(){
     if(im.dataset.hasvid==='1'){
       e.preventDefault();
       const k = im.dataset.key;
-      const vf = data.video_lookup[k];
-      const vurl = vf ? data.video_urls[vf] : null;
+      const vf = videoName(k);
+      const vurl = vf ? fileUrl(vf) : null;
       if(!vurl) return;
       if(e.shiftKey){
         window.open(vurl, '_blank', 'noopener,noreferrer');
@@ -614,29 +896,60 @@ function makeImgCell(){
   return im;
 }
 
-function desiredFilenames(hasX, hasY, xDim, yDim, xLen, yLen){
-  const list=[];
-  if(hasX && hasY){
-    for(let ry=0; ry<yLen; ry++){
-      for(let cx=0; cx<xLen; cx++){
-        const override={}; override[xDim]=cx; override[yDim]=ry;
-        list.push(fnameFor(override));
-      }
-    }
-  } else if(hasX){
-    for(let cx=0; cx<xLen; cx++){
-      const override={}; override[xDim]=cx;
-      list.push(fnameFor(override));
+// Point one grid cell (row-major index i over the current axes) at its image
+function updateCell(im, i){
+  const c = gridCtx;
+  const j = sortedIndex(i);   // the cell's position before sorting
+  const k = keyForCellIndex(j, c.hasX, c.hasY, c.xDim, c.yDim);
+  const fname = posterName(k);
+  const a = im.parentElement;
+  const vwrap = a.parentElement;
+  const overlay = null;
+  paintHeat(a, fname ? data.grid[k] : -1);
+  if(!fname){
+    // missing: blank this cell
+    if(im.dataset.loaded!=="missing"){
+      clearAtlasCell(im);
+      im.removeAttribute("src");
+      im.dataset.loaded="missing";
+      a.removeAttribute("href");
     }
-  } else if(hasY){
-    for(let ry=0; ry<yLen; ry++){
-      const override={}; override[yDim]=ry;
-      list.push(fnameFor(override));
+    return;
+  }
+  // Stop video if key changes or on update
+  stopVideoForCell(im, true);
+  im.dataset.key = k;
+  const hasVid = !!videoName(k);
+  im.dataset.hasvid = hasVid ? '1' : '';
+  // overlay removed
+  const url = fileUrl(fname);
+  if(a.href !== url){
+    a.href = url;   // full-res only when the cell is opened
+  }
+  im.dataset.fname = fname;
+  if(c.atlas){
+    // One shared sheet: the cell is a background-positioned slice of it
+    im.dataset.ax = c.atlas.swap ? Math.floor(j / c.xLen) : j % c.xLen;
+    im.dataset.ay = c.atlas.swap ? j % c.xLen : Math.floor(j / c.xLen);
+    if(im.dataset.loaded!=="atlas"){
+      im.onload = null;
+      im.src = BLANK_GIF;
+      im.style.backgroundRepeat = "no-repeat";
+      im.dataset.loaded="atlas";
     }
-  } else {
-    list.push(fnameFor(null));
+    im.style.backgroundImage = 'url("' + c.atlas.url + '")';
+    im.style.width = Math.max(1, Math.floor(natW * effectiveScale())) + 'px';
+    placeAtlasCell(im, Math.max(1, Math.floor(natW * effectiveScale())));
+    return;
+  }
+  clearAtlasCell(im);
+  const src = (c.hasX || c.hasY) ? srcFor(fname) : url;
+  if(im.getAttribute("src") !== src){
+    im.decoding = "async";
+    im.onload = () => { if (!natW || !natH){ natW = im.naturalWidth || im.width; natH = im.naturalHeight || im.height; } if (c.hasX && scaleMode==='auto'){ computeAutoScale(c.xLen); } applyScaleToImages(); };
+    im.src = src; // in-place swap
+    im.dataset.loaded="ok";
   }
-  return list;
 }
 
 function renderGrid(){
@@ -648,45 +961,18 @@ function renderGrid(){
   const xLen = hasX ? data.dim_values[xDim].length : 1;
   const yLen = hasY ? data.dim_values[yDim].length : 1;
 
-  ensureStructure(hasX, hasY, xLen, yLen);
+  ensureStructure(hasX, hasY, xLen, yLen, natW>0);
+  gridCtx = { hasX:hasX, hasY:hasY, xDim:xDim, yDim:yDim, xLen:xLen, yLen:yLen, atlas:null };
   applyGridColumnWidths(hasX, hasY, xLen);
   if(hasX && natW>0){ computeAutoScale(xLen); applyScaleToImages(); }
 
-
   // Update images in-place (no grid teardown -> minimal flicker)
-  const names = desiredFilenames(hasX, hasY, xDim, yDim, xLen, yLen);
-  for(let i=0;i<imageCells.length;i++){
-    const im = imageCells[i];
-    const fname = names[i];
-    const a = im.parentElement;
-    const vwrap = a.parentElement;
-    const overlay = null;
-    if(!fname){
-      // missing: blank this cell
-      if(im.dataset.loaded!=="missing"){
-        im.removeAttribute("src");
-        im.dataset.loaded="missing";
-        a.removeAttribute("href");
-      }
-      continue;
-    }
-    // Stop video if key changes or on update
-    stopVideoForCell(im, true);
-    const k = keyForCellIndex(i, hasX, hasY, xDim, yDim);
-    im.dataset.key = k;
-    const hasVid = !!data.video_lookup[k];
-    im.dataset.hasvid = hasVid ? '1' : '';
-    // overlay removed
-    const url = data.poster_urls[fname];
-    if(a.href !== url){
-      a.href = url;
-    }
-    if(im.getAttribute("src") !== url){
-      im.decoding = "async";
-      im.onload = () => { if (!natW || !natH){ natW = im.naturalWidth || im.width; natH = im.naturalHeight || im.height; } if (hasX && scaleMode==='auto'){ computeAutoScale(xLen); } applyScaleToImages(); };
-      im.src = url; // in-place swap
-      im.dataset.loaded="ok";
-    }
+  gridCtx.atlas = (hasX && hasY) ? atlasFor(xDim, yDim) : null;
+  sortAxes(gridCtx);
+  if(curStruct.virtual){
+    layoutVirtual(true);
+  } else {
+    for(let i=0;i<imageCells.length;i++) updateCell(imageCells[i], i);
   }
 
   // Single-image fit
@@ -727,8 +1013,93 @@ window.addEventListener("resize", () => {
     applyScaleToImages();
     applyGridColumnWidths(hasX, hasY, data.dim_values[xDim].length);
   }
+  scheduleVirtual();
 });
 
+// ---- Metrics (analyze_sweep.py) ----
+// data.metrics = {names:[...], values:[[score or null per file id], ...]}. The selected
+// metric tints each cell from blue (lowest in the sweep) to red (highest); with Sort, the
+// X/Y values are ordered by their mean score over the cells currently shown, best first.
+const metricWrap = document.getElementById('metricWrap');
+const metricSel = document.getElementById('metricSel');
+const sortChk = document.getElementById('sortChk');
+let heatMetric = -1;       // index into data.metrics.names, -1 = off
+let heatRange = null;      // [min, max] of the selected metric over the sweep
+
+function setupMetrics(){
+  const m = data.metrics;
+  metricWrap.hidden = !m;
+  const keep = metricSel.value !== "-1" ? metricSel.options[metricSel.selectedIndex].text : "";
+  metricSel.length = 1;
+  if(m) m.names.forEach((n, j) => metricSel.add(new Option(n, String(j))));
+  metricSel.value = (m && m.names.includes(keep)) ? String(m.names.indexOf(keep)) : "-1";
+  selectMetric();
+}
+
+function selectMetric(){
+  heatMetric = parseInt(metricSel.value, 10);
+  heatRange = null;
+  if(heatMetric >= 0){
+    let lo = Infinity, hi = -Infinity;
+    for(const v of data.metrics.values[heatMetric]){
+      if(v === null) continue;
+      if(v < lo) lo = v;
+      if(v > hi) hi = v;
+    }
+    if(lo <= hi) heatRange = [lo, hi];
+  }
+  sortChk.disabled = !heatRange;
+}
+
+metricSel.onchange = () => { selectMetric(); renderGrid(); };
+sortChk.onchange = () => { renderGrid(); };
+
+function fileScore(f){
+  if(!heatRange || f < 0) return null;
+  const v = data.metrics.values[heatMetric][f];
+  return v === undefined ? null : v;
+}
+
+function paintHeat(a, f){
+  const v = fileScore(f);
+  if(v === null){ a.style.boxShadow = ""; a.title = ""; return; }
+  const t = heatRange[1] > heatRange[0] ? (v - heatRange[0]) / (heatRange[1] - heatRange[0]) : 0.5;
+  a.style.boxShadow = "0 0 0 4px hsl(" + Math.round(240 * (1 - t)) + ",85%,50%)";
+  a.title = data.metrics.names[heatMetric] + ": " + v.toPrecision(4);
+}
+
+// Column/row orders for the grid (positions -> value indices), identity unless sorting
+function sortAxes(c){
+  c.xOrder = Array.from({length:c.xLen}, (_, i) => i);
+  c.yOrder = Array.from({length:c.yLen}, (_, i) => i);
+  if(sortChk.checked && heatRange && (c.hasX || c.hasY)){
+    const xSum = new Array(c.xLen).fill(0), xN = new Array(c.xLen).fill(0);
+    const ySum = new Array(c.yLen).fill(0), yN = new Array(c.yLen).fill(0);
+    for(let ry=0; ry<c.yLen; ry++){
+      for(let cx=0; cx<c.xLen; cx++){
+        const v = fileScore(data.grid[keyForCellIndex(ry * c.xLen + cx, c.hasX, c.hasY, c.xDim, c.yDim)]);
+        if(v === null) continue;
+        xSum[cx] += v; xN[cx]++;
+        ySum[ry] += v; yN[ry]++;
+      }
+    }
+    const byMean = (sum, n) => (p, q) => {
+      const mp = n[p] ? sum[p] / n[p] : -Infinity, mq = n[q] ? sum[q] / n[q] : -Infinity;
+      return mq - mp || p - q;
+    };
+    if(c.hasX) c.xOrder.sort(byMean(xSum, xN));
+    if(c.hasY) c.yOrder.sort(byMean(ySum, yN));
+  }
+  for(let cx=0; cx<xHdrEls.length; cx++) xHdrEls[cx].textContent = data.dim_values[c.xDim][c.xOrder[cx]].d;
+  for(let ry=0; ry<yHdrEls.length; ry++) yHdrEls[ry].textContent = data.dim_values[c.yDim][c.yOrder[ry]].d;
+}
+
+function sortedIndex(i){
+  const c = gridCtx;
+  return c.yOrder[Math.floor(i / c.xLen)] * c.xLen + c.xOrder[i % c.xLen];
+}
+
+setupMetrics();
 buildUI();
 renderGrid();
 
@@ -754,11 +1125,11 @@ function launchVideoInCell(im){
   const vwrap = a.parentElement;
   if(vwrap.querySelector('video')) return;
   const k = im.dataset.key;
-  const vf = data.video_lookup[k];
+  const vf = videoName(k);
   if(!vf) return;
-  const vurl = data.video_urls[vf];
-  const pf = data.poster_lookup[k];
-  const purl = pf ? data.poster_urls[pf] : '';
+  const vurl = fileUrl(vf);
+  const pf = posterName(k);
+  const purl = pf ? fileUrl(pf) : '';
   const vid = document.createElement('video');
   vid.controls = true; vid.autoplay = true; vid.playsInline = true; vid.poster = purl;
   vid.src = vurl; vid.style.display='block'; vid.style.background='#000';
@@ -783,8 +1154,8 @@ function stopVideoForCell(im, restoreLink){
   try{ vid.remove(); }catch(e){}
   im.style.display='block';
   if(restoreLink){
-    const pf = im.dataset.key ? data.poster_lookup[im.dataset.key] : null;
-    if(pf){ a.href = data.poster_urls[pf]; }
+    const pf = im.dataset.key ? posterName(im.dataset.key) : null;
+    if(pf){ a.href = fileUrl(pf); }
   }
 }
 
@@ -803,17 +1174,42 @@ function syncVideoSizes(){
     }
   }
 }
-</script>
+
+// Watch mode: swap in a newer data file, keeping the selected values
+function applyData(nd){
+  const keep=curIdx.map((v,d)=>data.dim_values[d][v].k);
+  Object.assign(data, nd);
+  if(!sliderEls.length) return;
+  for(let d=0; d<dims; d++){
+    const vals=data.dim_values[d];
+    curIdx[d]=Math.max(0, vals.findIndex(v=>v.k===keep[d]));
+    sliderEls[d].max=vals.length-1;
+    sliderEls[d].value=curIdx[d];
+    sliderEls[d].style.width=sliderWidth(vals.length)+"px";
+    bubbleEls[d].textContent=vals[curIdx[d]].d;
+  }
+  setupMetrics();
+  renderGrid();
+}
+${live_js}</script>
 </body>
 </html>
 """).substitute(
         label_em=f"{label_em:.1f}",
-        meta_json=json.dumps(meta)
+        data_script=data_script(data_src),
+        live_js=live_script(data_src, args.interval) if args.watch else "",
     )
 
     out_html.write_text(html, encoding="utf-8")
     print("Generated HTML:", out_html)
+    print("Viewer data:", data_path)
     print("Note: Viewer uses lazy-load only. Keep the PNGs in place so the HTML can load them.")
+    if args.watch:
+        print("Watching %s every %gs; updating %s (Ctrl+C to stop)"
+              % (img_dir, args.interval, data_path.name))
+        watch_folder(index, collect_entries,
+                     lambda: write_data_file(data_path, build_meta()),
+                     args.interval)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+# merge_shards.py
+#
+# Combines the folders of a sweep rendered in shards (gen_images.py --shard i/N, e.g. one
+# cloud machine per shard) into one images folder the viewers can read.
+#
+# Each source is a shard's images folder (the one holding 0000_sweep_manifest.jsonl), or
+# a project folder, in which case its params/images/<subfolder> is used. All manifests
+# must describe the same sweep (same subfolder, axis values and --naming).
+#
+# Into <base>/params/images/<subfolder> (or --dest):
+#   - every output file of the sweep (.png, .mp4, ...) is copied, or moved with --move;
+#     a file already there with the same size is left alone, otherwise the newer wins
+#   - the manifests become one: per output the "done" record wins over queued/failed,
+#     and every output file present gets a "done" record listing it (shards run without
+#     --monitor only record "queued"), so the viewers see the whole sweep
+# Viewer pages, metrics, caches and thumbnails (subfolders) are not copied; run the
+# viewer scripts on the merged folder afterwards.
+#
+# Usage:
+#   python merge_shards.py shard1 shard2 shard3        # into ./params/images/<subfolder>
+#   python merge_shards.py --dest D:/sweeps/Demo E:/shard1/params/images/Demo E:/shard2
+#
+# Stdlib only.
+
+import argparse
+import os
+import shutil
+import sys
+from pathlib import Path
+
+from sweep_manifest import (MANIFEST_NAME, is_sweep_artifact, output_matcher, read_manifest, same_sweep,
+                            write_manifest)
+
+def parse_args():
+    p = argparse.ArgumentParser(
+        description="Merge the output folders of a sharded sweep (gen_images.py --shard) into one."
+    )
+    p.add_argument(
+        "sources",
+        nargs="+",
+        help="Shard images folders (holding %s) or project folders." % MANIFEST_NAME,
+    )
+    p.add_argument(
+        "--dest",
+        dest="dest",
+        default=None,
+        help="Merged images folder (default: <base>/params/images/<subfolder of the sweep>).",
+    )
+    p.add_argument(
+        "--base",
+        dest="basepath",
+        default=".",
+        help="Base directory for resolving relative paths (default: current directory).",
+    )
+    p.add_argument(
+        "--move",
+        dest="move",
+        action="store_true",
+        help="Move files instead of copying them.",
+    )
+    p.add_argument(
+        "--dry-run",
+        dest="dry_run",
+        action="store_true",
+        help="Only report what would be copied.",
+    )
+    p.add_argument(
+        "--verbose",
+        dest="verbose",
+        action="store_true",
+        help="Print every file.",
+    )
+    return p.parse_args()
+
+def find_sweep_dir(path):
+    """The folder itself if it holds a manifest, else the one sweep under params/images."""
+    if (path / MANIFEST_NAME).is_file():
+        return path
+    images = path / "params" / "images"
+    found = sorted(m.parent for m in images.glob("*/" + MANIFEST_NAME)) if images.is_dir() else []
+    if len(found) == 1:
+        return found[0]
+    if found:
+        raise ValueError("%s holds several sweeps (%s); pass the folder to merge"
+                         % (images, ", ".join(d.name for d in found)))
+    raise ValueError("No %s in %s" % (MANIFEST_NAME, path))
+
+def merge_record(records, o, rec):
+    """Keep one record per output: done beats queued/failed, then the later one; done files are pooled."""
+    cur = records.get(o)
+    if cur is None:
+        records[o] = dict(rec)
+        return
+    cur_done, new_done = cur.get("st") == "done", rec.get("st") == "done"
+    best = dict(rec) if (new_done, rec.get("t", 0)) >= (cur_done, cur.get("t", 0)) else cur
+    if cur_done and new_done:
+        best["files"] = sorted(set(cur.get("files") or []) | set(rec.get("files") or []))
+    records[o] = best
+
+def place(src, dst, move):
+    tmp = dst + ".tmp"
+    if move:
+        try:
+            os.replace(src, dst)
+            return
+        except OSError:
+            pass        # other drive: copy, then remove
+    shutil.copy2(src, tmp)
+    os.replace(tmp, dst)
+    if move:
+        os.remove(src)
+
+def merge_files(src, dest, match, move=False, dry_run=False, verbose=False):
+    """Copy the sweep's output files from src into dest. Returns (copied, kept, skipped)."""
+    copied = kept = skipped = 0
+    with os.scandir(src) as it:
+        entries = sorted((e for e in it if e.is_file()), key=lambda e: e.name)
+    for e in entries:
+        if is_sweep_artifact(e.name):
+            continue
+        if e.name.endswith(".tmp") or match(e.name) is None:
+            skipped += 1
+            continue
+        dst = os.path.join(dest, e.name)
+        try:
+            have = os.stat(dst)
+        except FileNotFoundError:
+            have = None
+        st = e.stat()
+        if have is not None and (have.st_size == st.st_size or have.st_mtime_ns >= st.st_mtime_ns):
+            kept += 1
+            continue
+        if verbose:
+            print("[%s] %s" % ("MOVE" if move else "COPY", os.path.join(src, e.name)))
+        if not dry_run:
+            place(e.path, dst, move)
+        copied += 1
+    return copied, kept, skipped
+
+def main():
+    args = parse_args()
+    basepath = Path(args.basepath).resolve()
+
+    sources = []
+    for s in args.sources:
+        path = Path(s)
+        if not path.is_absolute():
+            path = basepath / path
+        try:
+            folder = find_sweep_dir(path.resolve())
+        except ValueError as e:
+            sys.exit(str(e))
+        manifest = read_manifest(str(folder / MANIFEST_NAME))
+        if manifest is None:
+            sys.exit("Unreadable %s in %s" % (MANIFEST_NAME, folder))
+        sources.append((folder, manifest[0], manifest[1]))
+
+    header = sources[0][1]
+    for folder, other, _ in sources[1:]:
+        if not same_sweep(header, other):
+            sys.exit("%s belongs to a different sweep than %s (prefix, axis values or naming differ)."
+                     % (folder, sources[0][0]))
+
+    if args.dest:
+        dest = Path(args.dest)
+        if not dest.is_absolute():
+            dest = basepath / dest
+    else:
+        dest = basepath / "params" / "images" / header["prefix"]
+    dest = dest.resolve()
+    dest_manifest = str(dest / MANIFEST_NAME)
+
+    records = {}
+    existing = read_manifest(dest_manifest)
+    if existing is not None:
+        if not same_sweep(header, existing[0]):
+            sys.exit("%s already holds a different sweep." % dest)
+        records.update(existing[1])
+
+    if not args.dry_run:
+        os.makedirs(dest, exist_ok=True)
+    match = output_matcher(header)
+    for folder, _, recs in sources:
+        for o, rec in recs.items():
+            merge_record(records, o, rec)
+        if folder == dest:
+            continue
+        copied, kept, skipped = merge_files(str(folder), str(dest), match, args.move,
+                                            args.dry_run, args.verbose)
+        print("%s: %d %s, %d already there, %d not part of the sweep"
+              % (folder, copied, "moved" if args.move else "copied", kept, skipped))
+
+    # Done records must name files that are in the merged folder, and every file needs one
+    present = {}
+    if os.path.isdir(dest):
+        with os.scandir(dest) as it:
+            for e in it:
+                o = match(e.name) if e.is_file() else None
+                if o is not None:
+                    present.setdefault(o, []).append(e.name)
+    if args.dry_run:
+        for folder, _, _ in sources:
+            for name in os.listdir(folder):
+                o = match(name)
+                if o is not None and name not in present.get(o, ()):
+                    present.setdefault(o, []).append(name)
+    for o in list(records):
+        rec = records[o]
+        if rec.get("st") == "done":
+            files = [f for f in rec.get("files") or [] if f in present.get(o, ())]
+            if files:
+                rec["files"] = files
+            else:
+                del records[o]
+    for o, names in present.items():
+        rec = records.get(o)
+        if rec is None or rec.get("st") != "done":
+            records[o] = {"o": o, "st": "done", "files": sorted(names)}
+        else:
+            rec["files"] = sorted(set(rec["files"]) | set(names))
+
+    done = sum(1 for rec in records.values() if rec.get("st") == "done")
+    outputs = header.get("outputs") or 0
+    if not args.dry_run:
+        write_manifest(dest_manifest, header, records)
+    print("%s %d shard folder(s) into %s: %d of %d outputs done%s"
+          % ("Would merge" if args.dry_run else "Merged", len(sources), dest, done, outputs,
+             "" if done >= outputs else " (%d missing)" % (outputs - done)))
+
+if __name__ == "__main__":
+    main()
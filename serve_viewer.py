@@ -0,0 +1,420 @@
+#!/usr/bin/env python3
+# serve_viewer.py
+#
+# Small HTTP server for the generated viewers, so a sweep can be browsed from other
+# machines on the LAN (or locally without file:// limitations). Stdlib only.
+#
+# Compared to python -m http.server it adds:
+#   - HTTP/1.1 keep-alive (Content-Length on every response) and a threaded server
+#   - ETag / Last-Modified validators with 304 replies, and Cache-Control:
+#       images/videos/thumbnails: public, max-age=<--max-age>
+#       .html/.js/.json/.jsonl (viewer pages, data files, manifest): no-cache, so a
+#       --watch viewer's updates show up while unchanged files still answer 304
+#   - byte ranges (206 / 416) so .mp4 seeking works
+#   - gzip for the text files (viewer data, manifest), compressed once per file
+#     version and kept in memory
+#   - on-demand downscaling: image.png?w=256 returns a JPEG at least 256px wide (widths
+#     are rounded up to RESIZE_WIDTHS), made with Pillow on first request and kept in
+#     <root>/0000_thumbs/resized/<width>/. That cache is capped (--resize-cache-mb) and
+#     evicts least recently served files first. The grid viewer asks for these when it
+#     is opened over http and no thumbnails were built, so a sweep on a NAS is browsed
+#     without pulling every full-size PNG. Without Pillow, ?w= is ignored.
+#
+# Usage:
+#   python serve_viewer.py                      # serves ./params/images on port 8000
+#   python serve_viewer.py --root path/to/images --port 8080
+
+import argparse
+import gzip
+import io
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from functools import partial
+from http import HTTPStatus
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+from thumbs import HAVE_PIL, THUMB_DIR, image_size, is_stale, make_resized
+
+COMPRESSIBLE = {".html", ".js", ".json", ".jsonl", ".css", ".txt"}
+REVALIDATE = COMPRESSIBLE
+GZIP_CACHE_MAX = 64 * 1024 * 1024   # bytes of compressed text kept in memory
+RESIZABLE = {".png", ".jpg", ".jpeg", ".webp"}
+RESIZE_WIDTHS = (64, 128, 256, 512, 1024, 2048)
+
+def parse_args():
+    p = argparse.ArgumentParser(
+        description="Serve ComfyParamVisualizer viewers over HTTP (caching, ranges, gzip)."
+    )
+    p.add_argument(
+        "--root",
+        dest="root",
+        default=None,
+        help="Folder to serve (default: <base>/params/images).",
+    )
+    p.add_argument(
+        "--base",
+        dest="basepath",
+        default=".",
+        help="Base directory for resolving relative paths (default: current directory).",
+    )
+    p.add_argument(
+        "--host",
+        dest="host",
+        default="0.0.0.0",
+        help="Address to bind (default: 0.0.0.0, all interfaces; use 127.0.0.1 for local only).",
+    )
+    p.add_argument(
+        "--port",
+        dest="port",
+        type=int,
+        default=8000,
+        help="Port to listen on (default: 8000).",
+    )
+    p.add_argument(
+        "--max-age",
+        dest="max_age",
+        type=int,
+        default=600,
+        help="Cache-Control max-age in seconds for images and videos (default: 600).",
+    )
+    p.add_argument(
+        "--resize-cache-mb",
+        dest="resize_cache_mb",
+        type=int,
+        default=1024,
+        help="Disk cache size in MB for ?w= downscaled images; 0 disables resizing (default: 1024).",
+    )
+    p.add_argument(
+        "--verbose",
+        dest="verbose",
+        action="store_true",
+        help="Log every request.",
+    )
+    return p.parse_args()
+
+class _GzipCache:
+    """path -> ((mtime_ns, size), gzipped bytes), least recently served evicted first."""
+
+    def __init__(self, limit=GZIP_CACHE_MAX):
+        self.limit = limit
+        self.total = 0
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, path, st):
+        key = (st.st_mtime_ns, st.st_size)
+        with self.lock:
+            hit = self.items.get(path)
+            if hit is not None and hit[0] == key:
+                self.items.move_to_end(path)
+                return hit[1]
+        with open(path, "rb") as f:
+            body = gzip.compress(f.read(), compresslevel=6)
+        with self.lock:
+            old = self.items.pop(path, None)
+            if old is not None:
+                self.total -= len(old[1])
+            while self.items and self.total + len(body) > self.limit:
+                _, (_, dropped) = self.items.popitem(last=False)
+                self.total -= len(dropped)
+            self.items[path] = (key, body)
+            self.total += len(body)
+        return body
+
+class _ResizeCache:
+    """?w= variants on disk, least recently served evicted first once over limit bytes."""
+
+    def __init__(self, root, limit):
+        self.root = root
+        self.dir = os.path.join(root, THUMB_DIR, "resized")
+        self.limit = limit
+        self.total = 0
+        self.files = OrderedDict()  # path -> size, least recently served first
+        self.widths = {}            # src -> (mtime_ns, width), to skip narrow sources
+        self.lock = threading.Lock()
+        found = []
+        for dirpath, _, names in os.walk(self.dir):
+            for name in names:
+                path = os.path.join(dirpath, name)
+                try:
+                    if name.endswith(".tmp"):
+                        os.remove(path)
+                        continue
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                found.append((st.st_atime_ns, path, st.st_size))
+        for _, path, size in sorted(found):
+            self.files[path] = size
+            self.total += size
+        self._evict()
+
+    def _evict(self, keep=None):
+        while self.total > self.limit and len(self.files) > 1:
+            path, size = self.files.popitem(last=False)
+            if path == keep:
+                self.files[path] = size
+                continue
+            self.total -= size
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def get(self, src, st, width):
+        """Path of src at >= width px (None: serve the original), made if missing or stale."""
+        width = next((w for w in RESIZE_WIDTHS if w >= width), None)
+        if width is None:
+            return None
+        known = self.widths.get(src)
+        if known is None or known[0] != st.st_mtime_ns:
+            try:
+                known = (st.st_mtime_ns, image_size(src)[0])
+            except (OSError, ValueError):
+                return None
+            self.widths[src] = known
+        if known[1] <= width:
+            return None
+        rel = os.path.splitext(os.path.relpath(src, self.root))[0] + ".jpg"
+        path = os.path.join(self.dir, str(width), rel)
+        if is_stale(st.st_mtime_ns, path):
+            try:
+                make_resized(src, path, width)
+                size = os.stat(path).st_size
+            except (OSError, ValueError) as e:
+                print("[WARN] Resize failed for %s: %s" % (os.path.basename(src), e))
+                return None
+            with self.lock:
+                self.total += size - self.files.pop(path, 0)
+                self.files[path] = size
+                self._evict(keep=path)
+        else:
+            try:
+                vst = os.stat(path)
+                # Recency survives restarts through the access time
+                os.utime(path, ns=(time.time_ns(), vst.st_mtime_ns))
+            except OSError:
+                return None
+            with self.lock:
+                if path in self.files:
+                    self.files.move_to_end(path)
+                else:               # made by another server process
+                    self.files[path] = vst.st_size
+                    self.total += vst.st_size
+        return path
+
+class _RangeFile:
+    """Read-only view of [start, start+length) of an open file, for copyfile()."""
+
+    def __init__(self, f, start, length):
+        self.f = f
+        self.left = length
+        f.seek(start)
+
+    def read(self, n=-1):
+        if self.left <= 0:
+            return b""
+        if n < 0 or n > self.left:
+            n = self.left
+        data = self.f.read(n)
+        self.left -= len(data)
+        return data
+
+    def close(self):
+        self.f.close()
+
+def parse_range(header, size):
+    """
+    'bytes=a-b' -> (start, end) inclusive, None when absent/unsupported (serve it all),
+    or False when unsatisfiable. Multi-range requests are served whole.
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    first, _, last = header[6:].strip().partition("-")
+    try:
+        if first == "":
+            n = int(last)
+            if n <= 0:
+                return False
+            return max(0, size - n), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        return False
+    return start, min(end, size - 1)
+
+class ViewerRequestHandler(SimpleHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    extensions_map = dict(SimpleHTTPRequestHandler.extensions_map,
+                          **{".js": "text/javascript", ".jsonl": "application/x-ndjson",
+                             ".mp4": "video/mp4", ".webm": "video/webm"})
+
+    def __init__(self, *args, max_age=600, verbose=False, gzip_cache=None, resizer=None, **kwargs):
+        self.max_age = max_age
+        self.verbose = verbose
+        self.gzip_cache = gzip_cache
+        self.resizer = resizer
+        super().__init__(*args, **kwargs)
+
+    def log_message(self, format, *args):
+        if self.verbose:
+            super().log_message(format, *args)
+
+    def _cache_headers(self, path, etag, st):
+        ext = os.path.splitext(path)[1].lower()
+        if ext in REVALIDATE:
+            self.send_header("Cache-Control", "no-cache")
+        else:
+            self.send_header("Cache-Control", "public, max-age=%d" % self.max_age)
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", formatdate(st.st_mtime, usegmt=True))
+
+    def _not_modified(self, etag, st):
+        inm = self.headers.get("If-None-Match")
+        if inm is not None:
+            return etag in [t.strip() for t in inm.split(",")] or inm.strip() == "*"
+        ims = self.headers.get("If-Modified-Since")
+        if ims:
+            try:
+                return int(st.st_mtime) <= parsedate_to_datetime(ims).timestamp()
+            except (TypeError, ValueError, OverflowError):
+                return False
+        return False
+
+    def _query_width(self):
+        try:
+            width = int(parse_qs(urlsplit(self.path).query).get("w", ["0"])[0])
+        except ValueError:
+            return None
+        return width if width > 0 else None
+
+    def send_head(self):
+        path = self.translate_path(self.path)
+        if os.path.isdir(path):
+            return super().send_head()      # redirects, index.html, listings
+        try:
+            f = open(path, "rb")
+        except OSError:
+            self.send_error(HTTPStatus.NOT_FOUND, "File not found")
+            return None
+        try:
+            st = os.fstat(f.fileno())
+            ext = os.path.splitext(path)[1].lower()
+            width = self._query_width() if self.resizer and ext in RESIZABLE else None
+            if width:
+                variant = self.resizer.get(path, st, width)
+                try:
+                    vf = open(variant, "rb") if variant else None
+                except OSError:     # evicted meanwhile; serve the original
+                    vf = None
+                if vf is not None:
+                    f.close()
+                    f, path, st, ext = vf, variant, os.fstat(vf.fileno()), ".jpg"
+            ctype = self.guess_type(path)
+            gz = (ext in COMPRESSIBLE and self.gzip_cache is not None
+                  and "gzip" in self.headers.get("Accept-Encoding", "")
+                  and "Range" not in self.headers)
+            etag = '"%x-%x%s"' % (st.st_mtime_ns, st.st_size, "-gz" if gz else "")
+
+            if self._not_modified(etag, st):
+                f.close()
+                self.send_response(HTTPStatus.NOT_MODIFIED)
+                self._cache_headers(path, etag, st)
+                if ext in COMPRESSIBLE:
+                    self.send_header("Vary", "Accept-Encoding")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return None
+
+            if gz:
+                f.close()
+                body = self.gzip_cache.get(path, st)
+                self.send_response(HTTPStatus.OK)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Encoding", "gzip")
+                self.send_header("Vary", "Accept-Encoding")
+                self.send_header("Content-Length", str(len(body)))
+                self._cache_headers(path, etag, st)
+                self.end_headers()
+                return io.BytesIO(body)
+
+            rng = parse_range(self.headers.get("Range"), st.st_size)
+            if rng is not None and self.headers.get("If-Range") not in (None, etag):
+                rng = None                  # resource changed since the client's copy
+            if rng is False:
+                f.close()
+                self.send_response(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+                self.send_header("Content-Range", "bytes */%d" % st.st_size)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return None
+            if rng is not None:
+                start, end = rng
+                self.send_response(HTTPStatus.PARTIAL_CONTENT)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Range", "bytes %d-%d/%d" % (start, end, st.st_size))
+                self.send_header("Content-Length", str(end - start + 1))
+                self.send_header("Accept-Ranges", "bytes")
+                self._cache_headers(path, etag, st)
+                self.end_headers()
+                return _RangeFile(f, start, end - start + 1)
+
+            self.send_response(HTTPStatus.OK)
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(st.st_size))
+            self.send_header("Accept-Ranges", "bytes")
+            if ext in COMPRESSIBLE:
+                self.send_header("Vary", "Accept-Encoding")
+            self._cache_headers(path, etag, st)
+            self.end_headers()
+            return f
+        except Exception:
+            f.close()
+            raise
+
+def main():
+    args = parse_args()
+    basepath = Path(args.basepath).resolve()
+    root = Path(args.root) if args.root else basepath / "params" / "images"
+    if not root.is_absolute():
+        root = basepath / root
+    root = root.resolve()
+    if not root.is_dir():
+        sys.exit(f"Folder not found: {root}")
+
+    resizer = None
+    if args.resize_cache_mb > 0:
+        if HAVE_PIL:
+            resizer = _ResizeCache(str(root), args.resize_cache_mb * 1024 * 1024)
+        else:
+            print("[WARN] Pillow is not installed (pip install pillow); ?w= resizing is off.")
+
+    handler = partial(ViewerRequestHandler, directory=str(root), max_age=args.max_age,
+                      verbose=args.verbose, gzip_cache=_GzipCache(), resizer=resizer)
+    httpd = ThreadingHTTPServer((args.host, args.port), handler)
+    httpd.daemon_threads = True
+
+    host = "localhost" if args.host in ("0.0.0.0", "::", "") else args.host
+    print("Serving %s on %s:%d (Ctrl+C to stop)" % (root, args.host, args.port))
+    pages = sorted(p.name for p in root.glob("*.html"))
+    for name in pages:
+        print("  http://%s:%d/%s" % (host, args.port, name))
+    if not pages:
+        print("  http://%s:%d/" % (host, args.port))
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+
+if __name__ == "__main__":
+    main()
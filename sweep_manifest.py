@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+# sweep_manifest.py
+#
+# Sweep manifest shared by gen_images.py (writer) and make_*_viewer.py (readers).
+#
+# File: <images folder>/0000_sweep_manifest.jsonl  (JSON Lines, append-only)
+#   Line 1 is the header:
+#     {"manifest": 1, "prefix": "<subfolder>", "suffix": "_00001_.png",
+#      "axes": [{"axis": "s", "node": "3", "input": "cfg", "type": "float", "values": [...]}, ...],
+#      "keys": [{"node": "3", "input": "cfg", "axis": "s", "tokens": [...], "values": [...]}, ...],
+#      "total": <permutations>, "outputs": <distinct outputs>, "naming": "ordinal"}
+#   "keys" are the filename segments in order (the LAST axis setting a node input wins);
+#   tokens/values are the distinct values of that segment. With "naming": "ordinal"
+#   (gen_images.py --naming ordinal) files are named by their zero-padded ordinal
+#   instead ("000417_00001_.png") and text tokens are the raw values; readers then
+#   resolve every file through this header (ordinal_parser). Every later line is a status
+#   record for one output, addressed by its ordinal "o" (mixed radix over "keys"):
+#     {"o": 17, "st": "queued", "pid": "<prompt_id>", "t": 1700000000.0}
+#     ("server": "<url>" is added when the sweep runs on several servers)
+#     {"o": 17, "st": "done", "sec": 4.2, "files": ["<segments>_00001_.png"], "t": ...}
+#   With gen_images.py --prune, a line records which values render like another:
+#     {"merge": [[<representative token index> per token] per key], "t": ...}
+#   read_manifest() puts the last one into header["merge"] (write_manifest() keeps it
+#   there), and viewer_entries() shows a representative output's files in the cells of
+#   the outputs that were skipped for it.
+#   The viewers pass records through folder_records() first: "done" records are only
+#   written with --monitor or by the startup scan, so files on disk count as done too.
+#   Records for the same ordinal are merged in order (later fields win). A torn last
+#   line (e.g. after a crash) is ignored. write_manifest() rewrites the file compacted
+#   (one record per ordinal), e.g. when merge_shards.py combines shard folders.
+#
+# Other files the tools keep next to the outputs (is_sweep_artifact): the viewer pages,
+# their data and scan caches (make_*_viewer.py), and analyze_sweep.py's metrics and caches.
+# gen_images.py's cleanup leaves them alone and merge_shards.py does not copy them.
+# read_metrics() loads analyze_sweep.py's metrics for make_axis_grid_viewer.py.
+#
+# Stdlib only.
+
+import itertools
+import json
+import os
+import re
+import threading
+import time
+
+MANIFEST_NAME = "0000_sweep_manifest.jsonl"
+MANIFEST_VERSION = 1
+METRICS_NAME = "0000_sweep_metrics.json"
+METRICS_VERSION = 1
+ARTIFACT_PREFIXES = (MANIFEST_NAME, "0000_aligned_viewer.", "0000_axis_grid_viewer.", "0000_sweep_metrics.")
+
+def is_sweep_artifact(name):
+    """True for the manifest, viewer and metrics files (and their temp files), not outputs."""
+    return name.startswith(ARTIFACT_PREFIXES)
+
+def read_metrics(path):
+    """(metric names, {filename: [score or None, ...]}) from analyze_sweep.py's file, or None."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            doc = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(doc, dict) or doc.get("version") != METRICS_VERSION:
+        return None
+    return doc.get("metrics") or [], doc.get("files") or {}
+
+def read_manifest(path):
+    """
+    Return (header, records) with records = {ordinal: merged record}, or None when the
+    file is missing or has no valid header.
+    """
+    try:
+        f = open(path, "r", encoding="utf-8")
+    except FileNotFoundError:
+        return None
+    header = None
+    records = {}
+    with f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                doc = json.loads(line)
+            except ValueError:
+                continue
+            if header is None:
+                if not isinstance(doc, dict) or doc.get("manifest") != MANIFEST_VERSION:
+                    return None
+                header = doc
+                continue
+            o = doc.get("o")
+            if not isinstance(o, int):
+                if isinstance(doc, dict) and isinstance(doc.get("merge"), list):
+                    header["merge"] = doc["merge"]
+                continue
+            rec = records.get(o)
+            if rec is None:
+                records[o] = doc
+            else:
+                rec.update(doc)
+    if header is None:
+        return None
+    return header, records
+
+def same_sweep(a, b):
+    """True when two headers describe the same output space (ordinals are compatible)."""
+    fields = ("prefix", "suffix", "keys", "naming")
+    return all(a.get(k) == b.get(k) for k in fields)
+
+class ManifestWriter:
+    """Appends status records; safe to call from the submit and monitor threads."""
+
+    def __init__(self, path, header, reset=False):
+        self.path = path
+        self._lock = threading.Lock()
+        self._f = open(path, "w" if reset else "a", encoding="utf-8")
+        if reset:
+            self._write(header)
+
+    def _write(self, doc):
+        self._f.write(json.dumps(doc, separators=(",", ":")) + "\n")
+        self._f.flush()
+
+    def record(self, ordinal, status, **fields):
+        doc = {"o": ordinal, "st": status, "t": round(time.time(), 3)}
+        doc.update((k, v) for k, v in fields.items() if v is not None)
+        with self._lock:
+            self._write(doc)
+
+    def merge(self, table):
+        """Record --prune's value equivalences (see the file header)."""
+        with self._lock:
+            self._write({"merge": table, "t": round(time.time(), 3)})
+
+    def close(self):
+        with self._lock:
+            self._f.close()
+
+def write_manifest(path, header, records):
+    """Replace the manifest at path with header plus one record per ordinal."""
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        for doc in [header] + [records[o] for o in sorted(records)]:
+            f.write(json.dumps(doc, separators=(",", ":")) + "\n")
+    os.replace(tmp, path)
+
+def open_manifest(path, header):
+    """
+    Open the manifest for appending if it belongs to the same sweep, otherwise start a
+    new one. Returns (writer, records) where records are the ones carried over.
+    """
+    existing = read_manifest(path)
+    if existing is not None and same_sweep(existing[0], header):
+        return ManifestWriter(path, header), existing[1]
+    return ManifestWriter(path, header, reset=True), {}
+
+def decode_ordinal(header, ordinal):
+    """Output ordinal -> [token index per key] (inverse of SweepPlan.output_ordinal)."""
+    digits = []
+    for key in reversed(header["keys"]):
+        n = len(key["tokens"])
+        digits.append(ordinal % n)
+        ordinal //= n
+    digits.reverse()
+    return digits
+
+def _ordinal_resolver(header, parse_segment):
+    """
+    ordinal -> parsed, matching the viewer's own parse_filename() result. parse_segment is
+    the viewer's parse_dimension_segment; segments it cannot parse (arbitrary text values)
+    fall back to the raw token as key and the value as display text.
+    """
+    keys = header["keys"]
+    cache = {}
+
+    def resolve(o):
+        parsed = []
+        for k, ti in enumerate(decode_ordinal(header, o)):
+            p = cache.get((k, ti))
+            if p is None:
+                key = keys[k]
+                token = key["tokens"][ti]
+                p = parse_segment("%s-%s-%s" % (key["node"], key["input"], token))
+                if p is None:
+                    p = (int(key["node"]), key["input"], None, token, str(key["values"][ti]))
+                cache[(k, ti)] = p
+            parsed.append(p)
+        return parsed
+    return resolve
+
+def is_ordinal(header):
+    return header.get("naming") == "ordinal"
+
+def ordinal_parser(header, parse_segment):
+    """
+    parse_filename() replacement for an ordinal-named sweep: '000417_00001_.png' (or the
+    .mp4 next to it) -> parsed values of output 417, None for names of other outputs.
+    """
+    resolve = _ordinal_resolver(header, parse_segment)
+    match = output_matcher(header)
+
+    def parse(name):
+        o = match(name)
+        return None if o is None else resolve(o)
+    return parse
+
+_counter_re = re.compile(r"_+\d{5,}_?$")
+
+def output_stem(name):
+    """
+    '<stem>_00001_.png' -> '<stem>': the name without extension and ComfyUI's counter
+    (with or without its trailing '_'). None when the name has no counter.
+    """
+    stem = os.path.splitext(name)[0]
+    bare = _counter_re.sub("", stem)
+    return bare if bare and bare != stem else None
+
+def output_matcher(header):
+    """
+    File name -> output ordinal of the sweep described by header, else None. Any extension,
+    with ComfyUI's counter ("<segments>_00001_.png", the .mp4 next to it) or without.
+    The one matcher behind SweepPlan.match_name (gen_images.py), ordinal_parser and
+    merge_shards.py, so they agree on which files belong to a sweep.
+    """
+    outputs = header.get("outputs") or 0
+    if is_ordinal(header):
+        width = len(str(max(outputs - 1, 0)))
+
+        def match_stem(stem):
+            if len(stem) != width or not stem.isdigit():
+                return None
+            o = int(stem)
+            return o if o < outputs else None
+    else:
+        keys = header["keys"]
+        heads = ["%s-%s-" % (key["node"], key["input"]) for key in keys]
+        tokens = [{str(t): i for i, t in enumerate(key["tokens"])} for key in keys]
+
+        def walk(stem, pos, k, acc):
+            # Tokens may themselves contain '--', so candidates are tried left to right
+            if k == len(keys):
+                return acc if pos == len(stem) else None
+            if not stem.startswith(heads[k], pos):
+                return None
+            start = pos + len(heads[k])
+            acc *= len(tokens[k])
+            if k == len(keys) - 1:
+                ti = tokens[k].get(stem[start:])
+                return None if ti is None else acc + ti
+            j = stem.find("--", start)
+            while j != -1:
+                ti = tokens[k].get(stem[start:j])
+                if ti is not None:
+                    found = walk(stem, j + 2, k + 1, acc + ti)
+                    if found is not None:
+                        return found
+                j = stem.find("--", j + 1)
+            return None
+
+        def match_stem(stem):
+            return walk(stem, 0, 0, 0) if keys else None
+
+    def match(name):
+        bare = output_stem(name)
+        found = match_stem(bare) if bare is not None else None
+        return found if found is not None else match_stem(os.path.splitext(name)[0])
+    return match
+
+def folder_records(img_dir, header, records):
+    """
+    records plus the output files found in img_dir (output_matcher), each counted as done.
+    A resumed sweep without --monitor only records outputs as queued, so the manifest can
+    list fewer finished outputs than the folder holds. records itself is left unchanged.
+    """
+    match = output_matcher(header)
+    merged = dict(records)
+    copied = set()
+    with os.scandir(img_dir) as it:
+        for entry in it:
+            o = match(entry.name)
+            if o is None or not entry.is_file():
+                continue
+            rec = merged.get(o)
+            if o not in copied:
+                files = list(rec.get("files") or []) if rec and rec.get("st") == "done" else []
+                rec = merged[o] = dict(rec or {"o": o}, st="done", files=files)
+                copied.add(o)
+            if entry.name not in (os.path.basename(n) for n in rec["files"]):
+                rec["files"].append(entry.name)
+    return merged
+
+def _aliases(header, o):
+    """
+    Ordinals of the outputs --prune skipped in favour of output o (header["merge"]):
+    every combination of values merged into o's, except o itself and only when all of
+    o's values are representatives.
+    """
+    merge = header.get("merge")
+    if not merge:
+        return []
+    digits = decode_ordinal(header, o)
+    classes = []
+    for k, d in enumerate(digits):
+        reps = merge[k] if k < len(merge) else []
+        if d < len(reps) and reps[d] != d:
+            return []
+        classes.append([c for c, r in enumerate(reps) if r == d] or [d])
+    radix = [len(key["tokens"]) for key in header["keys"]]
+    found = []
+    for combo in itertools.product(*classes):
+        a = 0
+        for c, n in zip(combo, radix):
+            a = a * n + c
+        if a != o:
+            found.append(a)
+    return found
+
+def viewer_entries(header, records, parse_segment):
+    """
+    (png_entries, mp4_entries) as lists of (filename, parsed) for every finished output
+    (see _ordinal_resolver for parsed and parse_segment), plus the cells of outputs that
+    --prune skipped, with the files of the output they render like.
+    """
+    resolve = _ordinal_resolver(header, parse_segment)
+    pngs, mp4s = [], []
+    for o in sorted(records):
+        rec = records[o]
+        if rec.get("st") != "done" or not rec.get("files"):
+            continue
+        cells = [o] + [a for a in _aliases(header, o)
+                       if a not in records or records[a].get("st") != "done" or not records[a].get("files")]
+        for cell in cells:
+            parsed = resolve(cell)
+            for name in rec["files"]:
+                name = os.path.basename(name)
+                ext = os.path.splitext(name)[1].lower()
+                if ext == ".png":
+                    pngs.append((name, parsed))
+                elif ext == ".mp4":
+                    mp4s.append((name, parsed))
+    pngs.sort(key=lambda e: e[0])      # a pruned output's files appear once per cell
+    mp4s.sort(key=lambda e: e[0])
+    return pngs, mp4s
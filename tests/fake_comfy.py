@@ -0,0 +1,112 @@
+# tests/fake_comfy.py
+#
+# In-process stand-in for the parts of ComfyUI's HTTP API that gen_images.py uses:
+# POST /prompt, GET/POST /queue, GET /history[/<id>] and GET /view. Tests script its
+# misbehaviour through FakeComfy.actions (one per POST /prompt) and FakeComfy.short_views.
+#
+# Stdlib only.
+
+import json
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, doc=None, body=None):
+        body = json.dumps(doc).encode("utf-8") if body is None else body
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        fake = self.server
+        u = urlsplit(self.path)
+        with fake.lock:
+            if u.path == "/queue":
+                return self._reply(200, {"queue_running": list(fake.running), "queue_pending": list(fake.pending)})
+            if u.path == "/history":
+                return self._reply(200, fake.history)
+            if u.path.startswith("/history/"):
+                pid = u.path[len("/history/"):]
+                return self._reply(200, {pid: fake.history[pid]} if pid in fake.history else {})
+            if u.path == "/view":
+                data = fake.files.get(parse_qs(u.query).get("filename", [""])[0])
+                if data is None:
+                    return self._reply(404, {})
+                if fake.short_views > 0:
+                    # Announce the whole file, send half and hang up
+                    fake.short_views -= 1
+                    self.send_response(200)
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data[:len(data) // 2])
+                    self.close_connection = True
+                    return
+                return self._reply(200, body=data)
+        self._reply(404, {})
+
+    def do_POST(self):
+        fake = self.server
+        doc = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        with fake.lock:
+            if self.path == "/queue":
+                fake.pending = [item for item in fake.pending if item[1] not in doc.get("delete", [])]
+                return self._reply(200, {})
+            fake.posts += 1
+            action = fake.actions.pop(0) if fake.actions else "ok"
+            if action in ("429", "refuse500"):
+                return self._reply(429 if action == "429" else 500, {"error": action})
+            pid = str(uuid.uuid4())
+            item = [len(fake.pending), pid, doc["prompt"], {"client_id": doc.get("client_id")}, []]
+            if action == "ran500":
+                fake.history[pid] = {"prompt": item, "outputs": {}}
+            else:
+                fake.pending.append(item)
+        if action in ("lost500", "ran500"):
+            return self._reply(500, {"error": "queued, then failed to answer"})
+        if action == "drop":
+            self.close_connection = True        # queued, but the response never arrives
+            return
+        self._reply(200, {"prompt_id": pid, "number": 0})
+
+class FakeComfy(ThreadingHTTPServer):
+    """
+    A fake server on a free localhost port, running until close(). actions, one per
+    POST /prompt: "ok", "lost500" / "drop" (queued, then a 500 or no response), "ran500"
+    (already finished, then a 500), "429" / "refuse500" (not queued). short_views: how
+    many /view replies are cut in half.
+    """
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.url = "http://127.0.0.1:%d" % self.server_port
+        self.lock = threading.Lock()
+        self.actions = []
+        self.posts = 0
+        self.running = []
+        self.pending = []           # [number, prompt_id, prompt, extra_data, outputs]
+        self.history = {}           # prompt_id -> {"prompt": item, "outputs": {...}}
+        self.files = {}             # filename -> bytes for /view
+        self.short_views = 0
+        self._thread = threading.Thread(target=self.serve_forever, args=(0.05,), daemon=True)
+        self._thread.start()
+
+    def finish(self, pid, outputs=None):
+        """Move a pending prompt to /history, with outputs {node: {"images": [...]}}."""
+        with self.lock:
+            item = next(item for item in self.pending if item[1] == pid)
+            self.pending.remove(item)
+            self.history[pid] = {"prompt": item, "outputs": outputs or {}}
+
+    def close(self):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,35 @@
+# tests/sweep_helpers.py
+#
+# Small sweeps and helpers shared by the tests.
+#
+# Stdlib only.
+
+import contextlib
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gen_images import AXES, SweepPlan  # noqa: E402
+
+def make_plan(naming="segments", **axes):
+    """SweepPlan over node 3 inputs: axes maps an axis to (input, values)."""
+    specs = {a: ("3", inp) for a, (inp, _) in axes.items()}
+    values = {a: [None] for a in AXES}
+    values.update({a: vals for a, (_, vals) in axes.items()})
+    return SweepPlan(specs, values, "Demo", naming=naming)
+
+def parse_segment(seg):
+    """Minimal stand-in for the viewers' parse_dimension_segment()."""
+    node, prop, token = seg.split("-", 2)
+    return int(node), prop, None, token, token
+
+def touch(folder, *names):
+    for name in names:
+        open(os.path.join(folder, name), "w").close()
+
+@contextlib.contextmanager
+def quiet():
+    """Silence the tools' progress and retry prints."""
+    with open(os.devnull, "w") as null, contextlib.redirect_stdout(null), contextlib.redirect_stderr(null):
+        yield
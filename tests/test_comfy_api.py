@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# tests/test_comfy_api.py
+#
+# gen_images.py against a fake ComfyUI (fake_comfy.py): prompt submission and retries,
+# the drip-feed window and output downloads.
+#
+# Usage (from the repository root):
+#   python -m pytest tests
+#   python -m unittest discover tests
+#
+# Stdlib only.
+
+import http.client
+import json
+import os
+import tempfile
+import threading
+import unittest
+
+from fake_comfy import FakeComfy
+from sweep_helpers import quiet
+
+from bench_sweep import tiny_png
+from gen_images import OutputFetcher, PromptSubmitter, QueueThrottle, ServerUnavailable, build_payload
+
+PROMPT = {"3": {"class_type": "KSampler", "inputs": {"seed": 1, "cfg": 7.5}}}
+
+class ComfyTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.fake = FakeComfy()
+        self.submitter = PromptSubmitter(self.fake.url, "me", retries=3, backoff=0.01, timeout=5.0)
+
+    def tearDown(self):
+        self.submitter.close()
+        self.submitter._drop_connection()      # this thread's keep-alive connection
+        self.fake.close()
+
+    def body(self, seed=1):
+        prompt = json.loads(json.dumps(PROMPT))
+        prompt["3"]["inputs"]["seed"] = seed
+        return build_payload(json.dumps(prompt), "me")
+
+class RetryDedupeTest(ComfyTestCase):
+
+    def post(self, *actions):
+        self.fake.actions = list(actions)
+        with quiet():
+            return self.submitter.post(self.body())
+
+    def test_lost_response_is_not_queued_twice(self):
+        for action in ("lost500", "drop"):
+            self.fake.pending = []
+            resp = self.post(action)
+            self.assertEqual(len(self.fake.pending), 1, action)
+            self.assertEqual(resp["prompt_id"], self.fake.pending[0][1], action)
+
+    def test_found_in_history_after_it_ran(self):
+        resp = self.post("ran500")
+        self.assertEqual(list(self.fake.history), [resp["prompt_id"]])
+        self.assertEqual((self.fake.posts, self.fake.pending), (1, []))
+
+    def test_unsent_prompts_are_sent_again(self):
+        resp = self.post("429", "refuse500")
+        self.assertEqual(self.fake.posts, 3)
+        self.assertEqual([item[1] for item in self.fake.pending], [resp["prompt_id"]])
+
+    def test_other_clients_prompt_is_not_taken(self):
+        self.fake.pending.append([0, "theirs", PROMPT, {"client_id": "someone else"}, []])
+        resp = self.post("refuse500")
+        self.assertNotEqual(resp["prompt_id"], "theirs")
+        self.assertEqual(len(self.fake.pending), 2)
+
+class QueueThrottleTest(ComfyTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.throttle = QueueThrottle(self.submitter, 2, poll_interval=0.02)
+
+    def queue(self, n):
+        pids = []
+        for seed in range(n):
+            self.throttle.acquire()
+            resp = self.submitter.post(self.body(seed))
+            self.throttle.track(resp)
+            pids.append(resp["prompt_id"])
+        return pids
+
+    def blocked_acquire(self):
+        def run():
+            self.throttle.acquire()
+            self.submitter._drop_connection()
+        t = threading.Thread(target=run, daemon=True)
+        t.start()
+        t.join(0.2)
+        self.assertTrue(t.is_alive(), "acquire() did not wait for a free slot")
+        return t
+
+    def test_waits_until_a_prompt_leaves_the_queue(self):
+        pids = self.queue(2)
+        t = self.blocked_acquire()
+        self.fake.finish(pids[0])
+        t.join(2.0)
+        self.assertFalse(t.is_alive())
+        self.assertEqual(self.throttle.pending_ids(), {pids[1]})
+
+    def test_finished_hint_frees_a_slot_without_a_poll(self):
+        pids = self.queue(2)
+        t = self.blocked_acquire()
+        self.throttle.finished(pids[1])
+        t.join(2.0)
+        self.assertFalse(t.is_alive())
+        self.assertEqual(len(self.fake.pending), 2)
+
+    def test_cancel_removes_only_our_pending_prompts(self):
+        pids = self.queue(2)
+        self.fake.pending.append([9, "theirs", PROMPT, {"client_id": "someone else"}, []])
+        self.fake.running.append(self.fake.pending.pop(0))
+        self.assertEqual(self.throttle.cancel_pending(), 1)
+        self.assertEqual([item[1] for item in self.fake.pending], ["theirs"])
+        self.assertEqual([item[1] for item in self.fake.running], [pids[0]])
+
+    def test_gives_up_after_max_failures(self):
+        throttle = QueueThrottle(self.submitter, 1, poll_interval=0.01, max_failures=3)
+        self.fake.close()
+        with quiet():
+            self.assertFalse(throttle.refresh())
+            self.assertFalse(throttle.refresh())
+            self.assertRaises(ServerUnavailable, throttle.refresh)
+
+class DownloadTest(ComfyTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.png = tiny_png(64, 64)
+        self.fake.files["ComfyUI_00001_.png"] = self.png
+        pid = self.submitter.post(self.body())["prompt_id"]
+        self.fake.finish(pid, {"9": {"images": [{"filename": "ComfyUI_00001_.png", "subfolder": "",
+                                                 "type": "output"}]}})
+        self.pid = pid
+
+    def tearDown(self):
+        super().tearDown()
+        self.tmp.cleanup()
+
+    def test_short_body_raises(self):
+        self.fake.short_views = 1
+        chunks = []
+        with self.assertRaises(http.client.HTTPException):
+            self.submitter.request("GET", "/view?filename=ComfyUI_00001_.png", sink=chunks.append)
+        self.assertEqual(self.submitter.request("GET", "/view?filename=ComfyUI_00001_.png")[1], self.png)
+
+    def fetch(self, short_views, retries):
+        self.fake.short_views = short_views
+        done = []
+
+        def on_done(*result):
+            done.append(result)
+            self.submitter._drop_connection()      # the fetch thread's keep-alive connection
+        fetcher = OutputFetcher(self.tmp.name, workers=1, retries=retries, backoff=0.01)
+        with quiet():
+            fetcher.fetch(self.submitter, self.pid, "3-seed-1", on_done)
+            fetcher.close()
+        return done[0]
+
+    def test_short_transfer_is_retried(self):
+        names, digests, error = self.fetch(short_views=1, retries=2)
+        self.assertIsNone(error)
+        self.assertEqual(names, ["3-seed-1_00001_.png"])
+        with open(os.path.join(self.tmp.name, names[0]), "rb") as f:
+            self.assertEqual(f.read(), self.png)
+
+    def test_gives_up_without_leaving_a_file(self):
+        names, _, error = self.fetch(short_views=3, retries=1)
+        self.assertIsNone(names)
+        self.assertIn("Content-Length", error)
+        self.assertEqual(os.listdir(self.tmp.name), [])
+
+if __name__ == "__main__":
+    unittest.main()
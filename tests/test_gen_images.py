@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+# tests/test_gen_images.py
+#
+# gen_images.py: the sweep plan's file names, resume counting, folder cleanup and the
+# hand-out of permutations to several servers.
+#
+# Usage (from the repository root):
+#   python -m pytest tests
+#   python -m unittest discover tests
+#
+# Stdlib only.
+
+import itertools
+import os
+import random
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+from sweep_helpers import make_plan, quiet, touch
+
+from gen_images import (ServerUnavailable, ShardScheduler, ShardServer, cleanup_folder, foreign_ordinal_outputs,
+                        snake_product)
+from sweep_manifest import MANIFEST_NAME, ManifestWriter, read_manifest
+
+class MatchNameTest(unittest.TestCase):
+
+    def setUp(self):
+        self.plan = make_plan(s=("seed", [1, 2, 3]), t=("cfg", [7.0, 7.5]))
+
+    def test_segment_names(self):
+        plan = self.plan
+        self.assertEqual(plan.match_name("3-seed-2--3-cfg-7_5_00001_.png"), 3)
+        self.assertEqual(plan.match_name("3-seed-3--3-cfg-7_0_00002_.png"), 4)
+        self.assertIsNone(plan.match_name("3-seed-4--3-cfg-7_5_00001_.png"))
+        self.assertIsNone(plan.match_name("3-seed-2--3-cfg-7_5_00001_.txt"))
+        self.assertIsNone(plan.match_name("3-seed-2_00001_.png"))
+
+    def test_every_stem_maps_back_to_its_ordinal(self):
+        for naming in ("segments", "ordinal"):
+            plan = make_plan(naming, s=("seed", [1, 2, 3]), t=("cfg", [7.0, 7.5]))
+            for idxs, stem, _ in plan:
+                o = plan.output_ordinal(idxs)
+                self.assertEqual(plan.match_name(stem + "_00001_.png"), o)
+                self.assertEqual(plan.match_name(stem + "_00001.png"), o)
+                self.assertEqual(plan.match_name(stem + "_00001_.mp4"), o)
+
+    def test_ordinal_names(self):
+        plan = make_plan("ordinal", s=("seed", list(range(1000))), t=("cfg", [7.0, 7.5]))
+        self.assertEqual(plan.ordinal_width, 4)
+        self.assertEqual(plan.match_name("0000_00001_.png"), 0)
+        self.assertEqual(plan.match_name("1999_00001_.png"), 1999)
+        self.assertIsNone(plan.match_name("2000_00001_.png"))
+        self.assertIsNone(plan.match_name("00001_00001_.png"))     # wrong width
+        self.assertIsNone(plan.match_name("0000_aligned_viewer.png"))
+
+    def test_tokens_containing_separator(self):
+        plan = make_plan(s=("text", ["a--b", "a"]), t=("mode", ["b--c", "c"]))
+        for idxs, stem, _ in plan:
+            self.assertEqual(plan.match_name(stem + plan.SUFFIX), plan.output_ordinal(idxs))
+
+    def test_overridden_axis_is_free(self):
+        plan = make_plan(s=("seed", [1, 2]), t=("cfg", [7.0]), u=("seed", [5, 6, 7]))
+        self.assertEqual(plan.expected_count, 3)
+        self.assertEqual(plan.output_ordinal((0, 0, 2, 0, 0, 0, 0)), plan.output_ordinal((1, 0, 2, 0, 0, 0, 0)))
+
+class PendingCountTest(unittest.TestCase):
+
+    @staticmethod
+    def brute_pending(plan):
+        return sum(1 for idxs, _, _ in plan if not plan.is_done(idxs))
+
+    def test_matches_enumeration_with_repeated_and_pruned_values(self):
+        plan = make_plan(s=("seed", [1, 2, 2, 3]), t=("cfg", [7.0, 7.0, 8.5]), u=("steps", [10, 20]))
+        rng = random.Random(1)
+        for pruned in (False, True):
+            if pruned:
+                plan.prune(0, {2: 0})
+                plan.prune(2, {1: 0})
+            for _ in range(10):
+                plan.done[:] = bytes(len(plan.done))
+                for o in rng.sample(range(plan.expected_count), rng.randint(0, plan.expected_count)):
+                    plan.mark_done(o)
+                self.assertEqual(plan.pending_count(), self.brute_pending(plan))
+
+class ShardTest(unittest.TestCase):
+
+    def test_shards_cover_the_sweep_once(self):
+        pending = []
+        for i in (1, 2, 3):
+            plan = make_plan(s=("seed", list(range(7))), t=("cfg", [7.0, 7.5]))
+            plan.set_shard(i, 3)
+            pending.append(plan.pending_count())
+        self.assertEqual(sum(pending), 14)
+
+class SnakeProductTest(unittest.TestCase):
+
+    def test_visits_every_combination_once_changing_one_digit(self):
+        for sizes in ([3], [2, 3], [3, 1, 4], [2, 2, 2]):
+            seq = list(snake_product(sizes))
+            self.assertEqual(sorted(seq), list(itertools.product(*[range(n) for n in sizes])))
+            for a, b in zip(seq, seq[1:]):
+                self.assertEqual(sum(abs(x - y) for x, y in zip(a, b)), 1)
+
+    def test_empty_axis(self):
+        self.assertEqual(list(snake_product([3, 0])), [])
+
+class ShardSchedulerTest(unittest.TestCase):
+    """Four checkpoints (the affinity axis) by three cfg values, on two servers."""
+
+    def setUp(self):
+        self.plan = make_plan(s=("ckpt_name", ["a", "b", "c", "d"]), t=("cfg", [6.0, 7.0, 8.0]))
+        self.a, self.b = (ShardServer(url, SimpleNamespace(failed=None), 2, 0.01) for url in ("A", "B"))
+        self.sched = ShardScheduler(self.plan, ["s"], [self.a, self.b])
+        self.all = {idxs for idxs, _, _ in self.plan}
+
+    def take(self, srv, n=None):
+        got = []
+        with quiet():
+            while n is None or len(got) < n:
+                idxs = self.sched.take(srv)
+                if idxs is None:
+                    break
+                got.append(idxs)
+        return got
+
+    def queue(self, srv, taken):
+        """Pretend taken went to srv and is still queued there."""
+        for k, idxs in enumerate(taken):
+            pid = "%s%d" % (srv.url, k)
+            srv.jobs[pid] = idxs
+            srv.throttle.outstanding.add(pid)
+
+    def test_servers_start_on_their_own_block_of_models(self):
+        self.assertEqual(self.take(self.a, 1)[0][0], 0)
+        self.assertEqual(self.take(self.b, 1)[0][0], 2)
+
+    def test_idle_server_steals_unstarted_blocks(self):
+        got = self.take(self.a)
+        self.assertEqual(sorted(got), sorted(self.all))
+        self.assertEqual(self.take(self.b), [])
+
+    def test_idle_server_steals_half_of_a_running_group(self):
+        first = self.take(self.b, 1)
+        got_a = self.take(self.a)
+        got_b = first + self.take(self.b)
+        self.assertEqual(sorted(got_a + got_b), sorted(self.all))
+        self.assertEqual(len(got_b), 2)         # B keeps (2, 1); A took the back of group 2
+        self.assertEqual({idxs[0] for idxs in got_b}, {2})
+
+    def test_failed_server_hands_back_unfinished_work(self):
+        taken = self.take(self.a, 3)
+        self.queue(self.a, taken[1:])           # taken[0] already finished on A
+        self.assertEqual(self.sched.server_down(self.a), 2)
+        got = self.take(self.b)
+        self.assertEqual(got[:2], taken[1:])    # handed-back prompts go first
+        self.assertEqual(sorted(got), sorted(self.all - {taken[0]}))
+        self.assertIsNone(self.sched.failed)
+
+    def test_all_servers_down_aborts(self):
+        self.sched.server_down(self.a)
+        self.sched.server_down(self.b)
+        self.assertIsInstance(self.sched.failed, ServerUnavailable)
+        self.assertIs(self.a.submitter.failed, self.sched.failed)
+        self.assertIsNone(self.sched.take(self.a))
+
+class CleanupFolderTest(unittest.TestCase):
+
+    KEEP = ["3-seed-1--3-cfg-7_0_00001_.png", "3-seed-2--3-cfg-7_5_00001_.mp4", MANIFEST_NAME,
+            MANIFEST_NAME + ".tmp", "0000_aligned_viewer.html", "0000_aligned_viewer.data.js",
+            "0000_axis_grid_viewer.scan.json", "0000_sweep_metrics.json", "0000_sweep_metrics.cache.npz"]
+    STRAY = ["3-seed-9--3-cfg-7_0_00001_.png", "notes.txt", "bench_aligned.html"]
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = self.tmp.name
+        touch(self.dir, *(self.KEEP + self.STRAY))
+        os.mkdir(os.path.join(self.dir, "0000_thumbs"))
+        self.plan = make_plan(s=("seed", [1, 2]), t=("cfg", [7.0, 7.5]))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_keeps_outputs_and_artifacts(self):
+        removed = cleanup_folder(self.dir, self.plan)
+        self.assertEqual(removed, len(self.STRAY))
+        self.assertEqual(sorted(os.listdir(self.dir)), sorted(self.KEEP + ["0000_thumbs"]))
+
+    def test_dry_run_deletes_nothing(self):
+        before = sorted(os.listdir(self.dir))
+        with quiet():
+            removed = cleanup_folder(self.dir, self.plan, dry_run=True)
+        self.assertEqual(removed, len(self.STRAY))
+        self.assertEqual(sorted(os.listdir(self.dir)), before)
+
+    def test_missing_folder(self):
+        self.assertEqual(cleanup_folder(os.path.join(self.dir, "nope"), self.plan), 0)
+
+class ForeignOrdinalOutputsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = self.tmp.name
+        old = make_plan("ordinal", s=("seed", [1, 2, 3]), t=("cfg", [7.0, 7.5, 8.0, 8.5]))
+        touch(self.dir, *(stem + old.SUFFIX for _, stem, _ in old), "notes.txt")
+        self.path = os.path.join(self.dir, MANIFEST_NAME)
+        ManifestWriter(self.path, old.manifest_header({}), reset=True).close()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def foreign(self, plan):
+        return foreign_ordinal_outputs(self.dir, read_manifest(self.path), plan.manifest_header({}))
+
+    def test_same_sweep_is_not_foreign(self):
+        self.assertEqual(self.foreign(make_plan("ordinal", s=("seed", [1, 2, 3]), t=("cfg", [7.0, 7.5, 8.0, 8.5]))), [])
+
+    def test_added_and_removed_values(self):
+        grown = make_plan("ordinal", s=("seed", [1, 2, 3, 4]), t=("cfg", [7.0, 7.5, 8.0, 8.5]))
+        shrunk = make_plan("ordinal", s=("seed", [1]), t=("cfg", [7.0, 7.5, 8.0, 8.5]))
+        self.assertEqual(len(self.foreign(grown)), 12)
+        self.assertEqual(len(self.foreign(shrunk)), 12)
+        self.assertEqual(len(self.foreign(make_plan(s=("seed", [1]), t=("cfg", [7.0])))), 12)
+
+    def test_without_manifest(self):
+        os.remove(self.path)
+        plan = make_plan("ordinal", s=("seed", [1, 2, 3]), t=("cfg", [7.0, 7.5, 8.0, 8.5]))
+        self.assertEqual(len(foreign_ordinal_outputs(self.dir, None, plan.manifest_header({}))), 12)
+        plan = make_plan(s=("seed", [1, 2, 3]), t=("cfg", [7.0, 7.5, 8.0, 8.5]))
+        self.assertEqual(foreign_ordinal_outputs(self.dir, None, plan.manifest_header({})), [])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+# tests/test_merge_shards.py
+#
+# merge_shards.py: combining the manifest records of several shard folders.
+#
+# Usage (from the repository root):
+#   python -m pytest tests
+#   python -m unittest discover tests
+#
+# Stdlib only.
+
+import unittest
+
+import sweep_helpers  # noqa: F401  (puts the repository root on sys.path)
+
+from merge_shards import merge_record
+
+class MergeRecordTest(unittest.TestCase):
+
+    def test_done_beats_queued_and_failed(self):
+        records = {}
+        merge_record(records, 4, {"o": 4, "st": "done", "t": 1.0, "files": ["a.png"]})
+        merge_record(records, 4, {"o": 4, "st": "queued", "t": 5.0})
+        merge_record(records, 4, {"o": 4, "st": "failed", "t": 6.0})
+        self.assertEqual(records[4]["st"], "done")
+        self.assertEqual(records[4]["files"], ["a.png"])
+
+    def test_later_record_wins_and_done_files_are_pooled(self):
+        records = {}
+        merge_record(records, 1, {"o": 1, "st": "queued", "t": 1.0})
+        merge_record(records, 1, {"o": 1, "st": "failed", "t": 2.0})
+        self.assertEqual(records[1]["st"], "failed")
+        merge_record(records, 2, {"o": 2, "st": "done", "t": 1.0, "files": ["x.png"]})
+        merge_record(records, 2, {"o": 2, "st": "done", "t": 2.0, "files": ["x.mp4"]})
+        self.assertEqual(records[2]["files"], ["x.mp4", "x.png"])
+
+    def test_does_not_alias_the_input(self):
+        rec = {"o": 3, "st": "done", "t": 1.0, "files": ["b.png"]}
+        records = {}
+        merge_record(records, 3, rec)
+        merge_record(records, 3, {"o": 3, "st": "done", "t": 2.0, "files": ["c.png"]})
+        self.assertEqual(rec["files"], ["b.png"])
+
+if __name__ == "__main__":
+    unittest.main()
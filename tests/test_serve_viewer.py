@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+# tests/test_serve_viewer.py
+#
+# serve_viewer.py: validators, byte ranges, gzip and ?w= resizing over a live localhost server.
+#
+# Usage (from the repository root):
+#   python -m pytest tests
+#   python -m unittest discover tests
+#
+# Stdlib only; the resizing tests are skipped without Pillow.
+
+import gzip
+import http.client
+import io
+import os
+import tempfile
+import threading
+import unittest
+from functools import partial
+from http.server import ThreadingHTTPServer
+
+import sweep_helpers  # noqa: F401  (puts the repository root on sys.path)
+
+from serve_viewer import ViewerRequestHandler, _GzipCache, _ResizeCache
+from thumbs import HAVE_PIL, THUMB_DIR, Image
+
+DATA = b"window.SWEEP = " + b"[1,2,3]," * 500 + b"0;\n"
+IMAGE = bytes(range(256)) * 4
+
+class ServeTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = self.tmp.name
+        for name, body in (("0000_aligned_viewer.data.js", DATA), ("a.png", IMAGE)):
+            with open(os.path.join(self.dir, name), "wb") as f:
+                f.write(body)
+        handler = partial(ViewerRequestHandler, directory=self.dir, max_age=60, gzip_cache=_GzipCache(),
+                          resizer=self.resizer())
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.httpd.daemon_threads = True
+        threading.Thread(target=self.httpd.serve_forever, args=(0.05,), daemon=True).start()
+        self.conn = http.client.HTTPConnection("127.0.0.1", self.httpd.server_port, timeout=5)
+
+    def resizer(self):
+        return None
+
+    def tearDown(self):
+        self.conn.close()
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.tmp.cleanup()
+
+    def get(self, path, **headers):
+        self.conn.request("GET", path, headers=headers)
+        resp = self.conn.getresponse()
+        return resp, resp.read()
+
+class CachingTest(ServeTestCase):
+
+    def test_etag_and_304(self):
+        resp, body = self.get("/a.png")
+        self.assertEqual((resp.status, body), (200, IMAGE))
+        self.assertEqual(resp.getheader("Cache-Control"), "public, max-age=60")
+        etag = resp.getheader("ETag")
+        resp, body = self.get("/a.png", **{"If-None-Match": etag})
+        self.assertEqual((resp.status, body), (304, b""))
+        resp, _ = self.get("/a.png", **{"If-None-Match": '"stale"'})
+        self.assertEqual(resp.status, 200)
+
+    def test_data_files_revalidate(self):
+        resp, _ = self.get("/0000_aligned_viewer.data.js")
+        self.assertEqual(resp.getheader("Cache-Control"), "no-cache")
+
+    def test_keep_alive(self):
+        self.get("/a.png")
+        sock = self.conn.sock
+        self.get("/0000_aligned_viewer.data.js")
+        self.assertIs(self.conn.sock, sock)
+
+class RangeTest(ServeTestCase):
+
+    def test_ranges(self):
+        resp, body = self.get("/a.png", Range="bytes=10-19")
+        self.assertEqual((resp.status, body), (206, IMAGE[10:20]))
+        self.assertEqual(resp.getheader("Content-Range"), "bytes 10-19/%d" % len(IMAGE))
+        resp, body = self.get("/a.png", Range="bytes=-5")
+        self.assertEqual((resp.status, body), (206, IMAGE[-5:]))
+        resp, body = self.get("/a.png", Range="bytes=1000-")
+        self.assertEqual((resp.status, body), (206, IMAGE[1000:]))
+
+    def test_unsatisfiable(self):
+        resp, _ = self.get("/a.png", Range="bytes=%d-" % len(IMAGE))
+        self.assertEqual(resp.status, 416)
+        self.assertEqual(resp.getheader("Content-Range"), "bytes */%d" % len(IMAGE))
+
+    def test_stale_if_range_gets_the_whole_file(self):
+        resp, body = self.get("/a.png", Range="bytes=0-9", **{"If-Range": '"stale"'})
+        self.assertEqual((resp.status, body), (200, IMAGE))
+
+class GzipTest(ServeTestCase):
+
+    def test_text_is_gzipped_with_its_own_etag(self):
+        resp, body = self.get("/0000_aligned_viewer.data.js", **{"Accept-Encoding": "gzip"})
+        self.assertEqual(resp.getheader("Content-Encoding"), "gzip")
+        self.assertEqual(gzip.decompress(body), DATA)
+        self.assertTrue(resp.getheader("ETag").endswith('-gz"'))
+        plain, body = self.get("/0000_aligned_viewer.data.js")
+        self.assertEqual(body, DATA)
+        self.assertNotEqual(plain.getheader("ETag"), resp.getheader("ETag"))
+
+    def test_images_are_not_gzipped(self):
+        resp, body = self.get("/a.png", **{"Accept-Encoding": "gzip"})
+        self.assertIsNone(resp.getheader("Content-Encoding"))
+        self.assertEqual(body, IMAGE)
+
+    def test_cache_evicts_least_recently_served(self):
+        paths = []
+        for k in range(3):
+            path = os.path.join(self.dir, "%d.json" % k)
+            with open(path, "wb") as f:
+                f.write(os.urandom(1000))       # incompressible: ~1 KB each when gzipped
+            paths.append(path)
+        cache = _GzipCache(limit=2500)
+        cache.get(paths[0], os.stat(paths[0]))
+        cache.get(paths[1], os.stat(paths[1]))
+        cache.get(paths[0], os.stat(paths[0]))
+        cache.get(paths[2], os.stat(paths[2]))
+        self.assertEqual(list(cache.items), [paths[0], paths[2]])
+
+@unittest.skipUnless(HAVE_PIL, "needs Pillow")
+class ResizeTest(ServeTestCase):
+
+    LIMIT = 1 << 20
+
+    def setUp(self):
+        super().setUp()
+        for name, width in (("wide.png", 600), ("other.png", 600), ("small.png", 40)):
+            Image.new("RGB", (width, width // 2), (200, 40, 40)).save(os.path.join(self.dir, name))
+
+    def resizer(self):
+        return _ResizeCache(self.dir, self.LIMIT)
+
+    def test_width_is_rounded_up_and_cached(self):
+        resp, body = self.get("/wide.png?w=100")
+        self.assertEqual(resp.getheader("Content-Type"), "image/jpeg")
+        with Image.open(io.BytesIO(body)) as im:
+            self.assertEqual(im.size, (128, 64))
+        self.assertTrue(os.path.isfile(os.path.join(self.dir, THUMB_DIR, "resized", "128", "wide.jpg")))
+        etag = resp.getheader("ETag")
+        resp, _ = self.get("/wide.png?w=100", **{"If-None-Match": etag})
+        self.assertEqual(resp.status, 304)
+
+    def test_narrow_or_missing_width_serves_the_original(self):
+        with open(os.path.join(self.dir, "small.png"), "rb") as f:
+            original = f.read()
+        self.assertEqual(self.get("/small.png?w=64")[1], original)
+        self.assertEqual(self.get("/small.png?w=abc")[1], original)
+        resp, _ = self.get("/wide.png")
+        self.assertEqual(resp.getheader("Content-Type"), "image/png")
+
+    def test_disk_cache_evicts_least_recently_served(self):
+        self.get("/wide.png?w=512")
+        first = os.path.join(self.dir, THUMB_DIR, "resized", "512", "wide.jpg")
+        cache = _ResizeCache(self.dir, os.path.getsize(first) + 1)
+        st = os.stat(os.path.join(self.dir, "other.png"))
+        made = cache.get(os.path.join(self.dir, "other.png"), st, 512)
+        self.assertTrue(os.path.isfile(made))
+        self.assertFalse(os.path.exists(first))
+
+if __name__ == "__main__":
+    unittest.main()
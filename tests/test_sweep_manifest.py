@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# tests/test_sweep_manifest.py
+#
+# sweep_manifest.py: output file matching and the entries the viewers build from a manifest.
+#
+# Usage (from the repository root):
+#   python -m pytest tests
+#   python -m unittest discover tests
+#
+# Stdlib only.
+
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from sweep_helpers import make_plan, parse_segment, touch
+
+import analyze_sweep
+from sweep_manifest import (MANIFEST_NAME, ManifestWriter, decode_ordinal, folder_records, output_matcher,
+                            read_manifest, viewer_entries)
+
+class OutputMatcherTest(unittest.TestCase):
+
+    def test_agrees_with_plan_for_any_extension(self):
+        plan = make_plan(s=("seed", [1, 2]), t=("cfg", [7.0, 7.5, 8.0]))
+        match = output_matcher(plan.manifest_header({}))
+        for idxs, stem, _ in plan:
+            o = plan.output_ordinal(idxs)
+            for name in (stem + "_00001_.png", stem + "_00001_.webp", stem + ".png"):
+                self.assertEqual(match(name), o, name)
+
+    def test_rejects_artifacts_and_other_values(self):
+        plan = make_plan(s=("seed", [1, 2]), t=("cfg", [7.0, 7.5]))
+        match = output_matcher(plan.manifest_header({}))
+        for name in (MANIFEST_NAME, "0000_aligned_viewer.html", "3-seed-3--3-cfg-7_0_00001_.png", "notes.txt"):
+            self.assertIsNone(match(name), name)
+
+    def test_ordinal_header_rejects_artifacts(self):
+        plan = make_plan("ordinal", s=("seed", list(range(100))), t=("cfg", [7.0, 7.5]))
+        match = output_matcher(plan.manifest_header({}))
+        self.assertEqual(match("000_00001_.png"), 0)
+        self.assertEqual(match("199_00001_.mp4"), 199)
+        for name in (MANIFEST_NAME, "000_thumbs", "0000_aligned_viewer.html", "200_00001_.png"):
+            self.assertIsNone(match(name), name)
+
+class PrunedViewerEntriesTest(unittest.TestCase):
+
+    def test_pruned_cells_show_the_representative(self):
+        plan = make_plan(s=("seed", [1, 2]), t=("cfg", [7.0, 7.5, 8.0]))
+        plan.prune(1, {1: 0, 2: 0})
+        header = plan.manifest_header({})
+        header["merge"] = plan.merge_table()
+        records = {o: {"o": o, "st": "done", "files": ["%d_00001_.png" % o]}
+                   for o in range(plan.expected_count) if decode_ordinal(header, o)[1] == 0}
+        pngs, _ = viewer_entries(header, records, parse_segment)
+        self.assertEqual(len(pngs), plan.expected_count)
+        self.assertEqual(sorted({name for name, _ in pngs}), ["0_00001_.png", "3_00001_.png"])
+
+    def test_merge_line_survives_reading(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            plan = make_plan(s=("seed", [1, 2]), t=("cfg", [7.0, 7.5, 8.0]))
+            plan.prune(1, {2: 0})
+            path = os.path.join(tmp, MANIFEST_NAME)
+            w = ManifestWriter(path, plan.manifest_header({}), reset=True)
+            w.merge(plan.merge_table())
+            w.record(0, "done", files=["a.png"])
+            w.close()
+            header, records = read_manifest(path)
+            self.assertEqual(header["merge"], plan.merge_table())
+            self.assertEqual(sorted(records), [0])
+
+class PartialManifestTest(unittest.TestCase):
+    """A resumed sweep without --monitor has "done" records for only part of its files."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = self.tmp.name
+        self.plan = make_plan(s=("seed", [1, 2, 3]), t=("cfg", [7.0, 7.5, 8.0, 8.5]))
+        self.header = self.plan.manifest_header({})
+        self.names = {}
+        for idxs, stem, _ in self.plan:
+            self.names[self.plan.output_ordinal(idxs)] = stem + self.plan.SUFFIX
+        touch(self.dir, *self.names.values())
+        w = ManifestWriter(os.path.join(self.dir, MANIFEST_NAME), self.header, reset=True)
+        for o in range(6):
+            w.record(o, "done", files=[self.names[o]])
+        for o in range(6, 9):
+            w.record(o, "queued", pid="p%d" % o)
+        w.close()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_files_on_disk_count_as_done(self):
+        header, records = read_manifest(os.path.join(self.dir, MANIFEST_NAME))
+        merged = folder_records(self.dir, header, records)
+        self.assertEqual(sorted(merged), list(range(12)))
+        self.assertTrue(all(rec["st"] == "done" for rec in merged.values()))
+        self.assertEqual(records[7]["st"], "queued")
+        pngs, _ = viewer_entries(header, merged, parse_segment)
+        self.assertEqual(sorted(name for name, _ in pngs), sorted(self.names.values()))
+
+    def test_listed_files_are_not_repeated(self):
+        touch(self.dir, self.names[0][:-4] + ".mp4")
+        header, records = read_manifest(os.path.join(self.dir, MANIFEST_NAME))
+        merged = folder_records(self.dir, header, records)
+        self.assertEqual(sorted(merged[0]["files"]), sorted([self.names[0], self.names[0][:-4] + ".mp4"]))
+        self.assertEqual(records[0]["files"], [self.names[0]])
+
+    def test_analyze_finds_every_file(self):
+        entries = analyze_sweep.find_entries(Path(self.dir))
+        self.assertEqual(len(entries), 12)
+
+if __name__ == "__main__":
+    unittest.main()
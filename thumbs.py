@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+# thumbs.py
+#
+# Derived assets for the viewers: thumbnail pyramid, video poster frames, atlases.
+#
+# Thumbnails: for every PNG, <images>/0000_thumbs/<level>/<stem>.jpg is written for
+# each level (longest side in px, default 128/256/512) that is smaller than the image.
+# Levels are made largest first, each one downscaled from the previous (mip chain), so
+# the PNG is decoded once. The grid then loads the smallest level that covers the
+# displayed cell size instead of decoding every full-resolution PNG; the full image is
+# only fetched when a cell is opened.
+#
+# Poster frames: an .mp4 without its <stem>.png poster gets one extracted with ffmpeg
+# (first frame), so it shows up in the viewers like the workflow-made posters do.
+#
+# Atlases (optional): for two chosen dimensions X and Y, every X*Y plane of the sweep
+# (one per combination of the other dimensions) is packed into a single JPEG sheet in
+# 0000_thumbs/atlas_<x>_<y>_<size>/, cells laid out col = X index, row = Y index. A grid
+# page on those axes is then one image load, and scrubbing another slider swaps one
+# sheet. Sheet names carry a hash of their layout and members, so a grown sweep gets
+# new sheets and the stale ones are removed.
+#
+# All steps fan out over a ProcessPoolExecutor and skip outputs that are newer than
+# their source (mtime), so re-running after a few new outputs only does those.
+#
+# serve_viewer.py also uses make_resized() for the grid's on-demand ?w= variants.
+#
+# Thumbnails/atlases require Pillow (pip install pillow), posters require ffmpeg on PATH;
+# without them the viewers fall back to full-size images / skip the posterless videos.
+
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+HAVE_PIL = Image is not None
+
+THUMB_DIR = "0000_thumbs"
+THUMB_LEVELS = (128, 256, 512)
+
+def parse_levels(text):
+    """'128,256,512' -> [128, 256, 512] (sorted, unique)."""
+    try:
+        levels = sorted({int(t) for t in text.split(",") if t.strip()})
+    except ValueError:
+        raise ValueError("Thumbnail sizes must be comma-separated integers: %r" % text)
+    if not levels or levels[0] <= 0:
+        raise ValueError("Thumbnail sizes must be positive: %r" % text)
+    return levels
+
+def thumb_name(fname):
+    return os.path.splitext(fname)[0] + ".jpg"
+
+def thumb_path(img_dir, level, fname):
+    return os.path.join(os.fspath(img_dir), THUMB_DIR, str(level), thumb_name(fname))
+
+def image_size(path):
+    with Image.open(path) as im:
+        return im.size
+
+def png_size(path):
+    """(width, height) from a PNG's IHDR chunk without Pillow, or None if not a PNG."""
+    with open(path, "rb") as f:
+        head = f.read(24)
+    if len(head) < 24 or head[:8] != b"\x89PNG\r\n\x1a\n" or head[12:16] != b"IHDR":
+        return None
+    return int.from_bytes(head[16:20], "big"), int.from_bytes(head[20:24], "big")
+
+def is_stale(src_mtime, path):
+    try:
+        return os.stat(path).st_mtime_ns < src_mtime
+    except FileNotFoundError:
+        return True
+
+def make_thumbs(src, targets, quality=85):
+    """Write src downscaled to each (level, path) in targets, largest level first."""
+    with Image.open(src) as im:
+        im = im.convert("RGB")
+        for level, path in sorted(targets, reverse=True):
+            im.thumbnail((level, level), Image.LANCZOS)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = path + ".tmp"
+            im.save(tmp, "JPEG", quality=quality)
+            os.replace(tmp, path)
+
+def make_resized(src, path, width, quality=85):
+    """Write src scaled to width (aspect kept) as a JPEG at path."""
+    with Image.open(src) as im:
+        im = im.convert("RGB")
+        height = max(1, round(im.height * width / im.width))
+        im = im.resize((width, height), Image.LANCZOS)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = "%s.%d.tmp" % (path, threading.get_ident())     # concurrent requests
+    im.save(tmp, "JPEG", quality=quality)
+    os.replace(tmp, path)
+
+def make_poster(video, poster):
+    """Extract the first frame of video into poster (PNG) with ffmpeg."""
+    tmp = poster + ".tmp.png"
+    subprocess.run(
+        ["ffmpeg", "-v", "error", "-y", "-i", video, "-frames:v", "1", tmp],
+        check=True, stdin=subprocess.DEVNULL, capture_output=True,
+    )
+    os.replace(tmp, poster)
+
+def make_atlas(path, cols, rows, cw, ch, members, quality=85):
+    """Paste members [(col, row, src)] as cw x ch cells into one cols x rows sheet."""
+    sheet = Image.new("RGB", (cols * cw, rows * ch))
+    for col, row, src in members:
+        with Image.open(src) as im:
+            im = im.convert("RGB")
+            if im.size != (cw, ch):
+                im = im.resize((cw, ch), Image.LANCZOS)
+            sheet.paste(im, (col * cw, row * ch))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    sheet.save(tmp, "JPEG", quality=quality)
+    os.replace(tmp, path)
+
+# -------------------- Process pool --------------------
+
+def _run_job(job):
+    """Worker entry point: job = (kind, src, arg). Returns (src, error or None)."""
+    kind, src, arg = job
+    try:
+        if kind == "thumbs":
+            make_thumbs(src, arg)
+        elif kind == "atlas":
+            make_atlas(src, *arg)
+        else:
+            make_poster(src, arg)
+    except (OSError, ValueError, subprocess.CalledProcessError) as e:
+        err = getattr(e, "stderr", None)
+        return src, (err.decode("utf-8", "replace").strip() if err else str(e))
+    return src, None
+
+def run_jobs(jobs, workers=None, label="Assets"):
+    """
+    Run jobs across a process pool (in-process when there is only one job or worker)
+    and print throughput. Returns the srcs that failed.
+    """
+    if not jobs:
+        return set()
+    workers = max(1, min(workers or os.cpu_count() or 1, len(jobs)))
+    t0 = time.time()
+    if workers == 1:
+        results = map(_run_job, jobs)
+        pool = None
+    else:
+        pool = ProcessPoolExecutor(max_workers=workers)
+        results = pool.map(_run_job, jobs, chunksize=max(1, min(32, len(jobs) // (workers * 4))))
+    failed = set()
+    try:
+        for src, err in results:
+            if err:
+                failed.add(src)
+                print("[WARN] %s failed for %s: %s" % (label, os.path.basename(src), err))
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+    dt = max(time.time() - t0, 1e-6)
+    print("%s: %d in %.1fs (%.1f/s, %d worker%s)"
+          % (label, len(jobs), dt, len(jobs) / dt, workers, "" if workers == 1 else "s"))
+    return failed
+
+def build_thumbs(img_dir, names, levels=THUMB_LEVELS, workers=None):
+    """
+    Make missing or out-of-date thumbnails for names (PNG filenames in img_dir).
+    Returns (levels, (width, height)) with only the levels smaller than the first
+    image, or None when Pillow is unavailable or names is empty.
+    """
+    if Image is None or not names:
+        return None
+    img_dir = os.fspath(img_dir)
+    size = image_size(os.path.join(img_dir, names[0]))
+    levels = [lv for lv in levels if lv < max(size)]
+    jobs = []
+    for fname in names:
+        src = os.path.join(img_dir, fname)
+        try:
+            mtime = os.stat(src).st_mtime_ns
+        except FileNotFoundError:
+            continue
+        targets = [(lv, thumb_path(img_dir, lv, fname)) for lv in levels]
+        targets = [t for t in targets if is_stale(mtime, t[1])]
+        if targets:
+            jobs.append(("thumbs", src, targets))
+    run_jobs(jobs, workers, "Thumbnails")
+    return levels, size
+
+_poster_failed = set()
+
+def build_posters(img_dir, png_entries, mp4_entries, workers=None):
+    """
+    Extract posters for videos that have no <stem>.png. Returns the new
+    (poster filename, parsed) entries, parsed being the video's own.
+    """
+    img_dir = os.fspath(img_dir)
+    have = {os.path.splitext(name)[0] for name, _ in png_entries}
+    todo = {}
+    for name, parsed in mp4_entries:
+        stem = os.path.splitext(name)[0]
+        if parsed and stem not in have and name not in _poster_failed:
+            todo[os.path.join(img_dir, name)] = (stem + ".png", parsed)
+    if not todo:
+        return []
+    if shutil.which("ffmpeg") is None:
+        print("[WARN] ffmpeg not found; %d video(s) without a poster .png are skipped." % len(todo))
+        _poster_failed.update(os.path.basename(v) for v in todo)
+        return []
+    jobs = [("poster", video, os.path.join(img_dir, poster)) for video, (poster, _) in todo.items()]
+    failed = run_jobs(jobs, workers, "Poster frames")
+    _poster_failed.update(os.path.basename(v) for v in failed)
+    return sorted(entry for video, entry in todo.items() if video not in failed)
+
+def build_atlases(img_dir, meta, xd, yd, size, workers=None):
+    """
+    Pack each (xd, yd) plane of the viewer data (see viewer_index.py) into one sheet,
+    using the size-px thumbnails when they exist. Returns the "atlas" entry for the
+    data file, or None when Pillow is unavailable.
+    """
+    if Image is None or not meta["files"]:
+        return None
+    img_dir = os.fspath(img_dir)
+    sizes = [len(vals) for vals in meta["dim_values"]]
+    w, h = image_size(os.path.join(img_dir, meta["files"][0]))    # posters come first
+    scale = min(1.0, size / max(w, h))
+    cw, ch = max(1, round(w * scale)), max(1, round(h * scale))
+    cols, rows = sizes[xd], sizes[yd]
+    rest_dims = [d for d in range(len(sizes)) if d not in (xd, yd)]
+    planes = {}
+    for cell, f in enumerate(meta["grid"]):
+        if f < 0:
+            continue
+        idx = []
+        for n in reversed(sizes):
+            idx.append(cell % n)
+            cell //= n
+        idx.reverse()
+        rest = 0
+        for d in rest_dims:
+            rest = rest * sizes[d] + idx[d]
+        planes.setdefault(rest, []).append((idx[xd], idx[yd], meta["files"][f]))
+
+    name = "atlas_%d_%d_%d" % (xd, yd, size)
+    out_dir = os.path.join(img_dir, THUMB_DIR, name)
+    nplanes = 1
+    for d in rest_dims:
+        nplanes *= sizes[d]
+    sheets = [None] * nplanes
+    jobs = []
+    for rest, members in sorted(planes.items()):
+        members.sort()
+        sig = hashlib.sha1(json.dumps([cols, rows, cw, ch, members]).encode("utf-8")).hexdigest()[:10]
+        sheets[rest] = "p%d_%s.jpg" % (rest, sig)
+        srcs = []
+        newest = 0
+        for col, row, fname in members:
+            src = thumb_path(img_dir, size, fname)
+            if not os.path.exists(src):
+                src = os.path.join(img_dir, fname)
+            try:
+                newest = max(newest, os.stat(src).st_mtime_ns)
+            except FileNotFoundError:
+                continue
+            srcs.append((col, row, src))
+        path = os.path.join(out_dir, sheets[rest])
+        if srcs and is_stale(newest, path):
+            jobs.append(("atlas", path, (cols, rows, cw, ch, srcs)))
+    run_jobs(jobs, workers, "Atlases")
+
+    keep = set(sheets)
+    if os.path.isdir(out_dir):
+        for old in os.listdir(out_dir):
+            if old not in keep:
+                try:
+                    os.remove(os.path.join(out_dir, old))
+                except OSError:
+                    pass
+    return dict(x=xd, y=yd, cols=cols, rows=rows, cw=cw, ch=ch,
+                base=meta["base"] + THUMB_DIR + "/" + name + "/", planes=sheets)
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+# viewer_index.py
+#
+# Incremental image index shared by make_*_viewer.py, plus the --watch loop.
+#
+# ViewerIndex accepts (filename, parsed) entries one at a time, so a running sweep can
+# be followed by only feeding it the files that arrived since the last poll.
+#
+# The viewer HTML holds no image data; it loads <viewer>.data.js via a plain <script>
+# tag (works from file://), which sets window.VIEWER_DATA to:
+#   {"dim_values": [[{"k": key, "d": display}, ...], ...], "dim_labels": [...],
+#    "label_em": 9.9, "rev": 3,
+#    "base": "<URL prefix shared by all files, relative to the HTML>",
+#    "files": ["<png/mp4 filename>", ...],          # every filename exactly once
+#    "grid": [file id or -1, ...],                    # dense, one cell per combination
+#    "vgrid": [file id or -1, ...] or null}           # same layout, videos
+# Cells are numbered row-major over dim_values (last dimension fastest), so the page
+# finds a file with a few multiplications instead of building "k|k|k" lookup strings.
+# In watch mode only this file is rewritten and the page re-reads it every few seconds.
+#
+# Stdlib only.
+
+import json
+import os
+import time
+
+class ViewerIndex:
+    """Dimension values and key -> filename lookups, built up entry by entry."""
+
+    def __init__(self):
+        self.seen = set()
+        self.signature = None       # [(node_id, prop), ...] fixed by the first image
+        self.dim_info = []
+        self.posters = {}           # (k1, k2, ...) -> png filename
+        self.videos = {}            # (k1, k2, ...) -> mp4 filename
+        self.rev = 0
+
+    def _keys(self, name, parsed, strict):
+        sig = [(d[0], d[1]) for d in parsed]
+        if self.signature is None:
+            self.signature = sig
+            self.dim_info = [{'keys': {}, 'all_numeric': True} for _ in sig]
+        elif len(sig) != len(self.signature):
+            if strict:
+                raise ValueError(f"Inconsistent dimension count in {name}")
+            return None
+        elif sig != self.signature:
+            if strict:
+                raise ValueError(f"Dimension signature mismatch in {name}")
+            return None
+        return tuple(d[3] for d in parsed)
+
+    def add_poster(self, name, parsed, strict=True):
+        keys = self._keys(name, parsed, strict)
+        if keys is None:
+            return False
+        for i, (_, _, vnum, vkey, vdisp) in enumerate(parsed):
+            if vnum is None:
+                self.dim_info[i]['all_numeric'] = False
+            self.dim_info[i]['keys'].setdefault(vkey, {'num': vnum, 'disp': vdisp})
+        self.posters[keys] = name
+        return True
+
+    def add_video(self, name, parsed):
+        sig = [(d[0], d[1]) for d in parsed]
+        if sig != self.signature:
+            return False
+        self.videos[tuple(d[3] for d in parsed)] = name
+        return True
+
+    def add_entries(self, png_entries, mp4_entries, strict=True):
+        """
+        Add entries not seen before; return how many were indexed. Videos that arrive
+        before any image are left unseen so a later poll can pair them. One file may fill
+        several cells (gen_images.py --prune), so an entry is its name and value keys.
+        """
+        added = 0
+        for name, parsed in png_entries:
+            seen = (name, tuple(d[3] for d in parsed) if parsed else None)
+            if seen in self.seen:
+                continue
+            self.seen.add(seen)
+            if parsed and self.add_poster(name, parsed, strict):
+                added += 1
+        for name, parsed in mp4_entries:
+            seen = (name, tuple(d[3] for d in parsed) if parsed else None)
+            if seen in self.seen or (parsed and self.signature is None):
+                continue
+            self.seen.add(seen)
+            if parsed and self.add_video(name, parsed):
+                added += 1
+        if added:
+            self.rev += 1
+        return added
+
+    def dim_values(self):
+        out = []
+        for info in self.dim_info:
+            items = info['keys']
+            if info['all_numeric']:
+                order = sorted(items.keys(), key=lambda k: (items[k]['num'], k))
+            else:
+                order = sorted(items.keys())
+            out.append([{'k': k, 'd': items[k]['disp']} for k in order])
+        return out
+
+    def meta(self, node_titles, base):
+        """The viewer payload (see top of file); base is the image folder URL prefix."""
+        dim_labels = []
+        max_label = 0
+        for (nid, prop) in self.signature:
+            title = node_titles.get(nid, f"Node {nid}")
+            label = f"{title}:{nid}:{prop}"
+            dim_labels.append(label)
+            max_label = max(max_label, len(label))
+        label_em = max(8.0, min(60.0, max_label * 0.62))
+
+        dim_values = self.dim_values()
+        sizes = [len(vals) for vals in dim_values]
+        pos = [{v['k']: i for i, v in enumerate(vals)} for vals in dim_values]
+        cells = 1
+        for n in sizes:
+            cells *= n
+        files = []
+        ids = {}
+
+        def dense(lookup):
+            placed = []
+            for keys, name in lookup.items():
+                c = 0
+                for d, k in enumerate(keys):
+                    p = pos[d].get(k)
+                    if p is None:
+                        break       # video without a matching image value
+                    c = c * sizes[d] + p
+                else:
+                    placed.append((c, name))
+            placed.sort()
+            grid = [-1] * cells
+            for c, name in placed:
+                fid = ids.get(name)
+                if fid is None:
+                    fid = ids[name] = len(files)
+                    files.append(name)
+                grid[c] = fid
+            return grid
+
+        grid = dense(self.posters)
+        vgrid = dense(self.videos) if self.videos else None
+        return dict(
+            dim_values=dim_values,
+            dim_labels=dim_labels,
+            label_em=label_em,
+            rev=self.rev,
+            base=base,
+            files=files,
+            grid=grid,
+            vgrid=vgrid,
+        )
+
+# -------------------- Watch mode --------------------
+
+LIVE_JS = """
+// Watch mode: re-read the data file and pick up newly arrived images
+(function(){
+  function poll(){
+    const s=document.createElement("script");
+    s.src=%(src)s+"?t="+Date.now();
+    s.onload=s.onerror=()=>{
+      s.remove();
+      const nd=window.VIEWER_DATA;
+      if(nd && nd.rev!==data.rev) applyData(nd);
+      setTimeout(poll,%(ms)d);
+    };
+    document.head.appendChild(s);
+  }
+  setTimeout(poll,%(ms)d);
+})();
+"""
+
+def data_script(data_src):
+    """The <script> tag that loads the data file (data_src is relative to the HTML)."""
+    return '<script src=%s></script>' % json.dumps(data_src)
+
+def live_script(data_src, interval):
+    """Polling JS for a viewer page in watch mode."""
+    return LIVE_JS % {"src": json.dumps(data_src), "ms": max(250, int(interval * 1000))}
+
+def write_data_file(path, meta):
+    tmp = str(path) + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write("window.VIEWER_DATA=")
+        f.write(json.dumps(meta, separators=(",", ":")))
+        f.write(";\n")
+    os.replace(tmp, path)
+
+def watch_folder(index, collect, on_change, interval, until_ready=False):
+    """
+    Every interval seconds feed collect() -> (png_entries, mp4_entries) to the index
+    and call on_change() when something new was indexed. With until_ready, return as
+    soon as the index holds an image (waiting for a sweep's first output) instead.
+    Ctrl+C returns.
+    """
+    try:
+        while not (until_ready and index.posters):
+            time.sleep(interval)
+            added = index.add_entries(*collect(), strict=False)
+            if added and not until_ready:
+                on_change()
+                print("[WATCH] +%d files (%d images, %d videos)"
+                      % (added, len(index.posters), len(index.videos)))
+    except KeyboardInterrupt:
+        pass